@@ -2,23 +2,210 @@
 
 from flask import Flask, jsonify, request
 from flask_sqlalchemy import SQLAlchemy
-from openfoodfacts_api import get_product_by_barcode
-from flask_bcrypt import Bcrypt
+from openfoodfacts_api import get_product_by_barcode, OpenFoodFactsError
+from product_cache import ProductCache, MISS
+from singleflight import SingleFlight
+from popularity import PopularityTracker
+from product_refresh import ProductRefresher
+from product_search import ensure_search_index, install_search_index, search_products
+from product_ranking import UNRANKED, alternatives_query, grade_rank, rank_default
+from barcodes import canonical_barcode, gtin_default, gtin_key
+from catalog_snapshot import CatalogStore
+from footprint import ADD_FAVORITE_SQL, REMOVE_FAVORITE_SQL, FootprintFactorsStore, move_footprint_counts
+from password_hashing import PasswordHasher, HasherBusyError
+from session_tokens import SessionTokenSigner
+from db_config import database_uri, engine_options
+from emissions_index import EmissionsStore, SERIES_AGGREGATES, compute_series
+from serializers import FastJSONProvider, ProductJSONCache, json_response, product_to_dict
+from http_caching import apply_cache_headers, etag_for, not_modified
+from schema import upgrade_schema
+from metrics import REGISTRY, SharedMetrics
+from instrumentation import install_request_metrics, install_sql_metrics
+from sqlalchemy import delete, event, func, insert, inspect, or_, select, text
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError
 from flask_cors import CORS
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+import atexit
 import os
+import threading
+import time
 
 # Inicializa la aplicación Flask
 app = Flask(__name__)
-CORS(app, resources={r"/api/*": {"origins": "http://localhost:5173"}})
+app.json = FastJSONProvider(app) # jsonify con orjson si está instalado y sin escapar acentos
+CORS(app, resources={r"/api/*": {"origins": "http://localhost:5173"}},
+     expose_headers=["X-Total-Count", "X-Next-After", "X-Next-Offset", "ETag"])
 # --- Configuración de la Base de Datos ---
 basedir = os.path.abspath(os.path.dirname(__file__))
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(basedir, 'site.db')
+# DATABASE_URL permite usar otra base de datos (p. ej. PostgreSQL) con los mismos modelos
+app.config['SQLALCHEMY_DATABASE_URI'] = database_uri(os.path.join(basedir, 'site.db'))
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False 
+# Modo de tests (FLASK_TESTING=1, lo fija tests/app_testing.py): abarata bcrypt y no lanza procesos
+app.config['TESTING'] = os.environ.get('FLASK_TESTING') == '1'
+# Pool de conexiones, pre-ping y caché de sentencias; en SQLite además WAL y PRAGMAs (ver db_config.py)
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
+
+# --- Configuración de la caché de productos ---
+app.config['PRODUCT_CACHE_MAXSIZE'] = 2048      # Nº máximo de códigos de barras en memoria
+app.config['PRODUCT_CACHE_TTL'] = 3600          # Segundos que se guarda un producto encontrado
+app.config['PRODUCT_CACHE_NEGATIVE_TTL'] = 300  # Segundos que se recuerda un 'no encontrado' de Open Food Facts
+app.config['PRODUCT_BATCH_MAX_SIZE'] = 200      # Nº máximo de códigos por petición a /api/products/batch
+app.config['PRODUCT_BATCH_WORKERS'] = 8         # Descargas simultáneas de Open Food Facts en las búsquedas por lotes
+app.config['PRODUCT_POPULARITY_FLUSH_EVERY'] = 100  # Búsquedas acumuladas antes de guardar los contadores de popularidad
+app.config['PRODUCT_CACHE_WARMUP_TOP_N'] = 500      # Productos más buscados que se precargan al arrancar
+app.config['FAVORITES_PAGE_SIZE'] = 100         # Favoritos por página si no se indica ?limit=
+app.config['FAVORITES_MAX_PAGE_SIZE'] = 500     # Valor máximo admitido para ?limit=
+app.config['PRODUCT_QUERY_PAGE_SIZE'] = 20      # Resultados por página de /api/products/query si no se indica ?limit=
+app.config['PRODUCT_QUERY_MAX_PAGE_SIZE'] = 100 # Valor máximo admitido para ?limit=
+app.config['PRODUCT_QUERY_MAX_OFFSET'] = 1000   # Valor máximo de ?offset= (más allá conviene afinar la búsqueda)
+app.config['ALTERNATIVES_DEFAULT_LIMIT'] = 5    # Alternativas devueltas si no se indica ?limit=
+app.config['ALTERNATIVES_MAX_LIMIT'] = 50       # Valor máximo admitido para ?limit=
+app.config['BCRYPT_LOG_ROUNDS'] = 4 if app.config['TESTING'] else 12  # Factor de trabajo de bcrypt (los hashes antiguos se rehacen al iniciar sesión; 4 es el mínimo)
+app.config['PASSWORD_HASH_WORKERS'] = 0 if app.config['TESTING'] else min(4, os.cpu_count() or 1)  # Procesos dedicados a bcrypt (0 = en el hilo de la petición)
+app.config['PASSWORD_HASH_MAX_PENDING'] = 64    # Operaciones de bcrypt en cola antes de responder 503
+app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY') or os.urandom(32)  # Firma de los tokens de sesión (fijarla en producción)
+app.config['SESSION_TOKEN_TTL'] = 7 * 24 * 3600  # Segundos de validez de un token de sesión
+app.config['PRODUCT_JSON_CACHE_MAXSIZE'] = 10000  # Productos con su JSON ya codificado en memoria
+app.config['CACHE_CONTROL_PRODUCTS'] = 'public, max-age=3600'     # Los productos cambian poco
+app.config['CACHE_CONTROL_EMISSIONS'] = 'public, max-age=300'     # Cambian poco, pero una carga nueva debe verse pronto
+app.config['CACHE_CONTROL_PRODUCT_QUERY'] = 'public, max-age=300' # Aparecen productos nuevos a menudo
+app.config['CACHE_CONTROL_ALTERNATIVES'] = 'public, max-age=300'  # Cambian al añadirse productos a la categoría
+app.config['CACHE_CONTROL_FAVORITES'] = 'private, no-cache'       # Por usuario: se revalida siempre con el ETag
+app.config['PRODUCT_MAX_AGE'] = 7 * 24 * 3600     # Segundos tras los que un producto de Open Food Facts se considera obsoleto
+app.config['PRODUCT_REFRESH_WORKERS'] = 2         # Hilos que refrescan productos obsoletos en segundo plano
+app.config['PRODUCT_REFRESH_RATE'] = 2.0          # Máximo de refrescos por segundo contra Open Food Facts
+app.config['PRODUCT_REFRESH_MAX_QUEUE'] = 1000    # Códigos pendientes de refrescar (el resto lo recoge el barrido)
+app.config['PRODUCT_REFRESH_RETRY_AFTER'] = 600   # Segundos antes de volver a intentar refrescar el mismo código
+app.config['PRODUCT_REFRESH_SWEEP_INTERVAL'] = 600  # Segundos entre barridos de productos obsoletos
+app.config['PRODUCT_REFRESH_SWEEP_BATCH'] = 100     # Productos más antiguos que se encolan en cada barrido
+app.config['CATALOG_SNAPSHOT_FILE'] = os.environ.get('CATALOG_SNAPSHOT_FILE')  # Instantánea compartida del catálogo (ver catalog_snapshot.py); None para no usarla
+app.config['CATALOG_SNAPSHOT_CHECK_INTERVAL'] = 30  # Segundos entre comprobaciones de una instantánea nueva y del overlay SQL
+app.config['METRICS_ENABLED'] = os.environ.get('METRICS_ENABLED', '1') != '0'  # Métricas por petición y por sentencia SQL en /metrics
+app.config['METRICS_SYNC_INTERVAL'] = 5  # Con run.py, segundos entre volcados de las métricas de cada proceso para sumarlas (ver share_metrics)
+app.config['PRODUCT_CACHE_SEED_FILE'] = os.path.join(basedir, '..', 'data', 'seed_barcodes.txt')  # Códigos a precargar siempre (None para ninguno)
+# Archivos CSV de factores de emisión por categoría para la huella de los favoritos (separados por os.pathsep; los últimos mandan)
+app.config['FOOTPRINT_FACTORS_FILES'] = (os.environ['FOOTPRINT_FACTORS_FILES'].split(os.pathsep)
+                                         if os.environ.get('FOOTPRINT_FACTORS_FILES')
+                                         else [os.path.join(basedir, '..', 'data', 'category_emission_factors.csv')])
+app.config['FOOTPRINT_FACTORS_CHECK_INTERVAL'] = 60  # Segundos entre comprobaciones de cambios en esos archivos
+app.config['EMISSIONS_CHECK_INTERVAL'] = 30  # Segundos entre comprobaciones de cambios en las emisiones hechos desde otro proceso
 
 # Inicializa la extensión de SQLAlchemy
 db = SQLAlchemy(app)
-bcrypt = Bcrypt(app)
 
+# Los componentes que dependen de app.config se construyen con una función
+# para que create_app pueda volver a construirlos (ver _CONFIGURED_COMPONENTS)
+
+def _make_session_tokens():
+    # Tokens de sesión firmados: las rutas de favoritos los validan sin consultar la BD
+    return SessionTokenSigner(app.config['SECRET_KEY'], ttl=app.config['SESSION_TOKEN_TTL'])
+
+
+def _make_password_hasher():
+    # Hash y verificación de contraseñas fuera de los hilos de las peticiones
+    return PasswordHasher(
+        rounds=app.config['BCRYPT_LOG_ROUNDS'],
+        workers=app.config['PASSWORD_HASH_WORKERS'],
+        max_pending=app.config['PASSWORD_HASH_MAX_PENDING'],
+    )
+
+
+def _make_product_cache():
+    return ProductCache(
+        maxsize=app.config['PRODUCT_CACHE_MAXSIZE'],
+        ttl=app.config['PRODUCT_CACHE_TTL'],
+        negative_ttl=app.config['PRODUCT_CACHE_NEGATIVE_TTL'],
+    )
+
+
+def _make_product_json():
+    # JSON ya codificado de cada producto, para no recodificar en cada respuesta
+    return ProductJSONCache(maxsize=app.config['PRODUCT_JSON_CACHE_MAXSIZE'])
+
+
+def _make_batch_fetch_pool():
+    # Pool acotado y compartido para las descargas de Open Food Facts de /api/products/batch
+    return ThreadPoolExecutor(max_workers=app.config['PRODUCT_BATCH_WORKERS'], thread_name_prefix='off-batch')
+
+
+def _make_product_popularity():
+    # Contadores de búsquedas por código de barras, volcados a `product_lookup_counts`
+    return PopularityTracker(
+        on_flush=lambda counts: _save_lookup_counts(counts),
+        flush_every=app.config['PRODUCT_POPULARITY_FLUSH_EVERY'],
+    )
+
+
+def _make_product_refresher():
+    # Refresco en segundo plano de los productos obsoletos: se sirven tal cual y se actualizan después
+    return ProductRefresher(
+        refresh=lambda barcode: refresh_product(barcode),
+        workers=app.config['PRODUCT_REFRESH_WORKERS'],
+        rate=app.config['PRODUCT_REFRESH_RATE'],
+        max_queue=app.config['PRODUCT_REFRESH_MAX_QUEUE'],
+        retry_after=app.config['PRODUCT_REFRESH_RETRY_AFTER'],
+    )
+
+
+session_tokens = _make_session_tokens()
+password_hasher = _make_password_hasher()
+product_cache = _make_product_cache()
+product_json = _make_product_json()
+# Agrupa las búsquedas concurrentes en Open Food Facts del mismo código de barras
+product_flights = SingleFlight()
+batch_fetch_pool = _make_batch_fetch_pool()
+product_popularity = _make_product_popularity()
+# Resultado del último precalentamiento de la caché
+cache_warmup_status = {"state": "pending"}
+product_refresher = _make_product_refresher()
+
+if app.config['METRICS_ENABLED']:
+    # Con las métricas desactivadas no se instala ningún gancho: coste cero por petición
+    install_request_metrics(app)
+    install_sql_metrics()
+
+
+def _collect_runtime_metrics():
+    # Se calcula solo al consultar /metrics
+    stats = product_cache.stats()
+    refresh_stats = product_refresher.stats()
+    catalog_stats = catalog.stats()
+    return [
+        ('product_cache_lookups_total', 'counter', 'Consultas a la caché de productos por resultado.',
+         [({"result": "hit"}, stats['hits']), ({"result": "negative_hit"}, stats['negative_hits']),
+          ({"result": "miss"}, stats['misses'])]),
+        ('product_cache_hit_ratio', 'gauge', 'Proporción de aciertos de la caché de productos.', [({}, stats['hit_ratio'])]),
+        ('product_cache_entries', 'gauge', 'Códigos de barras en la caché de productos.', [({}, stats['size'])]),
+        ('product_cache_evictions_total', 'counter', 'Entradas desalojadas de la caché de productos.', [({}, stats['evictions'])]),
+        ('product_json_cache_entries', 'gauge', 'Productos con el JSON ya codificado en memoria.', [({}, len(product_json))]),
+        ('openfoodfacts_fetches_in_flight', 'gauge', 'Descargas de Open Food Facts en curso (una por código).',
+         [({}, product_flights.in_flight())]),
+        ('product_refresh_queued', 'gauge', 'Productos obsoletos pendientes de refrescar.', [({}, refresh_stats['queued'])]),
+        ('product_refresh_total', 'counter', 'Refrescos de productos por resultado.',
+         [({"result": "changed"}, refresh_stats['changed']),
+          ({"result": "unchanged"}, refresh_stats['refreshed'] - refresh_stats['changed']),
+          ({"result": "failed"}, refresh_stats['failed']), ({"result": "dropped"}, refresh_stats['dropped'])]),
+        ('catalog_snapshot_products', 'gauge', 'Productos en la instantánea del catálogo.', [({}, catalog_stats['products'])]),
+        ('catalog_overlay_products', 'gauge', 'Productos nuevos o modificados desde la instantánea.', [({}, catalog_stats['overlay'])]),
+        ('catalog_lookups_total', 'counter', 'Búsquedas en la instantánea del catálogo por resultado.',
+         [({"result": "hit"}, catalog_stats['hits']), ({"result": "overlay_hit"}, catalog_stats['overlay_hits']),
+          ({"result": "miss"}, catalog_stats['misses'])]),
+    ]
+
+
+REGISTRY.add_collector(_collect_runtime_metrics)
+# Métricas sumadas entre los procesos de run.py (ver share_metrics); None con un solo proceso
+shared_metrics = None
+
+
+
+def utcnow():
+    # Fecha UTC sin zona horaria, como se guarda en las columnas DateTime
+    return datetime.now(timezone.utc).replace(tzinfo=None)
 
 
 user_favorites = db.Table('user_favorites',
@@ -42,31 +229,67 @@ class User(db.Model):
 
     
     def set_password(self, password):
-        self.password_hash = bcrypt.generate_password_hash(password).decode('utf-8')
+        self.password_hash = password_hasher.hash(password)
 
     def check_password(self, password):
-        return bcrypt.check_password_hash(self.password_hash, password)
+        return password_hasher.verify(password, self.password_hash)
 
 
 class Product(db.Model):
     __tablename__ = 'products' 
     id = db.Column(db.Integer, primary_key=True)
     barcode = db.Column(db.String(13), unique=True, nullable=False) 
+    # Clave GTIN-14 del código: UPC-A, EAN-13 y GTIN-14 del mismo producto comparten clave
+    gtin = db.Column(db.BigInteger, unique=True, index=True, nullable=True, default=gtin_default())
     name = db.Column(db.String(255), nullable=False)
     nutriscore = db.Column(db.String(1), nullable=True) 
     ecoscore = db.Column(db.String(2), nullable=True)   
     category = db.Column(db.String(100), nullable=True) 
-    
+    # Versión de la fila (la incrementa SQLAlchemy en cada UPDATE) para los ETag
+    version = db.Column(db.Integer, nullable=False, server_default='1')
+    updated_at = db.Column(db.DateTime, nullable=True, default=func.now(), onupdate=func.now(), index=True)
+    # Última descarga desde Open Food Facts (NULL en filas anteriores a esta columna)
+    fetched_at = db.Column(db.DateTime, nullable=True, default=utcnow, index=True)
+    # Posición de las notas (0 = mejor) para ordenar las alternativas por categoría
+    eco_rank = db.Column(db.SmallInteger, nullable=False, default=rank_default('ecoscore'), server_default=str(UNRANKED))
+    nutri_rank = db.Column(db.SmallInteger, nullable=False, default=rank_default('nutriscore'), server_default=str(UNRANKED))
+
+    __mapper_args__ = {'version_id_col': version}
+    __table_args__ = (db.Index('ix_products_category_rank', 'category', 'eco_rank', 'nutri_rank'),)
 
     def __repr__(self):
         return f'<Product {self.name} ({self.barcode})>'
 
+class ProductLookupCount(db.Model):
+    __tablename__ = 'product_lookup_counts'
+    barcode = db.Column(db.String(13), primary_key=True)
+    lookups = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<ProductLookupCount {self.barcode}: {self.lookups}>'
+
+class UserFootprintCount(db.Model):
+    # Favoritos de cada usuario por categoría y nota de Eco-Score: la huella se
+    # calcula con estas pocas filas, sin recorrer los favoritos (ver footprint.py)
+    __tablename__ = 'user_footprint_counts'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    category = db.Column(db.String(100), primary_key=True) # '' para los productos sin categoría
+    eco_rank = db.Column(db.SmallInteger, primary_key=True)
+    favorites = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<UserFootprintCount {self.user_id} {self.category!r} {self.eco_rank}: {self.favorites}>'
+
 class RegionalCo2Emission(db.Model):
     __tablename__ = 'regional_co2_emissions' 
     id = db.Column(db.Integer, primary_key=True)
     region_name = db.Column(db.String(100), nullable=False)
     year = db.Column(db.Integer, nullable=False)
     total_co2_tonnes = db.Column(db.Float, nullable=False)
+    version = db.Column(db.Integer, nullable=False, server_default='1')
+    updated_at = db.Column(db.DateTime, nullable=True, default=func.now(), onupdate=func.now())
+
+    __mapper_args__ = {'version_id_col': version}
 
     # Para asegurar que no haya entradas duplicadas para la misma región y año
     __table_args__ = (db.UniqueConstraint('region_name', 'year', name='_region_year_uc'),)
@@ -75,6 +298,105 @@ class RegionalCo2Emission(db.Model):
         return f'<Emission {self.region_name} {self.year}: {self.total_co2_tonnes} tonnes>'
 
 
+def _load_emission_rows():
+    return db.session.query(RegionalCo2Emission.id, RegionalCo2Emission.region_name,
+                            RegionalCo2Emission.year, RegionalCo2Emission.total_co2_tonnes).all()
+
+
+def _emission_rows_version():
+    # Resumen barato de la tabla: cambia con cada fila nueva, borrada o modificada
+    # (las modificaciones incrementan `version`)
+    return tuple(db.session.query(func.count(RegionalCo2Emission.id), func.max(RegionalCo2Emission.id),
+                                  func.sum(RegionalCo2Emission.version),
+                                  func.max(RegionalCo2Emission.updated_at)).one())
+
+
+# Índice en memoria de las emisiones: se construye en la primera consulta y se
+# vuelve a construir cuando cambia la tabla, en este proceso o en otro
+def _make_emissions_store():
+    return EmissionsStore(_load_emission_rows, _emission_rows_version,
+                          check_interval=app.config['EMISSIONS_CHECK_INTERVAL'])
+
+
+emissions_store = _make_emissions_store()
+
+
+# Índice de texto completo de nombre y categoría: se crea y se borra con la tabla
+install_search_index(Product.__table__)
+
+
+@event.listens_for(Product, 'before_update')
+def _update_derived_columns(mapper, connection, target):
+    # Las posiciones y la clave siguen a las notas y al código (al insertar las
+    # calculan los valores por defecto de las columnas)
+    target.eco_rank = grade_rank(target.ecoscore)
+    target.nutri_rank = grade_rank(target.nutriscore)
+    target.gtin = gtin_key(target.barcode)
+
+
+@event.listens_for(Product, 'before_update')
+def _move_footprint_counts(mapper, connection, target):
+    # Después de _update_derived_columns: si cambian la categoría o la nota, los
+    # favoritos del producto pasan a contar en su nueva casilla
+    committed = inspect(target).committed_state
+    old = (committed.get('category', target.category), committed.get('eco_rank', target.eco_rank))
+    move_footprint_counts(connection, target.id, old, (target.category, target.eco_rank))
+
+
+@event.listens_for(Product, 'after_update')
+@event.listens_for(Product, 'after_delete')
+def _invalidate_product_caches(mapper, connection, target):
+    # La fila ha cambiado: se descartan el JSON codificado y la entrada de la caché,
+    # y deja de leerse de la instantánea del catálogo hasta que la recoja el overlay
+    product_json.invalidate(target.id)
+    product_cache.invalidate(target.barcode)
+    catalog.mark_changed(target.gtin)
+
+
+def _load_catalog_overlay(max_id, since):
+    # Productos nuevos o modificados desde que se exportó la instantánea
+    with app.app_context():
+        products = Product.query.filter(
+            Product.gtin.isnot(None), or_(Product.id > max_id, Product.updated_at >= since)).all()
+        return [(product.gtin, product_to_dict(product)) for product in products]
+
+
+def _make_catalog():
+    # Instantánea del catálogo compartida entre procesos (mmap) con su overlay SQL
+    return CatalogStore(app.config['CATALOG_SNAPSHOT_FILE'], _load_catalog_overlay,
+                        check_interval=app.config['CATALOG_SNAPSHOT_CHECK_INTERVAL'], miss=MISS)
+
+
+def _make_footprint_factors():
+    # Factores de emisión por categoría (se recargan si cambian los archivos)
+    return FootprintFactorsStore(app.config['FOOTPRINT_FACTORS_FILES'],
+                                 check_interval=app.config['FOOTPRINT_FACTORS_CHECK_INTERVAL'])
+
+
+catalog = _make_catalog()
+footprint_factors = _make_footprint_factors()
+
+
+@event.listens_for(Session, 'after_flush')
+def _mark_emissions_changed(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, RegionalCo2Emission):
+            session.info['emissions_changed'] = True
+            return
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_emissions_index(session):
+    # Solo tras el commit, para que la reconstrucción vea los datos confirmados
+    if session.info.pop('emissions_changed', False):
+        emissions_store.invalidate()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_emissions_changes(session):
+    session.info.pop('emissions_changed', None)
+
+
 
 @app.route('/')
 def home():
@@ -83,62 +405,507 @@ def home():
     """
     return jsonify({"message": "¡Bienvenido al backend de tu startup! Flask está funcionando."})
 
+
+def lookup_product(barcode, track=True):
+    """
+    Busca un producto por código de barras: caché, base de datos local y,
+    por último, Open Food Facts (guardando el resultado en la BD).
+
+    Devuelve (producto, creado), donde producto es un diccionario o None si no
+    existe. Lanza OpenFoodFactsError si Open Food Facts no está disponible y
+    propaga los errores de la base de datos al guardar. Con track=False la
+    búsqueda no cuenta para la popularidad del producto. `barcode` debe venir
+    normalizado con canonical_barcode.
+    """
+    if track:
+        product_popularity.record(barcode)
+    cached = product_cache.get(barcode)
+    if cached is not MISS:
+        return cached, False
+
+    # La instantánea del catálogo ya es una caché compartida: no se copia en la de este proceso
+    key = gtin_key(barcode)
+    snapshot_data = catalog.lookup(key)
+    if snapshot_data is not MISS:
+        return snapshot_data, False
+
+    # 1. Intentar buscar el producto en nuestra propia base de datos (por su clave GTIN)
+    product = Product.query.filter_by(gtin=key).first()
+    if product:
+        print(f"Producto {barcode} encontrado en la base de datos local.")
+        product_data = product_to_dict(product)
+        product_cache.set(barcode, product_data)
+        if is_stale(product):
+            # Se sirve el dato que hay y se refresca en segundo plano (después de
+            # cachearlo, para que el refresco lo invalide y no al revés)
+            product_refresher.schedule(product.barcode)
+        return product_data, False
+
+    # 2. Si no está en nuestra BD, buscar en Open Food Facts. Las peticiones
+    # concurrentes del mismo código comparten una única descarga e inserción.
+    (product_data, created), shared = product_flights.do(
+        barcode, lambda: _fetch_and_store_product(barcode))
+    return product_data, created and not shared
+
+
+def _fetch_and_store_product(barcode):
+    # Otra petición puede haber terminado la descarga justo antes de entrar aquí
+    cached = product_cache.get(barcode, record_stats=False)
+    if cached is not MISS:
+        return cached, False
+
+    print(f"Producto {barcode} no encontrado localmente, buscando en Open Food Facts...")
+    off_product_data = get_product_by_barcode(barcode)
+    if not off_product_data:
+        product_cache.set_missing(barcode)
+        return None, False
+
+    # 3. Si se encuentra en Open Food Facts, guardarlo en nuestra BD
+    created = True
+    try:
+        new_product = Product(
+            barcode=barcode,
+            name=off_product_data['name'],
+            nutriscore=off_product_data['nutriscore'],
+            ecoscore=off_product_data['ecoscore'],
+            category=off_product_data['category']
+        )
+        db.session.add(new_product)
+        db.session.commit()
+        print(f"Producto {barcode} guardado exitosamente desde Open Food Facts.")
+    except IntegrityError:
+        # Otro proceso lo insertó a la vez: usamos su fila en lugar de fallar
+        db.session.rollback()
+        new_product = Product.query.filter_by(gtin=gtin_key(barcode)).first()
+        if new_product is None:
+            raise
+        created = False
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error al guardar el producto {barcode} en la base de datos: {e}")
+        raise
+
+    product_data = product_to_dict(new_product)
+    product_cache.set(barcode, product_data)
+    return product_data, created
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Métricas de la aplicación en formato de texto de Prometheus."""
+    if not app.config['METRICS_ENABLED']:
+        return jsonify({"error": "Las métricas están desactivadas."}), 404
+    body = shared_metrics.render() if shared_metrics is not None else REGISTRY.render()
+    return app.response_class(body, content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def invalid_barcode_response(barcode):
+    return jsonify({"error": f"El código de barras '{barcode}' no es válido "
+                             "(EAN-8, UPC-A, EAN-13 o GTIN-14 con su dígito de control)."}), 400
+
+
 @app.route('/api/products/search', methods=['GET'])
 def search_product():
     barcode = request.args.get('barcode') # Obtiene el código de barras de los parámetros de la URL (?barcode=...)
 
     if not barcode:
         return jsonify({"error": "Se requiere un código de barras para la búsqueda."}), 400
+    raw_barcode, barcode = barcode, canonical_barcode(barcode)
+    if barcode is None:
+        return invalid_barcode_response(raw_barcode)
 
-    # 1. Intentar buscar el producto en nuestra propia base de datos
-    product = Product.query.filter_by(barcode=barcode).first()
+    try:
+        product_data, created = lookup_product(barcode)
+    except OpenFoodFactsError:
+        return jsonify({"error": "Open Food Facts no está disponible en este momento."}), 503
+    except Exception:
+        return jsonify({"error": "Error interno al guardar el producto."}), 500
+
+    if product_data is None:
+        # 4. Si no se encuentra en ningún sitio
+        return jsonify({"message": f"Producto con código de barras '{raw_barcode}' no encontrado."}), 404
+
+    etag = f"p{product_data['id']}.{product_data['version']}"
+    cache_control = app.config['CACHE_CONTROL_PRODUCTS']
+    if not created:
+        cached_response = not_modified(etag, cache_control)
+        if cached_response:
+            return cached_response
+    response = json_response(product_json.encode(product_data), 201 if created else 200)
+    return apply_cache_headers(response, etag, cache_control)
+
+
+@app.route('/api/products/query', methods=['GET'])
+def query_products():
+    """
+    Busca productos por nombre y categoría (?q=leche entera), del más al menos
+    relevante. Cada palabra admite prefijos ("nutel" encuentra "Nutella").
 
-    if product:
-        # Si el producto ya está en nuestra BD, lo devolvemos
-        print(f"Producto {barcode} encontrado en la base de datos local.")
-        return jsonify({
-            "id": product.id,
-            "barcode": product.barcode,
-            "name": product.name,
-            "nutriscore": product.nutriscore,
-            "ecoscore": product.ecoscore,
-            "category": product.category
-        })
-    else:
-        # 2. Si no está en nuestra BD, buscar en Open Food Facts
-        print(f"Producto {barcode} no encontrado localmente, buscando en Open Food Facts...")
-        off_product_data = get_product_by_barcode(barcode)
+    Parámetros: q, limit y offset. Si hay más resultados, la cabecera
+    X-Next-Offset indica el `offset` de la página siguiente.
+    """
+    q = request.args.get('q', '')
+    if not q.strip():
+        return jsonify({"error": "Se requiere un texto de búsqueda (?q=)."}), 400
+    try:
+        limit = int(request.args.get('limit', app.config['PRODUCT_QUERY_PAGE_SIZE']))
+        offset = int(request.args.get('offset', 0))
+    except ValueError:
+        return jsonify({"error": "Los parámetros 'limit' y 'offset' deben ser números enteros válidos."}), 400
+    if limit < 1 or limit > app.config['PRODUCT_QUERY_MAX_PAGE_SIZE']:
+        return jsonify({"error": f"El parámetro 'limit' debe estar entre 1 y {app.config['PRODUCT_QUERY_MAX_PAGE_SIZE']}."}), 400
+    if offset < 0 or offset > app.config['PRODUCT_QUERY_MAX_OFFSET']:
+        return jsonify({"error": f"El parámetro 'offset' debe estar entre 0 y {app.config['PRODUCT_QUERY_MAX_OFFSET']}."}), 400
+
+    # Se pide un elemento más para saber si hay otra página
+    page = search_products(db.session, q, limit + 1, offset, model=Product)
+    has_more = len(page) > limit
+    page = page[:limit]
+
+    etag = etag_for(q, limit, offset, *(f"{p.id}.{p.version}" for p in page))
+    cache_control = app.config['CACHE_CONTROL_PRODUCT_QUERY']
+    response = not_modified(etag, cache_control)
+    if response:
+        return response
+
+    response = json_response(product_json.encode_list(page))
+    if has_more:
+        response.headers['X-Next-Offset'] = str(offset + limit)
+    return apply_cache_headers(response, etag, cache_control)
+
+
+@app.route('/api/products/<string:barcode>/alternatives', methods=['GET'])
+def product_alternatives(barcode):
+    """
+    Productos de la misma categoría con mejor Eco-Score (y, a igualdad, mejor
+    Nutri-Score) que el indicado, de mejor a peor. Parámetro: limit.
+    """
+    raw_barcode, barcode = barcode, canonical_barcode(barcode)
+    if barcode is None:
+        return invalid_barcode_response(raw_barcode)
+    try:
+        limit = int(request.args.get('limit', app.config['ALTERNATIVES_DEFAULT_LIMIT']))
+    except ValueError:
+        return jsonify({"error": "El parámetro 'limit' debe ser un número entero válido."}), 400
+    if limit < 1 or limit > app.config['ALTERNATIVES_MAX_LIMIT']:
+        return jsonify({"error": f"El parámetro 'limit' debe estar entre 1 y {app.config['ALTERNATIVES_MAX_LIMIT']}."}), 400
+
+    try:
+        product_data, _ = lookup_product(barcode, track=False)
+    except OpenFoodFactsError:
+        return jsonify({"error": "Open Food Facts no está disponible en este momento."}), 503
+    except Exception:
+        return jsonify({"error": "Error interno al guardar el producto."}), 500
+    if product_data is None:
+        return jsonify({"message": f"Producto con código de barras '{raw_barcode}' no encontrado."}), 404
+
+    alternatives = []
+    if product_data['category']:
+        alternatives = db.session.execute(alternatives_query(Product, product_data, limit)).scalars().all()
+
+    etag = etag_for(barcode, limit, product_data['version'], *(f"{p.id}.{p.version}" for p in alternatives))
+    cache_control = app.config['CACHE_CONTROL_ALTERNATIVES']
+    response = not_modified(etag, cache_control)
+    if response:
+        return response
+    response = json_response(product_json.encode_list(alternatives))
+    return apply_cache_headers(response, etag, cache_control)
+
+
+@app.route('/api/products/cache', methods=['GET'])
+def product_cache_stats():
+    """
+    Contadores de la caché de productos (aciertos, fallos, desalojos...)
+    y resultado del último precalentamiento.
+    """
+    stats = product_cache.stats()
+    stats["warmup"] = cache_warmup_status
+    return jsonify(stats)
+
+
+def stale_cutoff():
+    return utcnow() - timedelta(seconds=app.config['PRODUCT_MAX_AGE'])
+
+
+def is_stale(product):
+    """Indica si los datos de un producto tienen más de PRODUCT_MAX_AGE segundos."""
+    return product.fetched_at is None or product.fetched_at < stale_cutoff()
+
+
+# Campos que se actualizan al refrescar un producto desde Open Food Facts
+REFRESHED_FIELDS = ('name', 'nutriscore', 'ecoscore', 'category')
+
+
+def refresh_product(barcode):
+    """
+    Vuelve a descargar un producto de Open Food Facts y actualiza su fila.
+    Devuelve True si ha cambiado algún campo. Se ejecuta en los hilos del refresco.
+    """
+    off_product_data = get_product_by_barcode(barcode)
+    with app.app_context():
+        product = Product.query.filter_by(barcode=barcode).first()
+        if product is None:
+            return False
+        # Si Open Food Facts ya no lo tiene se conservan los datos que había
+        changed = off_product_data is not None and any(
+            getattr(product, field) != off_product_data[field] for field in REFRESHED_FIELDS)
+        try:
+            if changed:
+                # UPDATE del ORM: incrementa la versión e invalida las cachés del producto
+                for field in REFRESHED_FIELDS:
+                    setattr(product, field, off_product_data[field])
+                product.fetched_at = utcnow()
+            else:
+                # Sin cambios solo se anota la fecha, sin cambiar la versión (ni el ETag)
+                db.session.execute(Product.__table__.update()
+                                   .where(Product.__table__.c.id == product.id)
+                                   .values(fetched_at=utcnow()))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+    return changed
+
+
+def sweep_stale_products(limit=None):
+    """
+    Encola para refrescar los `limit` productos obsoletos más antiguos y devuelve
+    cuántos se han encolado. Esta función asume que se llama dentro de un `app.app_context()`.
+    """
+    limit = app.config['PRODUCT_REFRESH_SWEEP_BATCH'] if limit is None else limit
+    barcodes = db.session.execute(
+        select(Product.barcode)
+        .where(or_(Product.fetched_at.is_(None), Product.fetched_at < stale_cutoff()))
+        .order_by(Product.fetched_at.asc().nulls_first())
+        .limit(limit)
+    ).scalars().all()
+    return sum(product_refresher.schedule(barcode) for barcode in barcodes)
+
+
+def start_refresh_sweeper(interval=None):
+    """Lanza el barrido periódico de productos obsoletos en un hilo en segundo plano."""
+    interval = app.config['PRODUCT_REFRESH_SWEEP_INTERVAL'] if interval is None else interval
+
+    def run():
+        while True:
+            with app.app_context():
+                try:
+                    scheduled = sweep_stale_products()
+                    if scheduled:
+                        print(f"Barrido de productos obsoletos: {scheduled} encolados para refrescar.")
+                except Exception as e:
+                    print(f"Error en el barrido de productos obsoletos: {e}")
+            time.sleep(interval)
+
+    thread = threading.Thread(target=run, name='product-refresh-sweeper', daemon=True)
+    thread.start()
+    return thread
+
+
+def _save_lookup_counts(counts):
+    # Suma los contadores pendientes a los guardados, en una sola sentencia por lote
+    # (en su propio contexto, y por tanto su propia sesión, para no mezclarse con la de la petición)
+    rows = [{"barcode": barcode, "lookups": n} for barcode, n in counts.items()]
+    with app.app_context():
+        db.session.execute(text('''
+            INSERT INTO product_lookup_counts (barcode, lookups) VALUES (:barcode, :lookups)
+            ON CONFLICT (barcode) DO UPDATE SET lookups = product_lookup_counts.lookups + excluded.lookups
+        '''), rows)
+        db.session.commit()
 
-        if off_product_data:
-            # 3. Si se encuentra en Open Food Facts, guardarlo en nuestra BD
+
+def load_seed_barcodes(file_path):
+    """Lee un archivo con un código de barras por línea (se ignoran comentarios y texto tras el código)."""
+    if not file_path or not os.path.exists(file_path):
+        return []
+    barcodes = []
+    with open(file_path, encoding='utf-8') as f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            if line:
+                barcodes.append(line.split()[0])
+    return barcodes
+
+
+def warm_product_cache(top_n=None, seed_barcodes=None, fetch_missing=True):
+    """
+    Precarga en la caché los `top_n` códigos más buscados (desde la BD local) y
+    los códigos semilla (por el camino normal de búsqueda, incluido Open Food Facts).
+    Con fetch_missing=False los códigos semilla que no están en la BD local se omiten.
+    Esta función asume que se llama dentro de un `app.app_context()`.
+    """
+    top_n = app.config['PRODUCT_CACHE_WARMUP_TOP_N'] if top_n is None else top_n
+    if seed_barcodes is None:
+        seed_barcodes = load_seed_barcodes(app.config['PRODUCT_CACHE_SEED_FILE'])
+
+    started = time.perf_counter()
+    cache_warmup_status.update({"state": "running"})
+    loaded = 0
+
+    if top_n > 0:
+        popular = (Product.query
+                   .join(ProductLookupCount, ProductLookupCount.barcode == Product.barcode)
+                   .order_by(ProductLookupCount.lookups.desc())
+                   .limit(top_n)
+                   .all())
+        for product in popular:
+            product_cache.set(product.barcode, product_to_dict(product))
+            loaded += 1
+
+    for raw_barcode in seed_barcodes:
+        barcode = canonical_barcode(raw_barcode)
+        if barcode is None:
+            print(f"Código semilla no válido, se ignora: {raw_barcode}")
+            continue
+        if product_cache.get(barcode, record_stats=False) is not MISS:
+            continue
+        if not fetch_missing:
+            product = Product.query.filter_by(gtin=gtin_key(barcode)).first()
+            if product is not None:
+                product_cache.set(barcode, product_to_dict(product))
+                loaded += 1
+            continue
+        try:
+            product_data, _ = lookup_product(barcode, track=False)
+        except Exception as e:
+            print(f"No se pudo precargar el producto {barcode}: {e}")
+            continue
+        if product_data is not None:
+            loaded += 1
+
+    elapsed = time.perf_counter() - started
+    cache_warmup_status.update({"state": "done", "loaded": loaded, "seconds": round(elapsed, 3)})
+    print(f"Caché de productos precalentada: {loaded} productos en {elapsed:.2f}s.")
+    return cache_warmup_status
+
+
+def start_cache_warmup():
+    """Lanza el precalentamiento en segundo plano para no retrasar el arranque."""
+    def run():
+        with app.app_context():
             try:
-                new_product = Product(
-                    barcode=off_product_data['barcode'],
-                    name=off_product_data['name'],
-                    nutriscore=off_product_data['nutriscore'],
-                    ecoscore=off_product_data['ecoscore'],
-                    category=off_product_data['category']
-                )
-                db.session.add(new_product)
-                db.session.commit()
-                print(f"Producto {barcode} guardado exitosamente desde Open Food Facts.")
-
-                # Devolver la información del producto recién guardado
-                return jsonify({
-                    "id": new_product.id,
-                    "barcode": new_product.barcode,
-                    "name": new_product.name,
-                    "nutriscore": new_product.nutriscore,
-                    "ecoscore": new_product.ecoscore,
-                    "category": new_product.category
-                }), 201 
+                warm_product_cache()
             except Exception as e:
-                db.session.rollback() 
-                print(f"Error al guardar el producto {barcode} en la base de datos: {e}")
-                return jsonify({"error": "Error interno al guardar el producto."}), 500
+                cache_warmup_status.update({"state": "failed", "error": str(e)})
+                print(f"Error al precalentar la caché de productos: {e}")
+
+    thread = threading.Thread(target=run, name='cache-warmup', daemon=True)
+    thread.start()
+    return thread
+
+
+# Guarda los contadores de popularidad pendientes al cerrar el proceso
+atexit.register(lambda: product_popularity.flush()) # El vigente, aunque create_app lo sustituya
+
+
+def _fetch_from_openfoodfacts(barcode):
+    # Se ejecuta en el pool de descargas: no toca la base de datos
+    try:
+        return barcode, get_product_by_barcode(barcode), None
+    except OpenFoodFactsError as e:
+        return barcode, None, e
+
+
+def insert_new_products(rows):
+    """
+    Inserta las filas de productos que aún no existen (INSERT ... ON CONFLICT DO
+    NOTHING, en SQLite y PostgreSQL) y devuelve los códigos insertados.
+    """
+    dialect_insert = postgresql_insert if db.session.get_bind().dialect.name == 'postgresql' else sqlite_insert
+    statement = dialect_insert(Product.__table__).on_conflict_do_nothing().returning(Product.__table__.c.barcode)
+    return set(db.session.execute(statement, rows).scalars())
+
+
+@app.route('/api/products/batch', methods=['POST'])
+def search_products_batch():
+    """
+    Resuelve varios códigos de barras en una sola petición.
+
+    Los productos locales se leen con una única consulta IN (...), los que faltan
+    se descargan de Open Food Facts en paralelo y se guardan en una sola
+    transacción. Devuelve un resultado y un estado por cada código:
+    'found', 'created', 'not_found', 'unavailable' o 'invalid'. Los códigos
+    que son el mismo producto (p. ej. UPC-A y EAN-13) se buscan una sola vez.
+    """
+    data = request.get_json(silent=True) or {}
+    barcodes = data.get('barcodes')
+
+    if not isinstance(barcodes, list) or not barcodes or not all(isinstance(b, str) and b for b in barcodes):
+        return jsonify({"error": "Se requiere una lista 'barcodes' con códigos de barras."}), 400
+    if len(barcodes) > app.config['PRODUCT_BATCH_MAX_SIZE']:
+        return jsonify({"error": f"Se admiten como máximo {app.config['PRODUCT_BATCH_MAX_SIZE']} códigos por petición."}), 400
+
+    unique_barcodes = list(dict.fromkeys(barcodes))
+    canonical = {barcode: canonical_barcode(barcode) for barcode in unique_barcodes}
+    wanted = list(dict.fromkeys(c for c in canonical.values() if c))
+    results = {} # código normalizado -> (estado, producto)
+    for barcode in barcodes:
+        if canonical[barcode]:
+            product_popularity.record(canonical[barcode])
+
+    # 1. Caché en memoria
+    pending = []
+    for barcode in wanted:
+        cached = product_cache.get(barcode)
+        if cached is MISS:
+            pending.append(barcode)
+        elif cached is None:
+            results[barcode] = ('not_found', None)
+        else:
+            results[barcode] = ('found', cached)
+
+    # 2. Una sola consulta a la base de datos local para todos los pendientes
+    if pending:
+        for product in Product.query.filter(Product.gtin.in_([gtin_key(b) for b in pending])).all():
+            product_data = product_to_dict(product)
+            product_cache.set(product.barcode, product_data)
+            if is_stale(product):
+                product_refresher.schedule(product.barcode)
+            results[product.barcode] = ('found', product_data)
+    missing = [b for b in pending if b not in results]
+
+    # 3. Descarga concurrente desde Open Food Facts de los que faltan
+    fetched = {}
+    for barcode, off_product_data, error in batch_fetch_pool.map(_fetch_from_openfoodfacts, missing):
+        if error is not None:
+            results[barcode] = ('unavailable', None)
+        elif not off_product_data:
+            product_cache.set_missing(barcode)
+            results[barcode] = ('not_found', None)
         else:
-            # 4. Si no se encuentra en ningún sitio
-            return jsonify({"message": f"Producto con código de barras '{barcode}' no encontrado."}), 404
+            fetched[barcode] = off_product_data
+
+    # 4. Guardar todos los productos nuevos en una sola sentencia. Los que otra
+    # petición haya insertado a la vez se saltan (ON CONFLICT DO NOTHING) y se
+    # leen de la BD: un conflicto no hace perder el resto del lote.
+    if fetched:
+        rows = [{"barcode": barcode, "name": off_product_data['name'],
+                 "nutriscore": off_product_data['nutriscore'], "ecoscore": off_product_data['ecoscore'],
+                 "category": off_product_data['category']}
+                for barcode, off_product_data in fetched.items()]
+        try:
+            created = insert_new_products(rows)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error al guardar el lote de productos en la base de datos: {e}")
+            return jsonify({"error": "Error interno al guardar los productos."}), 500
+
+        stored = {p.barcode: p for p in Product.query.filter(Product.gtin.in_([gtin_key(b) for b in fetched])).all()}
+        for barcode in fetched:
+            product = stored.get(barcode)
+            if product is None:
+                results[barcode] = ('unavailable', None)
+                continue
+            product_data = product_to_dict(product)
+            product_cache.set(barcode, product_data)
+            results[barcode] = ('created' if barcode in created else 'found', product_data)
+
+    response = []
+    for barcode in unique_barcodes:
+        status, product_data = results[canonical[barcode]] if canonical[barcode] else ('invalid', None)
+        response.append({"barcode": barcode, "status": status, "product": product_data})
+    return jsonify({"results": response}), 200
 
 
 @app.route('/api/emissions', methods=['GET'])
@@ -154,21 +921,80 @@ def get_emissions():
     except ValueError:
         return jsonify({"error": "El parámetro 'year' debe ser un número entero válido."}), 400
 
-    # Buscar la emisión en la base de datos
-    emission = RegionalCo2Emission.query.filter_by(region_name=region_name, year=year).first()
+    # Buscar la emisión en el índice en memoria (sin consulta SQL)
+    index = emissions_store.get()
+    emission = index.lookup(region_name, year)
 
     if emission:
-        return jsonify({
-            "id": emission.id,
-            "region_name": emission.region_name,
-            "year": emission.year,
-            "total_co2_tonnes": emission.total_co2_tonnes
-        })
+        cache_control = app.config['CACHE_CONTROL_EMISSIONS']
+        return (not_modified(index.etag, cache_control)
+                or apply_cache_headers(jsonify(emission), index.etag, cache_control))
     else:
         return jsonify({"message": f"No se encontraron datos de emisión para la región '{region_name}' y el año '{year}'."}), 404
 
 
 
+@app.route('/api/emissions/series', methods=['GET'])
+def get_emissions_series():
+    """
+    Serie temporal de emisiones de una región en una sola respuesta.
+
+    Parámetros: region (obligatorio), from y to (años, opcionales),
+    aggregates (lista separada por comas de yoy, rolling, cumulative y base),
+    window (años de la media móvil, 3 por defecto) y base_year (1990 por defecto).
+    """
+    region_name = request.args.get('region')
+    if not region_name:
+        return jsonify({"error": "Se requiere el parámetro 'region'."}), 400
+
+    try:
+        year_from = int(request.args['from']) if 'from' in request.args else None
+        year_to = int(request.args['to']) if 'to' in request.args else None
+        window = int(request.args.get('window', 3))
+        base_year = int(request.args.get('base_year', 1990))
+    except ValueError:
+        return jsonify({"error": "Los parámetros 'from', 'to', 'window' y 'base_year' deben ser números enteros válidos."}), 400
+    if window < 1:
+        return jsonify({"error": "El parámetro 'window' debe ser mayor que 0."}), 400
+
+    aggregates = [a.strip() for a in request.args.get('aggregates', '').split(',') if a.strip()]
+    unknown = [a for a in aggregates if a not in SERIES_AGGREGATES]
+    if unknown:
+        return jsonify({"error": f"Agregados no válidos: {', '.join(unknown)}. Se admiten: {', '.join(SERIES_AGGREGATES)}."}), 400
+
+    index = emissions_store.get()
+    series = index.range(region_name, year_from, year_to)
+    if series is None or len(series[0]) == 0:
+        return jsonify({"message": f"No se encontraron datos de emisión para la región '{region_name}' en el rango indicado."}), 404
+    base_tonnes = None
+    if 'base' in aggregates:
+        base = index.lookup(region_name, base_year)
+        if base is None:
+            return jsonify({"error": f"No hay datos de emisión para el año base '{base_year}'."}), 400
+        base_tonnes = base['total_co2_tonnes']
+
+    # Con los parámetros ya validados, la respuesta solo depende de la URL y de los datos del índice
+    cache_control = app.config['CACHE_CONTROL_EMISSIONS']
+    cached_response = not_modified(index.etag, cache_control)
+    if cached_response:
+        return cached_response
+    years, tonnes = series
+
+    columns, summary = compute_series(years, tonnes, aggregates, window=window, base_tonnes=base_tonnes)
+    points = [dict(zip(columns, values)) for values in zip(*columns.values())]
+    if base_tonnes is not None:
+        summary["base_year"] = base_year
+
+    response = jsonify({
+        "region_name": region_name,
+        "from": points[0]["year"],
+        "to": points[-1]["year"],
+        "points": points,
+        "summary": summary,
+    })
+    return apply_cache_headers(response, index.etag, cache_control)
+
+
 @app.route('/api/users/register', methods=['POST'])
 def register_user():
     data = request.get_json() 
@@ -191,7 +1017,10 @@ def register_user():
 
     # Crear nuevo usuario
     new_user = User(username=username, email=email)
-    new_user.set_password(password) # Cifra la contraseña antes de guardarla
+    try:
+        new_user.set_password(password) # Cifra la contraseña antes de guardarla
+    except HasherBusyError:
+        return jsonify({"error": "Servidor ocupado, inténtalo de nuevo en unos segundos."}), 503, {"Retry-After": "1"}
 
     try:
         db.session.add(new_user)
@@ -214,109 +1043,352 @@ def login_user():
 
     user = User.query.filter_by(username=username).first()
 
-    if user and user.check_password(password):
-        return jsonify({"message": "Inicio de sesión exitoso.", "user_id": user.id}), 200
+    try:
+        valid = user is not None and user.check_password(password)
+    except HasherBusyError:
+        return jsonify({"error": "Servidor ocupado, inténtalo de nuevo en unos segundos."}), 503, {"Retry-After": "1"}
+
+    if valid:
+        if password_hasher.needs_rehash(user.password_hash):
+            # El factor de trabajo configurado ha cambiado: se rehace el hash con la contraseña en claro
+            try:
+                user.set_password(password)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                print(f"No se pudo actualizar el hash de la contraseña del usuario {user.id}: {e}")
+        token, expires_at = session_tokens.issue(user.id)
+        return jsonify({"message": "Inicio de sesión exitoso.", "user_id": user.id,
+                        "token": token, "expires_at": expires_at}), 200
     else:
         return jsonify({"error": "Nombre de usuario o contraseña incorrectos."}), 401 
 
+def authorize_user(user_id):
+    """
+    Comprueba el acceso a las rutas de un usuario. Devuelve None si se permite o
+    la respuesta de error.
+
+    Hace falta 'Authorization: Bearer <token>' (el token que devuelve el login).
+    Basta con validar su firma, sin consultar la BD.
+    """
+    auth_header = request.headers.get('Authorization', '')
+    if not auth_header.startswith('Bearer '):
+        return jsonify({"error": "Se requiere un token de sesión (cabecera Authorization: Bearer)."}), 401
+    token_user_id = session_tokens.verify(auth_header[len('Bearer '):].strip())
+    if token_user_id is None:
+        return jsonify({"error": "Token de sesión inválido o caducado."}), 401
+    if token_user_id != user_id:
+        return jsonify({"error": "El token de sesión no corresponde a este usuario."}), 403
+    return None
+
+
 @app.route('/api/users/<int:user_id>/favorites', methods=['POST'])
 def add_favorite(user_id):
-    user = User.query.get(user_id)
-    if not user:
-        return jsonify({"error": "Usuario no encontrado."}), 404
+    auth_error = authorize_user(user_id)
+    if auth_error:
+        return auth_error
 
     data = request.get_json()
     product_barcode = data.get('barcode')
 
     if not product_barcode:
         return jsonify({"error": "Se requiere el código de barras del producto."}), 400
+    raw_barcode, product_barcode = product_barcode, canonical_barcode(product_barcode)
+    if product_barcode is None:
+        return invalid_barcode_response(raw_barcode)
 
-    # Primero, busca el producto en la base de datos local
-    product = Product.query.filter_by(barcode=product_barcode).first()
+    # Busca el producto (caché, BD local u Open Food Facts)
+    try:
+        product_data, _ = lookup_product(product_barcode)
+    except OpenFoodFactsError:
+        return jsonify({"error": "Open Food Facts no está disponible en este momento."}), 503
+    except Exception:
+        return jsonify({"error": "Error interno al procesar el producto para favoritos."}), 500
 
-    
-    if not product:
-        off_product_data = get_product_by_barcode(product_barcode)
-        if off_product_data:
-            try:
-                product = Product(
-                    barcode=off_product_data['barcode'],
-                    name=off_product_data['name'],
-                    nutriscore=off_product_data['nutriscore'],
-                    ecoscore=off_product_data['ecoscore'],
-                    category=off_product_data['category']
-                )
-                db.session.add(product)
-                db.session.commit()
-                print(f"Producto {product_barcode} guardado desde Open Food Facts antes de añadir a favoritos.")
-            except Exception as e:
-                db.session.rollback()
-                print(f"Error al guardar producto desde Open Food Facts para favoritos: {e}")
-                return jsonify({"error": "Error interno al procesar el producto para favoritos."}), 500
-        else:
-            return jsonify({"error": f"Producto con código de barras '{product_barcode}' no encontrado en Open Food Facts."}), 404
+    if product_data is None:
+        return jsonify({"error": f"Producto con código de barras '{raw_barcode}' no encontrado en Open Food Facts."}), 404
 
-    # Verificar si el producto ya es favorito
-    if product in user.favorites:
+    product_id = product_data['id']
+
+    # Verificar si el producto ya es favorito (una consulta sobre la clave primaria)
+    if is_favorite(user_id, product_id):
         return jsonify({"message": "El producto ya está en favoritos."}), 200 
 
-    user.favorites.append(product)
     try:
+        db.session.execute(insert(user_favorites).values(user_id=user_id, product_id=product_id))
+        db.session.execute(ADD_FAVORITE_SQL, {"user_id": user_id, "product_id": product_id})
         db.session.commit()
-        return jsonify({"message": "Producto añadido a favoritos.", "product_id": product.id}), 201
+        return jsonify({"message": "Producto añadido a favoritos.", "product_id": product_id}), 201
+    except IntegrityError:
+        # Otra petición lo añadió a la vez
+        db.session.rollback()
+        return jsonify({"message": "El producto ya está en favoritos."}), 200
     except Exception as e:
         db.session.rollback()
         print(f"Error al añadir producto a favoritos: {e}")
         return jsonify({"error": "Error interno al añadir producto a favoritos."}), 500
 
 
+def is_favorite(user_id, product_id):
+    """Comprueba si un producto está en los favoritos de un usuario sin cargar la lista."""
+    return db.session.execute(
+        select(user_favorites.c.product_id)
+        .where(user_favorites.c.user_id == user_id, user_favorites.c.product_id == product_id)
+        .limit(1)
+    ).first() is not None
+
+
+def get_local_product_id(barcode):
+    """Id del producto en la BD local (pasando por la caché), sin consultar Open Food Facts."""
+    cached = product_cache.get(barcode)
+    if cached is not MISS:
+        return cached['id'] if cached else None
+    key = gtin_key(barcode)
+    snapshot_data = catalog.lookup(key)
+    if snapshot_data is not MISS:
+        return snapshot_data['id']
+    return db.session.execute(select(Product.id).where(Product.gtin == key)).scalar()
+
+
 @app.route('/api/users/<int:user_id>/favorites/<string:barcode>', methods=['DELETE'])
 def remove_favorite(user_id, barcode):
-    user = User.query.get(user_id)
-    if not user:
-        return jsonify({"error": "Usuario no encontrado."}), 404
-
-    product = Product.query.filter_by(barcode=barcode).first()
-    if not product:
+    auth_error = authorize_user(user_id)
+    if auth_error:
+        return auth_error
+    raw_barcode, barcode = barcode, canonical_barcode(barcode)
+    if barcode is None:
+        return invalid_barcode_response(raw_barcode)
+
+    product_id = get_local_product_id(barcode)
+    if not product_id:
         return jsonify({"error": "Producto no encontrado."}), 404
 
-    if product not in user.favorites:
-        return jsonify({"message": "El producto no está en favoritos de este usuario."}), 404 
-
-    user.favorites.remove(product)
     try:
+        result = db.session.execute(
+            delete(user_favorites)
+            .where(user_favorites.c.user_id == user_id, user_favorites.c.product_id == product_id))
+        if result.rowcount:
+            db.session.execute(REMOVE_FAVORITE_SQL, {"user_id": user_id, "product_id": product_id})
         db.session.commit()
-        return jsonify({"message": "Producto eliminado de favoritos."}), 200
     except Exception as e:
         db.session.rollback()
         print(f"Error al eliminar producto de favoritos: {e}")
         return jsonify({"error": "Error interno al eliminar producto de favoritos."}), 500
 
+    if result.rowcount == 0:
+        return jsonify({"message": "El producto no está en favoritos de este usuario."}), 404 
+    return jsonify({"message": "Producto eliminado de favoritos."}), 200
+
 @app.route('/api/users/<int:user_id>/favorites', methods=['GET'])
 def get_favorites(user_id):
-    user = User.query.get(user_id)
-    if not user:
-        return jsonify({"error": "Usuario no encontrado."}), 404
+    """
+    Lista los favoritos de un usuario ordenados por id de producto, por páginas.
 
-    # Obtener los productos favoritos y formatearlos para la respuesta JSON
-    favorite_products = []
-    for product in user.favorites:
-        favorite_products.append({
-            "id": product.id,
-            "barcode": product.barcode,
-            "name": product.name,
-            "nutriscore": product.nutriscore,
-            "ecoscore": product.ecoscore,
-            "category": product.category
-        })
+    Parámetros: after (id del último producto de la página anterior) y limit.
+    La respuesta incluye las cabeceras X-Total-Count (total de favoritos) y,
+    si hay más páginas, X-Next-After con el valor de `after` para la siguiente.
+    """
+    auth_error = authorize_user(user_id)
+    if auth_error:
+        return auth_error
 
-    return jsonify(favorite_products), 200
+    try:
+        after = int(request.args.get('after', 0))
+        limit = int(request.args.get('limit', app.config['FAVORITES_PAGE_SIZE']))
+    except ValueError:
+        return jsonify({"error": "Los parámetros 'after' y 'limit' deben ser números enteros válidos."}), 400
+    if limit < 1 or limit > app.config['FAVORITES_MAX_PAGE_SIZE']:
+        return jsonify({"error": f"El parámetro 'limit' debe estar entre 1 y {app.config['FAVORITES_MAX_PAGE_SIZE']}."}), 400
+
+    # Se pide un elemento más para saber si hay otra página
+    page = db.session.execute(
+        select(Product)
+        .join(user_favorites, user_favorites.c.product_id == Product.id)
+        .where(user_favorites.c.user_id == user_id, user_favorites.c.product_id > after)
+        .order_by(user_favorites.c.product_id)
+        .limit(limit + 1)
+    ).scalars().all()
+    total = db.session.execute(
+        select(func.count()).select_from(user_favorites).where(user_favorites.c.user_id == user_id)
+    ).scalar()
+
+    has_more = len(page) > limit
+    page = page[:limit]
+
+    # El ETag sale de los ids y versiones de la página, sin serializarla
+    etag = etag_for(user_id, after, limit, total, *(f"{p.id}.{p.version}" for p in page))
+    cache_control = app.config['CACHE_CONTROL_FAVORITES']
+    response = not_modified(etag, cache_control, vary='Authorization')
+    if response:
+        return response
+
+    # La lista se construye concatenando el JSON ya codificado de cada producto
+    response = json_response(product_json.encode_list(page))
+    response.headers['X-Total-Count'] = str(total)
+    if has_more:
+        response.headers['X-Next-After'] = str(page[-1].id)
+    return apply_cache_headers(response, etag, cache_control, vary='Authorization'), 200
+
+
+@app.route('/api/users/<int:user_id>/footprint', methods=['GET'])
+def get_footprint(user_id):
+    """
+    Huella de carbono de los favoritos de un usuario: el factor de emisión de la
+    categoría de cada producto (kg CO2e por kg) ponderado por su Eco-Score, en
+    total y por categoría. Se calcula con los contadores por categoría y nota,
+    que se actualizan al añadir o quitar favoritos, sin recorrer la lista.
+    """
+    auth_error = authorize_user(user_id)
+    if auth_error:
+        return auth_error
+
+    factors = footprint_factors.get()
+    if factors is None:
+        return jsonify({"error": "Los factores de emisión no están disponibles en este momento."}), 503
+
+    rows = db.session.execute(
+        select(UserFootprintCount.category, UserFootprintCount.eco_rank, UserFootprintCount.favorites)
+        .where(UserFootprintCount.user_id == user_id, UserFootprintCount.favorites > 0)
+    ).all()
+
+    # El ETag sale de los contadores y de la versión de los factores
+    etag = etag_for(user_id, factors.etag, *(f"{c}.{r}.{n}" for c, r, n in rows))
+    cache_control = app.config['CACHE_CONTROL_FAVORITES']
+    response = not_modified(etag, cache_control, vary='Authorization')
+    if response:
+        return response
+
+    footprint = factors.footprint(rows)
+    return apply_cache_headers(jsonify({"user_id": user_id, **footprint}), etag, cache_control,
+                               vary='Authorization'), 200
+
+# --- ARRANQUE Y CICLO DE VIDA DE LOS PROCESOS ---
+
+# Componentes que se vuelven a construir si cambia alguna de sus claves: (nombre, claves, constructor)
+_CONFIGURED_COMPONENTS = [
+    ('session_tokens', ('SECRET_KEY', 'SESSION_TOKEN_TTL'), _make_session_tokens),
+    ('password_hasher', ('BCRYPT_LOG_ROUNDS', 'PASSWORD_HASH_WORKERS', 'PASSWORD_HASH_MAX_PENDING'),
+     _make_password_hasher),
+    ('product_cache', ('PRODUCT_CACHE_MAXSIZE', 'PRODUCT_CACHE_TTL', 'PRODUCT_CACHE_NEGATIVE_TTL'),
+     _make_product_cache),
+    ('product_json', ('PRODUCT_JSON_CACHE_MAXSIZE',), _make_product_json),
+    ('batch_fetch_pool', ('PRODUCT_BATCH_WORKERS',), _make_batch_fetch_pool),
+    ('product_popularity', ('PRODUCT_POPULARITY_FLUSH_EVERY',), _make_product_popularity),
+    ('product_refresher', ('PRODUCT_REFRESH_WORKERS', 'PRODUCT_REFRESH_RATE', 'PRODUCT_REFRESH_MAX_QUEUE',
+                           'PRODUCT_REFRESH_RETRY_AFTER'), _make_product_refresher),
+    ('emissions_store', ('EMISSIONS_CHECK_INTERVAL',), _make_emissions_store),
+    ('catalog', ('CATALOG_SNAPSHOT_FILE', 'CATALOG_SNAPSHOT_CHECK_INTERVAL'), _make_catalog),
+    ('footprint_factors', ('FOOTPRINT_FACTORS_FILES', 'FOOTPRINT_FACTORS_CHECK_INTERVAL'), _make_footprint_factors),
+]
+
+
+def _import_time_key(key):
+    # El motor de la BD (Flask-SQLAlchemy lee sus SQLALCHEMY_* en db = SQLAlchemy(app))
+    # y los ganchos de las métricas se instalan al importar el módulo
+    return key.startswith('SQLALCHEMY_') or key == 'METRICS_ENABLED'
+
+
+def create_app(config=None):
+    """
+    Devuelve la aplicación con `config` aplicada sobre la configuración por
+    defecto y vuelve a construir los componentes cuyas claves cambian (cachés,
+    pools, tokens...). Las rutas y extensiones se registran al importar este
+    módulo, así que hay una sola aplicación por proceso: hay que llamarla antes
+    de usarla (quien ya importó un componente con `from app import ...` se queda
+    con el anterior). La base de datos y las métricas no se pueden cambiar aquí
+    (ValueError): se eligen antes de importar, con DATABASE_URL, DB_POOL_SIZE,
+    DB_MAX_OVERFLOW y METRICS_ENABLED. No crea ni modifica tablas (ver init_database).
+    """
+    config = dict(config or {})
+    changed = {key for key, value in config.items() if key not in app.config or app.config[key] != value}
+    fixed = sorted(key for key in changed if _import_time_key(key))
+    if fixed:
+        raise ValueError(f"Estas claves solo se leen al importar la aplicación: {', '.join(fixed)}. "
+                         "Se fijan con variables de entorno antes de importarla.")
+    app.config.update(config)
+    for name, keys, make in _CONFIGURED_COMPONENTS:
+        if changed.intersection(keys):
+            old = globals()[name]
+            globals()[name] = make()
+            # Se cierran los pools y se guardan los contadores pendientes del anterior
+            if hasattr(old, 'flush'):
+                old.flush()
+            if hasattr(old, 'shutdown'):
+                old.shutdown()
+    return app
+
+
+def init_database():
+    """Crea las tablas que falten y aplica las actualizaciones del esquema y del índice de búsqueda."""
+    with app.app_context():
+        db.create_all()
+        added = upgrade_schema(db.engine)
+        ensure_search_index(db.engine)
+    print("Base de datos y tablas creadas (si no existían).")
+    return added
+
+
+def preload_app():
+    """
+    Carga los datos calientes (índice de emisiones, instantánea del catálogo,
+    factores de emisión y caché de productos) en el proceso que luego se divide con fork, para que
+    los procesos hijos los hereden en lugar de cargarlos cada uno. Solo se lee
+    la BD local: los códigos semilla que falten se descargan al buscarlos.
+    """
+    with app.app_context():
+        emissions_store.rebuild()
+        catalog.refresh()
+        footprint_factors.get()
+        warm_product_cache(fetch_missing=False)
+        # Las conexiones abiertas no se pueden compartir entre procesos
+        db.engine.dispose()
+
+
+def share_metrics(directory):
+    """
+    En el proceso principal, antes del fork: cada hijo guardará sus métricas en
+    `directory` y /metrics devolverá la suma de todos, atienda quien atienda la
+    consulta (ver metrics.SharedMetrics).
+    """
+    global shared_metrics
+    if app.config['METRICS_ENABLED']:
+        shared_metrics = SharedMetrics(directory, REGISTRY, interval=app.config['METRICS_SYNC_INTERVAL'])
+        shared_metrics.before_fork()
+
+
+def init_worker(index=0):
+    """
+    Prepara el proceso hijo número `index` después de fork: conexiones propias y
+    hilos en segundo plano. El barrido de productos obsoletos solo lo hace el
+    hijo 0: cada proceso limita el ritmo de refrescos por su cuenta y, si
+    barrieran todos, cada producto se descargaría una vez por proceso.
+    """
+    with app.app_context():
+        db.engine.dispose(close=False) # Las del padre se abandonan sin cerrarlas
+    product_refresher.after_fork()
+    if shared_metrics is not None:
+        shared_metrics.start(index)
+    if index == 0:
+        start_refresh_sweeper()
+
+
+def shutdown_worker():
+    """Cierre ordenado de un proceso hijo: guarda los contadores pendientes y libera los pools."""
+    product_popularity.flush()
+    if shared_metrics is not None:
+        shared_metrics.stop()
+    password_hasher.shutdown()
+    batch_fetch_pool.shutdown(wait=False)
+    with app.app_context():
+        db.engine.dispose()
 
 
 if __name__ == '__main__':
-    # Crear las tablas en la base de datos si no existen
+    # Servidor de desarrollo. En producción: python run.py serve (ver backend/run.py)
+    init_database()
     with app.app_context():
-        db.create_all()
-        print("Base de datos y tablas creadas (si no existían).")
+        emissions_store.rebuild()
 
+    start_cache_warmup()
+    start_refresh_sweeper()
     app.run(debug=True)
\ No newline at end of file
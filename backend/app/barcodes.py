@@ -0,0 +1,54 @@
+# backend/app/barcodes.py
+
+# Normalización de códigos de barras a GTIN-14.
+#
+# EAN-8, UPC-A (12 dígitos), EAN-13 y GTIN-14 son el mismo número rellenado con
+# ceros a la izquierda hasta 14 dígitos, así que '737628064502' (UPC-A),
+# '0737628064502' (EAN-13) y '00737628064502' (GTIN-14) son el mismo producto.
+# Ese número se guarda como clave entera (products.gtin) y el código se muestra
+# y se envía a Open Food Facts en su forma corta (8 o 13 dígitos).
+
+GTIN_LENGTHS = (8, 12, 13, 14)
+_SEPARATORS = str.maketrans('', '', ' -')
+
+
+def check_digit(digits):
+    """Dígito de control GS1 de un código sin él (pesos 3 y 1 desde la derecha)."""
+    total = sum(int(d) * (3 if i % 2 == 0 else 1) for i, d in enumerate(reversed(digits)))
+    return (10 - total % 10) % 10
+
+
+def gtin_key(raw):
+    """
+    Clave GTIN-14 (entero) de un código de barras, o None si no es válido: longitud
+    distinta de 8, 12, 13 o 14 dígitos, dígito de control incorrecto o GTIN-14 de
+    una agrupación (primer dígito distinto de 0), que no es un producto de consumo.
+    """
+    if not isinstance(raw, str):
+        return None
+    digits = raw.translate(_SEPARATORS)
+    if len(digits) not in GTIN_LENGTHS or not digits.isascii() or not digits.isdigit():
+        return None
+    if len(digits) == 14 and digits[0] != '0':
+        return None
+    if check_digit(digits[:-1]) != int(digits[-1]):
+        return None
+    return int(digits)
+
+
+def barcode_from_key(key):
+    """Forma corta de una clave: 8 dígitos si cabe en un EAN-8 y, si no, 13."""
+    return f'{key:08d}' if key < 10 ** 8 else f'{key:013d}'
+
+
+def canonical_barcode(raw):
+    """Código normalizado ('737628064502' -> '0737628064502') o None si no es válido."""
+    key = gtin_key(raw)
+    return None if key is None else barcode_from_key(key)
+
+
+def gtin_default(barcode_column='barcode'):
+    """Valor por defecto de la columna gtin a partir del código de la misma fila."""
+    def default(context):
+        return gtin_key(context.get_current_parameters().get(barcode_column))
+    return default
@@ -0,0 +1,284 @@
+# backend/app/benchmarks/bench_api.py
+#
+# Prueba de carga reproducible de todas las rutas de app.py, sin red: usa una
+# base de datos SQLite temporal sembrada con datos sintéticos y un Open Food
+# Facts simulado (stub_off.py). Para cada ruta mide rendimiento y latencias
+# p50/p95/p99, guarda el resultado en JSON y, si se indica una ejecución de
+# referencia, marca las regresiones (código de salida 1, útil en CI).
+# Uso (desde backend/app):
+#   python -m benchmarks.bench_api --requests 500 --concurrency 8 --output bench.json
+#   python -m benchmarks.bench_api --baseline bench_main.json --max-regression 0.25
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+import numpy as np
+from barcodes import check_digit
+from benchmarks.stub_off import StubOpenFoodFacts
+
+# Búsquedas por texto: prefijos de las categorías que usa seed_db
+QUERY_TERMS = ('bebi', 'lact', 'snack', 'conserv', 'panad', 'frut', 'cere', 'congel')
+
+# Métricas comparadas con la ejecución de referencia: (clave, True si más alto es peor)
+COMPARED_METRICS = (('p50_ms', True), ('p95_ms', True), ('throughput_rps', False))
+
+
+class Workload:
+    """
+    Peticiones de una ruta. `send(client, i)` hace la petición número i con el
+    cliente de pruebas de Flask del hilo. `share` escala el número de
+    peticiones (p. ej. las rutas con bcrypt se ejecutan menos veces).
+    """
+
+    def __init__(self, name, send, share=1.0):
+        self.name = name
+        self.send = send
+        self.share = share
+
+
+def build_workloads(seed, session_tokens):
+    """Una carga por ruta de app.py, a partir de los datos devueltos por seed_database()."""
+    barcodes, user_ids = seed["barcodes"], seed["user_ids"]
+    regions, years = seed["regions"], seed["years"]
+    tokens = {user_id: session_tokens.issue(user_id)[0] for user_id in user_ids}
+    run_id = int(time.time())
+
+    def pick(values, i, step=7919):
+        # Recorrido determinista y disperso, sin estado compartido entre hilos
+        return values[(i * step) % len(values)]
+
+    def auth(user_id):
+        return {"Authorization": f"Bearer {tokens[user_id]}"}
+
+    def new_barcode(i):
+        # Códigos que no están en la BD: cada petición va al Open Food Facts simulado
+        digits = str(300000000000 + i)
+        return f'{digits}{check_digit(digits)}'
+
+    def favorite_pair(i):
+        return pick(user_ids, i, step=31), pick(barcodes, i, step=104729)
+
+    def add_favorite(c, i):
+        user_id, barcode = favorite_pair(i)
+        return c.post(f'/api/users/{user_id}/favorites', json={"barcode": barcode}, headers=auth(user_id))
+
+    def remove_favorite(c, i):
+        user_id, barcode = favorite_pair(i)
+        return c.delete(f'/api/users/{user_id}/favorites/{barcode}', headers=auth(user_id))
+
+    return [
+        Workload('home', lambda c, i: c.get('/')),
+        Workload('products_search_local', lambda c, i: c.get(f'/api/products/search?barcode={pick(barcodes, i)}')),
+        Workload('products_search_upstream', lambda c, i: c.get(f'/api/products/search?barcode={new_barcode(i)}')),
+        Workload('products_query', lambda c, i: c.get('/api/products/query', query_string={
+            "q": f"{pick(QUERY_TERMS, i, step=1)} producto", "offset": (i % 5) * 20})),
+        Workload('products_alternatives', lambda c, i: c.get(f'/api/products/{pick(barcodes, i)}/alternatives')),
+        Workload('products_cache_stats', lambda c, i: c.get('/api/products/cache')),
+        Workload('products_batch', lambda c, i: c.post('/api/products/batch', json={
+            "barcodes": [pick(barcodes, i * 20 + k) for k in range(18)] + [new_barcode(10 ** 6 + i * 2 + k) for k in range(2)]}),
+            share=0.25),
+        Workload('emissions', lambda c, i: c.get('/api/emissions', query_string={
+            "region": pick(regions, i, step=1), "year": pick(years, i, step=5)})),
+        Workload('emissions_series', lambda c, i: c.get('/api/emissions/series', query_string={
+            "region": pick(regions, i, step=1), "aggregates": "yoy,rolling,cumulative"})),
+        Workload('favorites_list', lambda c, i: c.get(f'/api/users/{pick(user_ids, i, step=1)}/favorites',
+                                                      headers=auth(pick(user_ids, i, step=1)))),
+        Workload('favorites_footprint', lambda c, i: c.get(f'/api/users/{pick(user_ids, i, step=1)}/footprint',
+                                                           headers=auth(pick(user_ids, i, step=1)))),
+        Workload('favorites_add', add_favorite),
+        Workload('favorites_remove', remove_favorite),
+        Workload('users_register', lambda c, i: c.post('/api/users/register', json={
+            "username": f"reg{run_id}_{i}", "email": f"reg{run_id}_{i}@example.com", "password": seed["password"]}),
+            share=0.05),
+        Workload('users_login', lambda c, i: c.post('/api/users/login', json={
+            "username": pick(seed["usernames"], i), "password": seed["password"]}), share=0.05),
+        Workload('metrics', lambda c, i: c.get('/metrics'), share=0.1),
+    ]
+
+
+def summarize(latencies, elapsed, statuses):
+    """Resumen de una carga: rendimiento, percentiles en ms y respuestas por código HTTP."""
+    ms = np.asarray(latencies, dtype=np.float64) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99]) if len(ms) else (0.0, 0.0, 0.0)
+    return {
+        "requests": len(ms),
+        "seconds": round(elapsed, 4),
+        "throughput_rps": round(len(ms) / elapsed, 2) if elapsed else 0.0,
+        "mean_ms": round(float(ms.mean()), 3) if len(ms) else 0.0,
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "max_ms": round(float(ms.max()), 3) if len(ms) else 0.0,
+        "statuses": {str(code): n for code, n in sorted(statuses.items())},
+        "server_errors": sum(n for code, n in statuses.items() if code >= 500),
+    }
+
+
+def run_workload(flask_app, workload, n_requests, concurrency, warmup=0):
+    """Lanza n_requests peticiones repartidas entre `concurrency` hilos y devuelve el resumen."""
+    for k in range(warmup):
+        workload.send(flask_app.test_client(), n_requests + k)
+
+    latencies = [0.0] * n_requests
+    statuses = Counter()
+    next_index = [0]
+    lock = threading.Lock()
+
+    def worker():
+        client = flask_app.test_client()
+        local_statuses = Counter()
+        while True:
+            with lock:
+                i = next_index[0]
+                next_index[0] += 1
+            if i >= n_requests:
+                break
+            started = time.perf_counter()
+            response = workload.send(client, i)
+            latencies[i] = time.perf_counter() - started
+            local_statuses[response.status_code] += 1
+        with lock:
+            statuses.update(local_statuses)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return summarize(latencies, time.perf_counter() - started, statuses)
+
+
+def compare_results(current, baseline, max_regression=0.2):
+    """
+    Compara dos resultados (el JSON que genera este script) y devuelve una lista
+    de regresiones: latencias que suben o rendimientos que bajan más de
+    `max_regression` (fracción) en las cargas presentes en ambos.
+    """
+    regressions = []
+    for name, result in current["workloads"].items():
+        base = baseline.get("workloads", {}).get(name)
+        if not base:
+            continue
+        for metric, higher_is_worse in COMPARED_METRICS:
+            old, new = base.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if (change > max_regression) if higher_is_worse else (change < -max_regression):
+                regressions.append(f"{name}: {metric} {old} -> {new} ({change:+.0%})")
+    return regressions
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def print_report(report):
+    print(f"{'carga':<26}{'peticiones':>11}{'req/s':>10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}  códigos")
+    for name, r in report["workloads"].items():
+        print(f"{name:<26}{r['requests']:>11}{r['throughput_rps']:>10.1f}{r['p50_ms']:>9.2f}"
+              f"{r['p95_ms']:>9.2f}{r['p99_ms']:>9.2f}  {r['statuses']}")
+
+
+def run(args):
+    if 'app' in sys.modules:
+        # app.py lee DATABASE_URL al importarse: hay que fijarla antes
+        raise RuntimeError("bench_api debe ejecutarse en un proceso en el que app.py aún no se haya importado.")
+
+    tmp_dir = tempfile.mkdtemp(prefix='ecotrack-bench-')
+    stub = StubOpenFoodFacts(latency=args.off_latency_ms / 1000, jitter=args.off_jitter_ms / 1000,
+                             error_rate=args.off_error_rate, not_found_rate=args.off_not_found_rate,
+                             seed=args.seed).start()
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tmp_dir, 'bench.db')
+    os.environ['OFF_API_URL'] = stub.base_url
+    try:
+        import app as app_module
+        from benchmarks.seed_db import seed_database
+
+        with app_module.app.app_context():
+            app_module.db.create_all()
+            seed = seed_database(n_users=args.users, n_products=args.products,
+                                 favorites_per_user=args.favorites_per_user, seed=args.seed)
+
+        selected = set(args.only.split(',')) if args.only else None
+        results = {}
+        for workload in build_workloads(seed, app_module.session_tokens):
+            if selected and workload.name not in selected:
+                continue
+            n_requests = max(1, int(args.requests * workload.share))
+            print(f"-> {workload.name} ({n_requests} peticiones, {args.concurrency} hilos)", flush=True)
+            # La aplicación escribe una línea por búsqueda: se descarta durante la medición
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                results[workload.name] = run_workload(app_module.app, workload, n_requests,
+                                                      args.concurrency, warmup=args.warmup)
+        app_module.password_hasher.shutdown()
+    finally:
+        stub.stop()
+
+    return {
+        "meta": {
+            "created_at": time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "params": {k: v for k, v in vars(args).items() if k not in ('output', 'baseline')},
+            "upstream_requests": stub.requests,
+        },
+        "workloads": results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prueba de carga de las rutas de la API sin acceso a red.")
+    parser.add_argument('--requests', type=int, default=500, help="Peticiones por carga (antes de aplicar su peso)")
+    parser.add_argument('--concurrency', type=int, default=8, help="Hilos cliente simultáneos")
+    parser.add_argument('--warmup', type=int, default=10, help="Peticiones previas sin medir por carga")
+    parser.add_argument('--only', help="Cargas a ejecutar, separadas por comas")
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--products', type=int, default=10000)
+    parser.add_argument('--favorites-per-user', type=int, default=50)
+    parser.add_argument('--off-latency-ms', type=float, default=50, help="Latencia del Open Food Facts simulado")
+    parser.add_argument('--off-jitter-ms', type=float, default=20)
+    parser.add_argument('--off-error-rate', type=float, default=0.0, help="Fracción de respuestas 503 del simulado")
+    parser.add_argument('--off-not-found-rate', type=float, default=0.1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="Archivo JSON donde guardar los resultados")
+    parser.add_argument('--baseline', help="Resultados de referencia (JSON) con los que comparar")
+    parser.add_argument('--max-regression', type=float, default=0.2,
+                        help="Empeoramiento máximo admitido frente a la referencia (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"Resultados guardados en {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare_results(report, json.load(f), args.max_regression)
+        if regressions:
+            print("Regresiones frente a la referencia:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print("Sin regresiones frente a la referencia.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
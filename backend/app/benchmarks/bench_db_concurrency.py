@@ -0,0 +1,94 @@
+# backend/app/benchmarks/bench_db_concurrency.py
+#
+# Prueba de carga de SQLite: rendimiento de lectura mientras un escritor inserta
+# sin parar, con la configuración por defecto de sqlite3 y con el perfil de
+# producción (WAL + PRAGMAs de db_config.py). Usa un archivo temporal.
+# Uso (desde backend/app): python -m benchmarks.bench_db_concurrency --seconds 5 --readers 4
+
+import argparse
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from db_config import apply_sqlite_pragmas
+
+
+def _connect(path, tuned):
+    conn = sqlite3.connect(path, check_same_thread=False)
+    if tuned:
+        apply_sqlite_pragmas(conn)
+    return conn
+
+
+def _run(tuned, seconds, n_readers, n_products=5000):
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    try:
+        setup = _connect(path, tuned)
+        setup.execute('CREATE TABLE products (id INTEGER PRIMARY KEY, barcode TEXT UNIQUE NOT NULL, name TEXT NOT NULL)')
+        setup.executemany('INSERT INTO products (barcode, name) VALUES (?, ?)',
+                          ((str(i).zfill(13), f'Producto {i}') for i in range(n_products)))
+        setup.commit()
+        setup.close()
+
+        stop = threading.Event()
+        counts = {"reads": 0, "writes": 0, "read_errors": 0, "write_errors": 0}
+        lock = threading.Lock()
+
+        def writer():
+            conn = _connect(path, tuned)
+            i = n_products
+            while not stop.is_set():
+                try:
+                    conn.execute('INSERT INTO products (barcode, name) VALUES (?, ?)', (str(i).zfill(13), f'Producto {i}'))
+                    conn.commit()
+                    i += 1
+                    with lock:
+                        counts["writes"] += 1
+                except sqlite3.OperationalError:
+                    with lock:
+                        counts["write_errors"] += 1
+            conn.close()
+
+        def reader(seed):
+            conn = _connect(path, tuned)
+            i = seed
+            while not stop.is_set():
+                i = (i * 7919 + 1) % n_products
+                try:
+                    conn.execute('SELECT id, name FROM products WHERE barcode = ?', (str(i).zfill(13),)).fetchone()
+                    with lock:
+                        counts["reads"] += 1
+                except sqlite3.OperationalError:
+                    with lock:
+                        counts["read_errors"] += 1
+            conn.close()
+
+        threads = [threading.Thread(target=writer)] + [threading.Thread(target=reader, args=(n,)) for n in range(n_readers)]
+        for t in threads:
+            t.start()
+        time.sleep(seconds)
+        stop.set()
+        for t in threads:
+            t.join()
+        return {k: v / seconds if k in ("reads", "writes") else v for k, v in counts.items()}
+    finally:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+
+def run(seconds=5, n_readers=4):
+    for label, tuned in (("sqlite3 por defecto", False), ("perfil de producción (WAL)", True)):
+        result = _run(tuned, seconds, n_readers)
+        print(f"{label}: {result['reads']:,.0f} lecturas/s, {result['writes']:,.0f} escrituras/s, "
+              f"errores de lectura={result['read_errors']}, errores de escritura={result['write_errors']}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Lecturas concurrentes con un escritor activo en SQLite.")
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--readers', type=int, default=4)
+    args = parser.parse_args()
+    run(seconds=args.seconds, n_readers=args.readers)
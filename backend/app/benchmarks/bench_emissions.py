@@ -0,0 +1,48 @@
+# backend/app/benchmarks/bench_emissions.py
+#
+# Compara la consulta ORM de /api/emissions con el índice en memoria, usando
+# las emisiones ya cargadas en la base de datos configurada (solo lectura).
+# Uso (desde backend/app): python -m benchmarks.bench_emissions
+
+import argparse
+import random
+import time
+from app import app, db, RegionalCo2Emission
+from emissions_index import EmissionsIndex
+
+
+def _time_lookups(fn, queries):
+    started = time.perf_counter()
+    for region_name, year in queries:
+        fn(region_name, year)
+    return time.perf_counter() - started
+
+
+def run(n_lookups=20000):
+    with app.app_context():
+        rows = db.session.query(RegionalCo2Emission.id, RegionalCo2Emission.region_name,
+                                RegionalCo2Emission.year, RegionalCo2Emission.total_co2_tonnes).all()
+        if not rows:
+            print("No hay emisiones en la base de datos. Ejecuta antes load_emissions_data.py.")
+            return
+
+        queries = [(row.region_name, row.year) for row in random.choices(rows, k=n_lookups)]
+
+        def orm_lookup(region_name, year):
+            return RegionalCo2Emission.query.filter_by(region_name=region_name, year=year).first()
+
+        index = EmissionsIndex(rows)
+        orm_seconds = _time_lookups(orm_lookup, queries)
+        index_seconds = _time_lookups(index.lookup, queries)
+
+    print(f"{n_lookups} consultas sobre {len(rows)} filas")
+    print(f"  ORM:    {orm_seconds:.3f}s ({n_lookups / orm_seconds:,.0f} consultas/s)")
+    print(f"  Índice: {index_seconds:.3f}s ({n_lookups / index_seconds:,.0f} consultas/s)")
+    print(f"  Aceleración: x{orm_seconds / index_seconds:.0f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Microbenchmark de /api/emissions: ORM frente a índice en memoria.")
+    parser.add_argument('--lookups', type=int, default=20000)
+    args = parser.parse_args()
+    run(n_lookups=args.lookups)
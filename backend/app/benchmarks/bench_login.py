@@ -0,0 +1,95 @@
+# backend/app/benchmarks/bench_login.py
+#
+# Mide el rendimiento de /api/users/login bajo carga concurrente y la latencia
+# de otra ruta (/api/emissions) mientras tanto, con bcrypt en el hilo de la
+# petición (workers=0) y en el pool de procesos.
+# Crea y borra un usuario temporal en la base de datos configurada.
+# Uso (desde backend/app): python -m benchmarks.bench_login --logins 200 --threads 8
+
+import argparse
+import statistics
+import threading
+import time
+import app as app_module
+from app import app, db, User
+from password_hashing import PasswordHasher
+
+BENCH_USER = '__bench_login_user__'
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))] if values else 0.0
+
+
+def _run(n_logins, n_threads):
+    client = app.test_client()
+    body = {"username": BENCH_USER, "password": "bench-password"}
+    remaining = [n_logins]
+    lock = threading.Lock()
+    done = threading.Event()
+    other_latencies = []
+
+    def login_worker():
+        c = app.test_client()
+        while True:
+            with lock:
+                if remaining[0] == 0:
+                    return
+                remaining[0] -= 1
+            c.post('/api/users/login', json=body)
+
+    def other_endpoint():
+        while not done.is_set():
+            started = time.perf_counter()
+            client.get('/api/emissions?year=2021&region=C.A.%20de%20Euskadi')
+            other_latencies.append(time.perf_counter() - started)
+            time.sleep(0.005)
+
+    watcher = threading.Thread(target=other_endpoint)
+    workers = [threading.Thread(target=login_worker) for _ in range(n_threads)]
+    started = time.perf_counter()
+    watcher.start()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - started
+    done.set()
+    watcher.join()
+    return n_logins / elapsed, other_latencies
+
+
+def run(n_logins=200, n_threads=8, rounds=12, pool_workers=4):
+    original_hasher = app_module.password_hasher
+    with app.app_context():
+        db.create_all()
+        user = User(username=BENCH_USER, email=f'{BENCH_USER}@example.com')
+        user.password_hash = PasswordHasher(rounds=rounds, workers=0).hash('bench-password')
+        db.session.add(user)
+        db.session.commit()
+    try:
+        for label, workers in (("bcrypt en el hilo", 0), (f"pool de {pool_workers} procesos", pool_workers)):
+            hasher = PasswordHasher(rounds=rounds, workers=workers)
+            app_module.password_hasher = hasher
+            try:
+                throughput, latencies = _run(n_logins, n_threads)
+            finally:
+                hasher.shutdown()
+            print(f"{label}: {throughput:.1f} logins/s; /api/emissions p50={statistics.median(latencies) * 1000:.1f}ms "
+                  f"p99={_percentile(latencies, 99) * 1000:.1f}ms ({len(latencies)} peticiones)")
+    finally:
+        app_module.password_hasher = original_hasher
+        with app.app_context():
+            User.query.filter_by(username=BENCH_USER).delete()
+            db.session.commit()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark de inicios de sesión concurrentes.")
+    parser.add_argument('--logins', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--rounds', type=int, default=12)
+    parser.add_argument('--pool-workers', type=int, default=4)
+    args = parser.parse_args()
+    run(n_logins=args.logins, n_threads=args.threads, rounds=args.rounds, pool_workers=args.pool_workers)
@@ -0,0 +1,223 @@
+# backend/app/benchmarks/bench_server.py
+#
+# Compara por HTTP el servidor de desarrollo (app.run(debug=True), como al
+# ejecutar app.py) con el de producción (run.py: procesos con fork y pool de
+# hilos) sobre la misma base de datos SQLite sembrada, con rutas que no salen
+# a Open Food Facts. El cliente usa varios procesos para no ser el cuello de
+# botella. La diferencia solo se nota en una máquina con varios núcleos.
+# Uso (desde backend/app):
+#   python -m benchmarks.bench_server --requests 2000 --workers 4 --threads 8
+#   python -m benchmarks.bench_server --servers prefork --only products_search_local --output server.json
+
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlencode
+from barcodes import check_digit
+from benchmarks.bench_api import QUERY_TERMS, summarize
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RUN_PY = os.path.join(os.path.dirname(APP_DIR), 'run.py')
+SEED_BARCODE_BASE = 200000000000 # Mismos códigos que siembra seed_db
+DEBUG_SERVER = "from app import app; app.run(debug=True, port={port}, use_reloader=False)"
+
+
+def seeded_barcode(i):
+    digits = str(SEED_BARCODE_BASE + i)
+    return f'{digits}{check_digit(digits)}'
+
+
+def build_paths(n_products, n_regions, n):
+    """Rutas (sin red) de cada carga, recorridas de forma determinista y dispersa."""
+    def pick(count, i, step=7919):
+        return (i * step) % count
+
+    return {
+        'home': ['/'] * n,
+        'products_search_local': [f'/api/products/search?barcode={seeded_barcode(pick(n_products, i))}'
+                                  for i in range(n)],
+        'products_query': ['/api/products/query?' + urlencode({"q": QUERY_TERMS[i % len(QUERY_TERMS)],
+                                                               "offset": (i % 5) * 20}) for i in range(n)],
+        'products_alternatives': [f'/api/products/{seeded_barcode(pick(n_products, i))}/alternatives'
+                                  for i in range(n)],
+        'emissions': ['/api/emissions?' + urlencode({"region": f"Región {i % n_regions}", "year": 1990 + i % 33})
+                      for i in range(n)],
+        'emissions_series': ['/api/emissions/series?' + urlencode({"region": f"Región {i % n_regions}",
+                                                                   "aggregates": "yoy,rolling"}) for i in range(n)],
+        # Con run.py suma lo que han volcado todos los procesos (ver metrics.SharedMetrics)
+        'metrics': ['/metrics'] * n,
+    }
+
+
+def _client_process(port, paths, threads):
+    """Lanza `paths` con `threads` hilos en este proceso y devuelve (latencias, códigos)."""
+    latencies = [0.0] * len(paths)
+    statuses = Counter()
+    next_index = [0]
+    lock = threading.Lock()
+
+    def worker():
+        local_statuses = Counter()
+        while True:
+            with lock:
+                i = next_index[0]
+                next_index[0] += 1
+            if i >= len(paths):
+                break
+            started = time.perf_counter()
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+            try:
+                conn.request('GET', paths[i])
+                response = conn.getresponse()
+                response.read()
+                local_statuses[response.status] += 1
+            except OSError:
+                local_statuses[599] += 1 # Error de conexión
+            finally:
+                conn.close()
+            latencies[i] = time.perf_counter() - started
+        with lock:
+            statuses.update(local_statuses)
+
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return latencies, statuses
+
+
+def run_load(port, paths, clients, concurrency):
+    """Reparte `paths` entre `clients` procesos con `concurrency` hilos cada uno y devuelve el resumen."""
+    chunks = [paths[k::clients] for k in range(clients)]
+    with multiprocessing.Pool(clients) as pool:
+        started = time.perf_counter()
+        results = pool.starmap(_client_process, [(port, chunk, concurrency) for chunk in chunks])
+        elapsed = time.perf_counter() - started
+    latencies, statuses = [], Counter()
+    for chunk_latencies, chunk_statuses in results:
+        latencies.extend(chunk_latencies)
+        statuses.update(chunk_statuses)
+    return summarize(latencies, elapsed, statuses)
+
+
+def _free_port():
+    import socket
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(kind, port, env, workers, threads):
+    if kind == 'debug':
+        command = [sys.executable, '-c', DEBUG_SERVER.format(port=port)]
+    else:
+        command = [sys.executable, RUN_PY, 'serve', '--port', str(port), '--workers', str(workers),
+                   '--threads', str(threads)]
+    process = subprocess.Popen(command, cwd=APP_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"El servidor '{kind}' terminó al arrancar (código {process.returncode}).")
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', '/')
+            if conn.getresponse().status == 200:
+                return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"El servidor '{kind}' no respondió en 60s.")
+
+
+def stop_server(process):
+    process.terminate() # SIGTERM: run.py para de forma ordenada
+    try:
+        process.wait(timeout=40)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def run(args):
+    tmp_dir = tempfile.mkdtemp(prefix='ecotrack-bench-server-')
+    env = dict(os.environ,
+               DATABASE_URL='sqlite:///' + os.path.join(tmp_dir, 'bench.db'),
+               OFF_API_URL='http://127.0.0.1:9', # Ninguna de las rutas medidas debe salir a la red
+               METRICS_ENABLED=os.environ.get('METRICS_ENABLED', '1'))
+    subprocess.run([sys.executable, '-m', 'benchmarks.seed_db', '--users', '10', '--products', str(args.products),
+                    '--regions', str(args.regions)], cwd=APP_DIR, env=env, check=True)
+    subprocess.run([sys.executable, RUN_PY, 'init-db'], cwd=APP_DIR, env=env, check=True,
+                   stdout=subprocess.DEVNULL)
+
+    all_paths = build_paths(args.products, args.regions, args.requests)
+    selected = set(args.only.split(',')) if args.only else None
+    results = {}
+    for kind in args.servers.split(','):
+        port = _free_port()
+        process = start_server(kind, port, env, args.workers, args.threads)
+        try:
+            for name, paths in all_paths.items():
+                if selected and name not in selected:
+                    continue
+                run_load(port, paths[:args.warmup], args.clients, args.concurrency)
+                print(f"-> {kind}: {name} ({len(paths)} peticiones)", flush=True)
+                results.setdefault(name, {})[kind] = run_load(port, paths, args.clients, args.concurrency)
+        finally:
+            stop_server(process)
+
+    return {
+        "meta": {
+            "created_at": time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            "cpus": os.cpu_count(),
+            "params": {k: v for k, v in vars(args).items() if k != 'output'},
+        },
+        "workloads": results,
+    }
+
+
+def print_report(report):
+    print(f"{'carga':<24}{'servidor':<10}{'req/s':>10}{'p50 ms':>9}{'p99 ms':>9}{'errores':>9}{'x debug':>9}")
+    for name, by_server in report["workloads"].items():
+        debug_rps = by_server.get('debug', {}).get('throughput_rps')
+        for kind, r in by_server.items():
+            speedup = f"{r['throughput_rps'] / debug_rps:.2f}" if debug_rps else '-'
+            errors = r['requests'] - r['statuses'].get('200', 0)
+            print(f"{name:<24}{kind:<10}{r['throughput_rps']:>10.1f}{r['p50_ms']:>9.2f}{r['p99_ms']:>9.2f}"
+                  f"{errors:>9}{speedup:>9}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servidor de desarrollo frente a run.py, por HTTP.")
+    parser.add_argument('--servers', default='debug,prefork', help="Servidores a medir, separados por comas")
+    parser.add_argument('--requests', type=int, default=2000, help="Peticiones por carga")
+    parser.add_argument('--warmup', type=int, default=50, help="Peticiones previas sin medir por carga")
+    parser.add_argument('--clients', type=int, default=os.cpu_count() or 1, help="Procesos cliente")
+    parser.add_argument('--concurrency', type=int, default=8, help="Hilos por proceso cliente")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Procesos de run.py")
+    parser.add_argument('--threads', type=int, default=8, help="Hilos por proceso de run.py")
+    parser.add_argument('--products', type=int, default=10000)
+    parser.add_argument('--regions', type=int, default=17)
+    parser.add_argument('--only', help="Cargas a ejecutar, separadas por comas")
+    parser.add_argument('--output', help="Archivo JSON donde guardar los resultados")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"Resultados guardados en {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
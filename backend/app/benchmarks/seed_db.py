@@ -0,0 +1,107 @@
+# backend/app/benchmarks/seed_db.py
+#
+# Rellena una base de datos de pruebas con usuarios, productos, favoritos y
+# emisiones sintéticos, de tamaño configurable y reproducible (semilla fija).
+# Uso (desde backend/app), siempre contra una base de datos desechable:
+#   DATABASE_URL=sqlite:////tmp/bench.db python -m benchmarks.seed_db --users 1000 --products 20000
+
+import argparse
+import os
+import random
+import sys
+import time
+from sqlalchemy import insert
+from app import app, db, User, Product, RegionalCo2Emission, user_favorites
+from password_hashing import PasswordHasher
+from barcodes import check_digit
+from footprint import rebuild_footprint_counts
+
+BENCH_PASSWORD = 'bench-password'
+CATEGORIES = ['Bebidas', 'Lácteos', 'Snacks', 'Conservas', 'Panadería', 'Frutas', 'Cereales', 'Congelados']
+SCORES = 'abcde'
+BARCODE_BASE = 200000000000 # Los productos sembrados usan los EAN-13 200000000000 + i (más el dígito de control)
+
+
+def product_barcode(i):
+    digits = str(BARCODE_BASE + i)
+    return f'{digits}{check_digit(digits)}'
+
+
+def seed_database(n_users=100, n_products=5000, favorites_per_user=20, n_regions=17,
+                  years=range(1990, 2023), rounds=None, seed=0, chunk_size=5000):
+    """
+    Inserta los datos sintéticos y devuelve un diccionario con lo necesario para
+    generar peticiones: ids de usuario, códigos de barras, regiones, años y la
+    contraseña común. Todos los usuarios comparten un mismo hash bcrypt (con el
+    factor de trabajo de la aplicación salvo que se indique `rounds`).
+    Esta función asume que se llama dentro de un `app.app_context()` con las tablas creadas.
+    """
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    rounds = app.config['BCRYPT_LOG_ROUNDS'] if rounds is None else rounds
+    password_hash = PasswordHasher(rounds=rounds, workers=0).hash(BENCH_PASSWORD)
+
+    def insert_chunks(statement, rows):
+        for start in range(0, len(rows), chunk_size):
+            db.session.execute(statement, rows[start:start + chunk_size])
+
+    insert_chunks(insert(Product), [{
+        "barcode": product_barcode(i),
+        "name": f"Producto {i}",
+        "nutriscore": SCORES[i % 5],
+        "ecoscore": SCORES[(i // 5) % 5],
+        "category": CATEGORIES[i % len(CATEGORIES)],
+    } for i in range(n_products)])
+    insert_chunks(insert(User), [{
+        "username": f"bench{i}",
+        "email": f"bench{i}@example.com",
+        "password_hash": password_hash,
+    } for i in range(n_users)])
+    db.session.flush()
+
+    user_ids = list(db.session.execute(db.select(User.id).where(User.username.like('bench%'))).scalars())
+    product_ids = list(db.session.execute(db.select(Product.id).order_by(Product.id)).scalars())
+    favorites = []
+    for user_id in user_ids:
+        for product_id in rng.sample(product_ids, min(favorites_per_user, len(product_ids))):
+            favorites.append({"user_id": user_id, "product_id": product_id})
+    insert_chunks(insert(user_favorites), favorites)
+    rebuild_footprint_counts(db.session.connection()) # Los favoritos se insertan sin pasar por la API
+
+    regions = [f"Región {r}" for r in range(n_regions)]
+    insert_chunks(insert(RegionalCo2Emission), [{
+        "region_name": region,
+        "year": year,
+        "total_co2_tonnes": rng.uniform(1e6, 5e7),
+    } for region in regions for year in years])
+    db.session.commit()
+
+    elapsed = time.perf_counter() - started
+    print(f"Base de datos sembrada en {elapsed:.1f}s: {len(user_ids)} usuarios, {n_products} productos, "
+          f"{len(favorites)} favoritos, {len(regions)} regiones x {len(years)} años.")
+    return {
+        "user_ids": user_ids,
+        "usernames": [f"bench{i}" for i in range(n_users)],
+        "password": BENCH_PASSWORD,
+        "barcodes": [product_barcode(i) for i in range(n_products)],
+        "regions": regions,
+        "years": list(years),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Siembra una base de datos de pruebas con datos sintéticos.")
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--products', type=int, default=5000)
+    parser.add_argument('--favorites-per-user', type=int, default=20)
+    parser.add_argument('--regions', type=int, default=17)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if not os.environ.get('DATABASE_URL'):
+        # Nunca sembrar la base de datos de desarrollo por accidente
+        sys.exit("Define DATABASE_URL con una base de datos desechable (p. ej. sqlite:////tmp/bench.db).")
+    with app.app_context():
+        db.create_all()
+        seed_database(n_users=args.users, n_products=args.products,
+                      favorites_per_user=args.favorites_per_user, n_regions=args.regions, seed=args.seed)
@@ -0,0 +1,131 @@
+# backend/app/benchmarks/stub_off.py
+#
+# Servidor HTTP local que sustituye a Open Food Facts en los benchmarks, con
+# latencia y tasas de error configurables. No necesita red.
+# Uso suelto (desde backend/app): python -m benchmarks.stub_off --port 8001 --latency-ms 80
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PRODUCT_PATH = re.compile(r'^/api/v2/product/([^/]+)\.json$')
+
+
+def fake_product(barcode):
+    """Producto determinista para un código de barras, con el formato de Open Food Facts."""
+    n = int(barcode) if barcode.isdigit() else sum(map(ord, barcode))
+    return {
+        "code": barcode,
+        "product_name": f"Producto {barcode}",
+        "nutriscore_grade": "abcde"[n % 5],
+        "ecoscore_grade": "abcde"[(n // 5) % 5],
+        "categories": ["Bebidas", "Lácteos", "Snacks", "Conservas", "Panadería"][n % 5] + ", Alimentos",
+    }
+
+
+class StubOpenFoodFacts:
+    """
+    Open Food Facts simulado.
+
+    latency: segundos de espera por petición (más un jitter uniforme de
+    hasta `jitter` segundos). error_rate: fracción de peticiones que
+    responden 503. not_found_rate: fracción de códigos que no existen (404),
+    decidida por código para que sea estable entre peticiones.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, not_found_rate=0.0,
+                 host='127.0.0.1', port=0, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.not_found_rate = not_found_rate
+        self.requests = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/api/v2/product/"
+
+    def _decide(self, barcode):
+        with self._lock:
+            self.requests += 1
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+            failed = self._random.random() < self.error_rate
+        missing = (zlib.crc32(barcode.encode('utf-8')) % 10000) / 10000 < self.not_found_rate
+        return delay, failed, missing
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1' # Keep-alive, como el servidor real
+
+            def do_GET(self):
+                match = PRODUCT_PATH.match(self.path.split('?', 1)[0])
+                if not match:
+                    return self._send(404, {"status": 0, "status_verbose": "not found"})
+                barcode = match.group(1)
+                delay, failed, missing = stub._decide(barcode)
+                if delay:
+                    time.sleep(delay)
+                if failed:
+                    return self._send(503, {"error": "stub: error simulado"})
+                if missing:
+                    return self._send(404, {"status": 0, "code": barcode, "status_verbose": "product not found"})
+                self._send(200, {"status": 1, "code": barcode, "product": fake_product(barcode)})
+
+            def _send(self, status, payload):
+                body = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass # Sin una línea por petición
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='stub-off', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Open Food Facts simulado para pruebas de carga.")
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--latency-ms', type=float, default=0)
+    parser.add_argument('--jitter-ms', type=float, default=0)
+    parser.add_argument('--error-rate', type=float, default=0)
+    parser.add_argument('--not-found-rate', type=float, default=0)
+    args = parser.parse_args()
+    stub = StubOpenFoodFacts(latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000,
+                             error_rate=args.error_rate, not_found_rate=args.not_found_rate, port=args.port)
+    print(f"Open Food Facts simulado en {stub.base_url} (OFF_API_URL={stub.base_url})")
+    stub.start()
+    try:
+        stub._thread.join()
+    except KeyboardInterrupt:
+        stub.stop()
@@ -0,0 +1,285 @@
+# backend/app/catalog_snapshot.py
+#
+# Instantánea de solo lectura del catálogo de productos, compartida entre procesos.
+#
+# El exportador compila la tabla products en un archivo binario con:
+#   cabecera | claves GTIN ordenadas (uint64) | registros de tamaño fijo | textos
+# Cada proceso lo abre con mmap y busca por clave con una búsqueda binaria sobre
+# las claves, sin copiarlas: el sistema operativo comparte las páginas entre los
+# procesos y ninguno tiene que llenar su propia caché con el catálogo completo.
+# El archivo se sustituye de forma atómica (os.replace) al reconstruirlo.
+#
+# Uso (desde backend/app):
+#   python catalog_snapshot.py catalog.snap
+
+import mmap
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import threading
+import time
+from array import array
+from datetime import datetime, timedelta
+import numpy as np
+from sqlalchemy import func, select, text
+
+MAGIC = b'ECOSNAP1'
+FORMAT_VERSION = 1
+# magic, versión, nº de productos, offsets de claves/registros/textos, id máximo, fecha
+HEADER = struct.Struct('<8sIQQQQq32s')
+# id, versión, offset de los textos, longitudes de barcode/nutriscore/ecoscore, (relleno), name, category
+RECORD = struct.Struct('<qIQBBBxHH')
+NULL_SHORT = 0xFF   # Longitud que marca un texto NULL en los campos de un byte
+NULL_LONG = 0xFFFF  # Ídem en los de dos bytes
+# Margen al comparar updated_at con la fecha de la instantánea (resolución de segundos en SQLite)
+CLOCK_MARGIN = timedelta(seconds=1)
+
+EXPORT_SQL = text('''
+    SELECT gtin, id, version, barcode, nutriscore, ecoscore, name, category
+    FROM products WHERE gtin IS NOT NULL ORDER BY gtin
+''')
+
+
+def _align(offset, size=8):
+    return (offset + size - 1) // size * size
+
+
+def _encode(value, null_marker):
+    if value is None:
+        return b'', null_marker
+    data = value.encode('utf-8')
+    if len(data) >= null_marker:
+        raise ValueError(f"Texto demasiado largo para la instantánea: {value[:40]!r}...")
+    return data, len(data)
+
+
+def write_snapshot(path, rows, max_id, created_at):
+    """
+    Escribe la instantánea en `path` de forma atómica. `rows` son tuplas
+    (gtin, id, version, barcode, nutriscore, ecoscore, name, category) ordenadas
+    por gtin. Devuelve el número de productos escritos.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    keys = array('Q')
+    # Registros y textos van a archivos temporales para no tener el catálogo entero en memoria
+    with tempfile.TemporaryFile(dir=directory) as records, tempfile.TemporaryFile(dir=directory) as pool:
+        pool_size = 0
+        last_key = -1
+        for gtin, product_id, version, barcode, nutriscore, ecoscore, name, category in rows:
+            if gtin <= last_key:
+                raise ValueError("Las filas de la instantánea deben venir ordenadas por gtin y sin repetir.")
+            last_key = gtin
+            fields = [_encode(barcode, NULL_SHORT), _encode(nutriscore, NULL_SHORT), _encode(ecoscore, NULL_SHORT),
+                      _encode(name, NULL_LONG), _encode(category, NULL_LONG)]
+            keys.append(gtin)
+            records.write(RECORD.pack(product_id, version, pool_size, *(length for _, length in fields)))
+            for data, _ in fields:
+                pool.write(data)
+                pool_size += len(data)
+
+        count = len(keys)
+        keys_offset = _align(HEADER.size)
+        records_offset = _align(keys_offset + count * 8)
+        pool_offset = records_offset + count * RECORD.size
+        stamp = created_at.isoformat(sep=' ').encode('ascii')
+
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.catalog-', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                out.write(HEADER.pack(MAGIC, FORMAT_VERSION, count, keys_offset, records_offset,
+                                      pool_offset, max_id, stamp))
+                out.write(b'\0' * (keys_offset - HEADER.size))
+                if sys.byteorder != 'little':
+                    keys.byteswap() # El archivo siempre es little-endian
+                out.write(keys.tobytes())
+                out.write(b'\0' * (records_offset - keys_offset - count * 8))
+                for section in (records, pool):
+                    section.seek(0)
+                    shutil.copyfileobj(section, out, 1024 * 1024)
+                out.flush()
+                os.fsync(out.fileno())
+            os.replace(tmp_path, path) # Los lectores ven el archivo anterior o el nuevo, nunca uno a medias
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+    return count
+
+
+def export_snapshot(conn, path):
+    """
+    Compila la tabla products en una instantánea. La fecha y el id máximo se
+    toman antes de leer las filas, así que los cambios posteriores quedan en la
+    capa SQL (overlay) hasta la siguiente exportación.
+    """
+    created_at = conn.execute(select(func.now())).scalar()
+    if isinstance(created_at, str): # SQLite sin tipo: 'YYYY-MM-DD HH:MM:SS'
+        created_at = datetime.fromisoformat(created_at)
+    max_id = conn.execute(text('SELECT COALESCE(MAX(id), 0) FROM products')).scalar()
+    rows = conn.execution_options(stream_results=True, yield_per=10000).execute(EXPORT_SQL)
+    return write_snapshot(path, rows, max_id, created_at.replace(tzinfo=None))
+
+
+class CatalogSnapshot:
+    """Instantánea abierta con mmap. `lookup(gtin)` devuelve el producto o None."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            self.file_id = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count, keys_offset, records_offset, pool_offset, max_id, stamp = \
+            HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"{path} no es una instantánea del catálogo compatible.")
+        self.path = path
+        self.max_id = max_id
+        self.created_at = datetime.fromisoformat(stamp.rstrip(b'\0').decode('ascii'))
+        self._records_offset = records_offset
+        self._pool_offset = pool_offset
+        # Vista de las claves sobre el mmap, sin copiarlas
+        self._keys = np.frombuffer(self._mm, dtype='<u8', count=count, offset=keys_offset)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _text(self, start, length, null_marker):
+        if length == null_marker:
+            return None, start
+        end = start + length
+        return self._mm[start:end].decode('utf-8'), end
+
+    def lookup(self, gtin):
+        i = int(np.searchsorted(self._keys, np.uint64(gtin)))
+        if i >= len(self._keys) or int(self._keys[i]) != gtin:
+            return None
+        product_id, version, start, *lengths = RECORD.unpack_from(self._mm, self._records_offset + i * RECORD.size)
+        position = self._pool_offset + start
+        values = []
+        for length, null_marker in zip(lengths, (NULL_SHORT, NULL_SHORT, NULL_SHORT, NULL_LONG, NULL_LONG)):
+            value, position = self._text(position, length, null_marker)
+            values.append(value)
+        barcode, nutriscore, ecoscore, name, category = values
+        return {"id": product_id, "barcode": barcode, "name": name, "nutriscore": nutriscore,
+                "ecoscore": ecoscore, "category": category, "version": version}
+
+
+class CatalogStore:
+    """
+    Instantánea vigente más la capa SQL (overlay) con lo que ha cambiado desde
+    que se exportó: las filas nuevas (id > max_id) y las modificadas después
+    (updated_at >= fecha de la instantánea).
+
+    Cada `check_interval` segundos se comprueba si el archivo se ha sustituido
+    y se recarga el overlay con `overlay_loader(max_id, desde)`, que devuelve
+    pares (gtin, producto). Sin `path` no se usa ninguna instantánea. Los productos que este proceso modifica se marcan
+    con `mark_changed` y se leen de la base de datos hasta que el overlay los recoja.
+    `lookup` devuelve MISS cuando hay que consultar la base de datos.
+    """
+
+    def __init__(self, path, overlay_loader, check_interval=30, miss=None, clock=time.monotonic):
+        self.path = path
+        self._overlay_loader = overlay_loader
+        self.check_interval = check_interval
+        self._miss = miss
+        self._clock = clock
+        self._snapshot = None
+        self._overlay = {} # gtin -> producto
+        self._changed = set()
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.overlay_hits = 0
+        self.misses = 0
+
+    def _file_id(self):
+        if not self.path:
+            return None
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def refresh(self):
+        """Abre la instantánea si ha cambiado y recarga el overlay."""
+        file_id = self._file_id()
+        snapshot = self._snapshot
+        if file_id is None:
+            snapshot = None
+        elif snapshot is None or snapshot.file_id != file_id:
+            snapshot = CatalogSnapshot(self.path)
+            print(f"Instantánea del catálogo cargada: {len(snapshot)} productos ({self.path}).")
+        overlay = {}
+        if snapshot is not None:
+            overlay = dict(self._overlay_loader(snapshot.max_id, snapshot.created_at - CLOCK_MARGIN))
+        with self._lock:
+            # La sustitución es atómica: las búsquedas en curso terminan con la instantánea anterior.
+            # Los productos modificados quedan en la instantánea nueva o en el overlay.
+            if snapshot is not self._snapshot:
+                self._changed = set()
+            self._snapshot, self._overlay = snapshot, overlay
+            self._changed -= overlay.keys()
+
+    def _maybe_refresh(self):
+        now = self._clock()
+        if now < self._next_check:
+            return
+        with self._lock:
+            if now < self._next_check:
+                return
+            self._next_check = now + self.check_interval
+        try:
+            self.refresh()
+        except Exception as e:
+            print(f"Error al recargar la instantánea del catálogo: {e}")
+
+    def mark_changed(self, gtin):
+        if self._snapshot is None:
+            return
+        with self._lock:
+            self._changed.add(gtin)
+            self._overlay.pop(gtin, None)
+
+    def lookup(self, gtin):
+        self._maybe_refresh()
+        snapshot = self._snapshot
+        if snapshot is None or gtin is None or gtin in self._changed:
+            return self._miss
+        product = self._overlay.get(gtin)
+        if product is not None:
+            self.overlay_hits += 1
+            return product
+        product = snapshot.lookup(gtin)
+        if product is None:
+            # Producto nuevo que aún no está en el overlay, o que no existe
+            self.misses += 1
+            return self._miss
+        self.hits += 1
+        return product
+
+    def stats(self):
+        snapshot = self._snapshot
+        return {
+            "products": len(snapshot) if snapshot else 0,
+            "overlay": len(self._overlay),
+            "hits": self.hits,
+            "overlay_hits": self.overlay_hits,
+            "misses": self.misses,
+        }
+
+
+if __name__ == '__main__':
+    import argparse
+    from app import app, db
+
+    parser = argparse.ArgumentParser(description="Exporta la tabla de productos a una instantánea binaria.")
+    parser.add_argument('output', help="Ruta del archivo de la instantánea (se sustituye de forma atómica)")
+    args = parser.parse_args()
+
+    with app.app_context(), db.engine.connect() as conn:
+        started = time.perf_counter()
+        count = export_snapshot(conn, args.output)
+        print(f"Instantánea del catálogo escrita: {count} productos en {time.perf_counter() - started:.2f}s.")
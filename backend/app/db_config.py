@@ -0,0 +1,79 @@
+# backend/app/db_config.py
+
+import os
+import sqlite3
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# PRAGMAs que se aplican a cada conexión SQLite nueva
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',       # Los lectores no esperan al escritor
+    'synchronous': 'NORMAL',     # Seguro con WAL y mucho más rápido que FULL
+    'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000)),    # Espera en vez de "database is locked"
+    'cache_size': -int(os.environ.get('SQLITE_CACHE_SIZE_KB', 64000)),      # Negativo = tamaño en KiB
+    'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+}
+
+
+def database_uri(default_sqlite_path):
+    """
+    DSN de la base de datos: la variable de entorno DATABASE_URL o, si no existe,
+    el archivo SQLite indicado.
+    """
+    uri = os.environ.get('DATABASE_URL')
+    if not uri:
+        return 'sqlite:///' + default_sqlite_path
+    if uri.startswith('postgres://'):
+        # Formato antiguo que SQLAlchemy ya no acepta
+        uri = 'postgresql://' + uri[len('postgres://'):]
+    return uri
+
+
+def _is_memory_sqlite(uri):
+    return uri.startswith('sqlite') and (uri in ('sqlite://', 'sqlite:///:memory:') or 'mode=memory' in uri)
+
+
+def engine_options(uri):
+    """
+    Opciones de create_engine para SQLALCHEMY_ENGINE_OPTIONS según el tipo de base
+    de datos. Los valores se pueden ajustar con variables de entorno DB_*.
+    """
+    options = {
+        'pool_pre_ping': True,
+        # Caché de sentencias compiladas de SQLAlchemy
+        'query_cache_size': int(os.environ.get('DB_STATEMENT_CACHE_SIZE', 1000)),
+    }
+    if uri.startswith('sqlite'):
+        # Caché de sentencias preparadas del driver sqlite3
+        options['connect_args'] = {
+            'cached_statements': int(os.environ.get('DB_STATEMENT_CACHE_SIZE', 1000)),
+            'check_same_thread': False,
+        }
+        if _is_memory_sqlite(uri):
+            # Flask-SQLAlchemy usa StaticPool para :memory:, que no admite tamaño de pool
+            return options
+
+    options.update({
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 20)),
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+    })
+    return options
+
+
+def apply_sqlite_pragmas(dbapi_connection, pragmas=None):
+    pragmas = SQLITE_PRAGMAS if pragmas is None else pragmas
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+
+@event.listens_for(Engine, 'connect')
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    # Se aplica a todas las conexiones SQLite; el resto de motores no se tocan
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        apply_sqlite_pragmas(dbapi_connection)
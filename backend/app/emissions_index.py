@@ -0,0 +1,188 @@
+# backend/app/emissions_index.py
+
+import hashlib
+import threading
+import time
+import numpy as np
+from serializers import emission_to_dict
+
+
+class EmissionsIndex:
+    """
+    Índice columnar en memoria de las emisiones de CO2.
+
+    Para cada región guarda tres arrays de NumPy ordenados por año (ids, años y
+    toneladas). La región se busca en un diccionario (O(1)) y el año con una
+    búsqueda binaria. El índice es inmutable: para actualizarlo se construye
+    uno nuevo y se sustituye. `etag` identifica el contenido del índice y se
+    calcula una sola vez al construirlo.
+    """
+
+    def __init__(self, rows=()):
+        # rows: iterable de (id, region_name, year, total_co2_tonnes)
+        by_region = {}
+        for emission_id, region_name, year, tonnes in rows:
+            by_region.setdefault(region_name, []).append((year, emission_id, tonnes))
+
+        self._regions = {}
+        for region_name, values in by_region.items():
+            values.sort()
+            years = np.fromiter((v[0] for v in values), dtype=np.int32, count=len(values))
+            ids = np.fromiter((v[1] for v in values), dtype=np.int64, count=len(values))
+            tonnes = np.fromiter((v[2] for v in values), dtype=np.float64, count=len(values))
+            self._regions[region_name] = (ids, years, tonnes)
+
+        digest = hashlib.sha1()
+        for region_name in sorted(self._regions):
+            digest.update(region_name.encode('utf-8'))
+            for column in self._regions[region_name]:
+                digest.update(column.tobytes())
+        self.etag = 'e' + digest.hexdigest()[:20]
+
+    def __len__(self):
+        return sum(len(ids) for ids, _, _ in self._regions.values())
+
+    def regions(self):
+        return list(self._regions)
+
+    def series(self, region_name):
+        """Devuelve (ids, años, toneladas) de una región, o None si no existe."""
+        return self._regions.get(region_name)
+
+    def range(self, region_name, year_from=None, year_to=None):
+        """
+        Devuelve (años, toneladas) de una región entre dos años (ambos incluidos),
+        como vistas de los arrays sin copiarlos, o None si la región no existe.
+        """
+        columns = self._regions.get(region_name)
+        if columns is None:
+            return None
+        _, years, tonnes = columns
+        lo = 0 if year_from is None else int(np.searchsorted(years, year_from, side='left'))
+        hi = len(years) if year_to is None else int(np.searchsorted(years, year_to, side='right'))
+        return years[lo:hi], tonnes[lo:hi]
+
+    def lookup(self, region_name, year):
+        """Devuelve el diccionario de la emisión de una región y año, o None."""
+        columns = self._regions.get(region_name)
+        if columns is None:
+            return None
+        ids, years, tonnes = columns
+        i = int(np.searchsorted(years, year))
+        if i >= len(years) or years[i] != year:
+            return None
+        return emission_to_dict(ids[i], region_name, years[i], tonnes[i])
+
+
+# Agregados por año que se pueden pedir en las series
+SERIES_AGGREGATES = ('yoy', 'rolling', 'cumulative', 'base')
+
+
+def _to_list(values):
+    # Convierte un array a lista JSON, con None donde no hay valor (NaN, o infinito
+    # al dividir entre un año con 0 toneladas: JSON no admite Infinity)
+    return [float(v) if np.isfinite(v) else None for v in values]
+
+
+def compute_series(years, tonnes, aggregates=(), window=3, base_tonnes=None):
+    """
+    Calcula de forma vectorizada la serie de una región y sus agregados.
+
+    aggregates puede incluir 'yoy' (diferencia con el año anterior), 'rolling'
+    (media móvil de `window` años), 'cumulative' (acumulado) y 'base' (variación
+    porcentual frente a `base_tonnes`; None en todos los años si no hay base o
+    vale 0). Devuelve (columnas, resumen).
+    """
+    tonnes = np.asarray(tonnes, dtype=np.float64)
+    n = len(tonnes)
+    columns = {
+        "year": [int(y) for y in years],
+        "total_co2_tonnes": [float(t) for t in tonnes],
+    }
+
+    if 'yoy' in aggregates:
+        yoy = np.full(n, np.nan)
+        yoy[1:] = np.diff(tonnes)
+        yoy_pct = np.full(n, np.nan)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            yoy_pct[1:] = yoy[1:] / tonnes[:-1] * 100
+        columns["yoy_delta"] = _to_list(yoy)
+        columns["yoy_delta_pct"] = _to_list(yoy_pct)
+
+    if 'rolling' in aggregates:
+        rolling = np.full(n, np.nan)
+        if n >= window:
+            cumsum = np.cumsum(np.insert(tonnes, 0, 0.0))
+            rolling[window - 1:] = (cumsum[window:] - cumsum[:-window]) / window
+        columns["rolling_mean"] = _to_list(rolling)
+
+    if 'cumulative' in aggregates:
+        columns["cumulative_tonnes"] = _to_list(np.cumsum(tonnes))
+
+    if 'base' in aggregates:
+        columns["change_vs_base_pct"] = (_to_list((tonnes - base_tonnes) / base_tonnes * 100) if base_tonnes
+                                         else [None] * n)
+
+    i_min, i_max = int(np.argmin(tonnes)), int(np.argmax(tonnes))
+    summary = {
+        "count": n,
+        "total_co2_tonnes": float(tonnes.sum()),
+        "mean_co2_tonnes": float(tonnes.mean()),
+        "min": {"year": int(years[i_min]), "total_co2_tonnes": float(tonnes[i_min])},
+        "max": {"year": int(years[i_max]), "total_co2_tonnes": float(tonnes[i_max])},
+        "peak_year": int(years[i_max]),
+        "change_pct": float((tonnes[-1] - tonnes[0]) / tonnes[0] * 100) if tonnes[0] else None,
+    }
+    return columns, summary
+
+
+class EmissionsStore:
+    """
+    Mantiene el índice vigente y lo reconstruye cuando se marca como obsoleto.
+
+    `loader` es una función sin argumentos que devuelve las filas de la tabla.
+    La sustitución del índice es atómica: los lectores ven el índice anterior
+    completo o el nuevo completo, nunca uno a medio construir.
+
+    Los cambios hechos desde otro proceso (p. ej. load_emissions_data.py) no
+    pasan por `invalidate`: cada `check_interval` segundos se llama a
+    `version_loader`, una consulta barata que resume la tabla, y si su
+    resultado ha cambiado se reconstruye el índice.
+    """
+
+    def __init__(self, loader, version_loader=None, check_interval=30, clock=time.monotonic):
+        self._loader = loader
+        self._version_loader = version_loader
+        self.check_interval = check_interval
+        self._clock = clock
+        self._state = None # (índice, versión de la tabla con la que se construyó)
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    def get(self):
+        state = self._state
+        if state is None or (self._version_loader is not None and self._clock() >= self._next_check):
+            with self._lock:
+                state = self._state
+                if state is None:
+                    state = self._build()
+                elif self._version_loader is not None and self._clock() >= self._next_check:
+                    self._next_check = self._clock() + self.check_interval
+                    if self._version_loader() != state[1]:
+                        state = self._build()
+        return state[0]
+
+    def _build(self):
+        # La versión se lee antes que las filas: si la tabla cambia entre medias,
+        # la siguiente comprobación vuelve a construir el índice
+        version = self._version_loader() if self._version_loader is not None else None
+        self._state = (EmissionsIndex(self._loader()), version)
+        self._next_check = self._clock() + self.check_interval
+        return self._state
+
+    def rebuild(self):
+        with self._lock:
+            return self._build()[0]
+
+    def invalidate(self):
+        self._state = None
@@ -0,0 +1,213 @@
+# backend/app/footprint.py
+
+import hashlib
+import os
+import threading
+import time
+import unicodedata
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from product_ranking import GRADE_RANKS, UNRANKED
+
+# Peso de cada nota de Eco-Score sobre el factor medio de su categoría (C = la media)
+ECO_GRADE_WEIGHTS = {'a-plus': 0.5, 'a': 0.6, 'b': 0.8, 'c': 1.0, 'd': 1.2, 'e': 1.4, 'f': 1.6}
+UNGRADED_WEIGHT = 1.0    # Los productos sin nota cuentan como la media de la categoría
+DEFAULT_CATEGORY = '*'   # Fila de los archivos de factores para las categorías que no aparecen
+UNIT = 'kg CO2e, contando 1 kg de cada producto favorito' # Los factores van por kg y no se sabe cuánto se compra
+
+# Contadores de favoritos por (usuario, categoría, posición del Eco-Score). Los
+# productos sin categoría cuentan en la categoría ''.
+ADD_FAVORITE_SQL = text('''
+    INSERT INTO user_footprint_counts (user_id, category, eco_rank, favorites)
+    SELECT :user_id, COALESCE(category, ''), eco_rank, 1 FROM products WHERE id = :product_id
+    ON CONFLICT (user_id, category, eco_rank) DO UPDATE SET favorites = user_footprint_counts.favorites + 1
+''')
+
+REMOVE_FAVORITE_SQL = text('''
+    UPDATE user_footprint_counts SET favorites = favorites - 1
+    WHERE user_id = :user_id
+    AND category = (SELECT COALESCE(category, '') FROM products WHERE id = :product_id)
+    AND eco_rank = (SELECT eco_rank FROM products WHERE id = :product_id)
+''')
+
+# Un producto que cambia de categoría o de nota pasa de casilla en los contadores de quienes lo tienen
+_MOVE_IN_SQL = text('''
+    INSERT INTO user_footprint_counts (user_id, category, eco_rank, favorites)
+    SELECT user_id, :category, :eco_rank, 1 FROM user_favorites WHERE product_id = :product_id
+    ON CONFLICT (user_id, category, eco_rank) DO UPDATE SET favorites = user_footprint_counts.favorites + 1
+''')
+
+_MOVE_OUT_SQL = text('''
+    UPDATE user_footprint_counts SET favorites = favorites - 1
+    WHERE category = :category AND eco_rank = :eco_rank
+    AND user_id IN (SELECT user_id FROM user_favorites WHERE product_id = :product_id)
+''')
+
+
+def move_footprint_counts(conn, product_id, old, new):
+    """Pasa los favoritos de un producto de (categoría, posición) `old` a `new`."""
+    old = (old[0] or '', old[1])
+    new = (new[0] or '', new[1])
+    if old == new:
+        return
+    conn.execute(_MOVE_IN_SQL, {"product_id": product_id, "category": new[0], "eco_rank": new[1]})
+    conn.execute(_MOVE_OUT_SQL, {"product_id": product_id, "category": old[0], "eco_rank": old[1]})
+
+
+def rebuild_footprint_counts(conn):
+    """
+    Vuelve a calcular todos los contadores desde los favoritos (p. ej. después de
+    fusionar productos o de una importación que cambia notas con SQL directo).
+    """
+    conn.execute(text('DELETE FROM user_footprint_counts'))
+    conn.execute(text('''
+        INSERT INTO user_footprint_counts (user_id, category, eco_rank, favorites)
+        SELECT f.user_id, COALESCE(p.category, ''), p.eco_rank, COUNT(*)
+        FROM user_favorites f JOIN products p ON p.id = f.product_id
+        GROUP BY f.user_id, COALESCE(p.category, ''), p.eco_rank
+    '''))
+
+
+def normalize_category(name):
+    """Categoría sin acentos, en minúsculas y sin el prefijo de idioma de Open Food Facts ('en:')."""
+    if not name:
+        return ''
+    name = unicodedata.normalize('NFKD', str(name)).encode('ascii', 'ignore').decode('ascii')
+    name = name.strip().lower()
+    if len(name) > 3 and name[2] == ':':
+        name = name[3:]
+    return ' '.join(name.replace('-', ' ').split())
+
+
+def read_factors_csv(file_path):
+    """Lee un archivo de factores (columnas category y kg_co2e_per_kg) y devuelve un diccionario."""
+    df = pd.read_csv(file_path, sep=';', comment='#', encoding='utf-8', dtype={'category': 'string'})
+    factors = pd.to_numeric(df['kg_co2e_per_kg'], errors='coerce')
+    valid = df['category'].notna() & factors.notna()
+    return dict(zip(df.loc[valid, 'category'].map(normalize_category), factors[valid].astype(float)))
+
+
+class FootprintFactors:
+    """
+    Tabla de factores de emisión lista para aplicar.
+
+    Los factores por categoría y los pesos de las notas se combinan al construirla
+    en una matriz (categoría x posición del Eco-Score), de una sola vez. Calcular
+    una huella es indexar esa matriz con los contadores del usuario y multiplicar,
+    también de forma vectorizada. Es inmutable: al cambiar los archivos se
+    construye otra.
+    """
+
+    def __init__(self, factors, grade_weights=None):
+        factors = dict(factors)
+        if DEFAULT_CATEGORY not in factors:
+            raise ValueError(f"Falta el factor por defecto (categoría '{DEFAULT_CATEGORY}').")
+        default = factors.pop(DEFAULT_CATEGORY)
+        self.categories = sorted(factors)
+        self._codes = {category: i for i, category in enumerate(self.categories)}
+        self._default_code = len(self.categories)
+        category_factors = np.array([factors[c] for c in self.categories] + [default], dtype=np.float64)
+
+        weights = np.full(UNRANKED + 1, UNGRADED_WEIGHT, dtype=np.float64)
+        for grade, weight in (ECO_GRADE_WEIGHTS if grade_weights is None else grade_weights).items():
+            weights[GRADE_RANKS[grade]] = weight
+        self._matrix = np.outer(category_factors, weights)
+
+        digest = hashlib.sha1(self._matrix.tobytes())
+        digest.update('\n'.join(self.categories).encode('utf-8'))
+        self.etag = 'f' + digest.hexdigest()[:20]
+
+    def __len__(self):
+        return len(self.categories)
+
+    def factor(self, category, eco_rank=UNRANKED):
+        return float(self._matrix[self._codes.get(normalize_category(category), self._default_code), eco_rank])
+
+    def apply(self, categories, eco_ranks, counts):
+        """kg CO2e de cada (categoría, posición, número de favoritos), como un array."""
+        codes = np.fromiter((self._codes.get(normalize_category(c), self._default_code) for c in categories),
+                            dtype=np.intp, count=len(categories))
+        ranks = np.clip(np.asarray(eco_ranks, dtype=np.intp), 0, UNRANKED)
+        return self._matrix[codes, ranks] * np.asarray(counts, dtype=np.float64)
+
+    def footprint(self, rows):
+        """
+        Huella total y por categoría a partir de las filas (categoría, posición,
+        favoritos) de un usuario. Las categorías salen de mayor a menor huella.
+        """
+        rows = [row for row in rows if row[2] > 0]
+        if not rows:
+            return {"favorites": 0, "kg_co2e": 0.0, "unit": UNIT, "categories": []}
+        categories, ranks, counts = zip(*rows)
+        kg = self.apply(categories, ranks, counts)
+
+        names, groups = np.unique(np.array(categories, dtype=object), return_inverse=True)
+        kg_by_category = np.bincount(groups, weights=kg, minlength=len(names))
+        count_by_category = np.bincount(groups, weights=counts, minlength=len(names)).astype(np.int64)
+        total = float(kg.sum())
+        breakdown = [{"category": name or None,
+                      "favorites": int(count_by_category[i]),
+                      "kg_co2e": round(float(kg_by_category[i]), 3),
+                      "share": round(float(kg_by_category[i]) / total, 3) if total else 0.0}
+                     for i, name in enumerate(names)]
+        breakdown.sort(key=lambda item: (-item["kg_co2e"], item["category"] or ''))
+        return {"favorites": int(sum(counts)), "kg_co2e": round(total, 3), "unit": UNIT,
+                "categories": breakdown}
+
+
+def load_category_factors(file_paths):
+    """Une los factores de uno o varios archivos (los últimos sustituyen a los primeros)."""
+    factors = {}
+    for file_path in file_paths:
+        factors.update(read_factors_csv(file_path))
+    return FootprintFactors(factors)
+
+
+class FootprintFactorsStore:
+    """
+    Mantiene la tabla de factores vigente y la vuelve a construir cuando cambia
+    alguno de los archivos (se comprueba como mucho cada `check_interval` segundos).
+    Si los archivos no se pueden leer se sigue usando la tabla anterior.
+    """
+
+    def __init__(self, file_paths, check_interval=60, clock=time.monotonic):
+        self.file_paths = list(file_paths)
+        self.check_interval = check_interval
+        self._clock = clock
+        self._factors = None
+        self._file_ids = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    def _current_file_ids(self):
+        ids = []
+        for file_path in self.file_paths:
+            try:
+                stat = os.stat(file_path)
+            except FileNotFoundError:
+                return None
+            ids.append((stat.st_ino, stat.st_mtime_ns, stat.st_size))
+        return tuple(ids)
+
+    def get(self):
+        """Tabla vigente, o None si los archivos no se han podido cargar nunca."""
+        now = self._clock()
+        if now >= self._next_check:
+            with self._lock:
+                if now >= self._next_check:
+                    self._next_check = now + self.check_interval
+                    self._reload_if_changed()
+        return self._factors
+
+    def _reload_if_changed(self):
+        file_ids = self._current_file_ids()
+        if file_ids is None or file_ids == self._file_ids:
+            return
+        try:
+            factors = load_category_factors(self.file_paths)
+        except Exception as e:
+            print(f"Error al cargar los factores de emisión por categoría: {e}")
+            return
+        self._factors, self._file_ids = factors, file_ids
+        print(f"Factores de emisión cargados: {len(factors)} categorías.")
@@ -0,0 +1,30 @@
+# backend/app/http_caching.py
+
+import hashlib
+from flask import current_app, request
+
+
+def etag_for(*parts):
+    """
+    ETag fuerte a partir de valores ya conocidos (ids, versiones de fila...),
+    sin necesidad de serializar antes el cuerpo de la respuesta.
+    """
+    return hashlib.sha1('|'.join(map(str, parts)).encode('utf-8')).hexdigest()[:20]
+
+
+def apply_cache_headers(response, etag, cache_control, vary=None):
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = cache_control
+    if vary:
+        response.vary.add(vary)
+    return response
+
+
+def not_modified(etag, cache_control, vary=None):
+    """
+    Devuelve una respuesta 304 vacía si el cliente ya tiene la versión `etag`
+    (cabecera If-None-Match), o None si hay que construir la respuesta completa.
+    """
+    if not request.if_none_match.contains_weak(etag):
+        return None
+    return apply_cache_headers(current_app.response_class(status=304), etag, cache_control, vary)
@@ -0,0 +1,221 @@
+# backend/app/import_openfoodfacts.py
+
+import argparse
+import csv
+import gzip
+import json
+import os
+import sys
+import time
+from sqlalchemy import text
+from app import app, db
+from schema import upgrade_schema
+from footprint import rebuild_footprint_counts
+from product_search import ensure_search_index
+from openfoodfacts_api import extract_product_info
+from product_ranking import grade_rank
+from barcodes import canonical_barcode, gtin_key
+
+# Inserta o actualiza un producto por código de barras (SQLite y PostgreSQL).
+# Solo se actualiza (y se incrementa su versión) si algún campo ha cambiado.
+UPSERT_PRODUCT_SQL = text('''
+    INSERT INTO products (barcode, gtin, name, nutriscore, ecoscore, category, eco_rank, nutri_rank,
+                          version, updated_at, fetched_at)
+    VALUES (:barcode, :gtin, :name, :nutriscore, :ecoscore, :category, :eco_rank, :nutri_rank,
+            1, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+    ON CONFLICT (barcode) DO UPDATE SET
+        name = excluded.name,
+        nutriscore = excluded.nutriscore,
+        ecoscore = excluded.ecoscore,
+        category = excluded.category,
+        eco_rank = excluded.eco_rank,
+        nutri_rank = excluded.nutri_rank,
+        version = products.version + 1,
+        updated_at = CURRENT_TIMESTAMP,
+        fetched_at = CURRENT_TIMESTAMP
+    WHERE products.name <> excluded.name
+        OR COALESCE(products.nutriscore, '') <> COALESCE(excluded.nutriscore, '')
+        OR COALESCE(products.ecoscore, '') <> COALESCE(excluded.ecoscore, '')
+        OR COALESCE(products.category, '') <> COALESCE(excluded.category, '')
+''')
+
+
+def _open_text(file_path):
+    # Abre el volcado en modo texto, descomprimiendo al vuelo si es .gz
+    if file_path.endswith('.gz'):
+        return gzip.open(file_path, 'rt', encoding='utf-8', newline='')
+    return open(file_path, 'r', encoding='utf-8', newline='')
+
+
+def _detect_format(file_path):
+    name = file_path[:-3] if file_path.endswith('.gz') else file_path
+    if name.endswith('.jsonl') or name.endswith('.json'):
+        return 'jsonl'
+    if name.endswith('.csv') or name.endswith('.tsv'):
+        return 'csv'
+    raise ValueError(f"No se reconoce el formato de '{file_path}' (se espera .jsonl o .csv, opcionalmente .gz).")
+
+
+def iter_records(file_path, fmt=None, start=0):
+    """
+    Recorre el volcado de Open Food Facts registro a registro, con memoria constante.
+    Genera tuplas (posición, registro) con la posición empezando en 1 y se salta
+    sin procesar los `start` primeros registros.
+    """
+    fmt = fmt or _detect_format(file_path)
+    with _open_text(file_path) as f:
+        if fmt == 'jsonl':
+            for offset, line in enumerate(f, start=1):
+                if offset <= start:
+                    continue
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield offset, json.loads(line)
+                except ValueError:
+                    print(f"Advertencia: línea {offset} no es JSON válido. Saltando.")
+        else:
+            # Los CSV de Open Food Facts van separados por tabuladores y tienen campos muy largos
+            csv.field_size_limit(sys.maxsize)
+            reader = csv.DictReader(f, delimiter='\t')
+            for offset, row in enumerate(reader, start=1):
+                if offset > start:
+                    yield offset, row
+
+
+def _tags(record, tags_field, text_field):
+    # Devuelve las etiquetas en minúsculas, sin prefijo de idioma ('en:spain' -> 'spain')
+    values = record.get(tags_field) or record.get(text_field) or []
+    if isinstance(values, str):
+        values = values.split(',')
+    tags = set()
+    for value in values:
+        value = value.strip().lower()
+        if value:
+            tags.add(value)
+            tags.add(value.split(':', 1)[-1])
+    return tags
+
+
+def _matches(record, country=None, category=None):
+    if country and country.lower() not in _tags(record, 'countries_tags', 'countries'):
+        return False
+    if category and category.lower() not in _tags(record, 'categories_tags', 'categories'):
+        return False
+    return True
+
+
+def to_product_row(record):
+    """Aplica la misma extracción de campos que get_product_by_barcode."""
+    # Los campos vacíos (CSV) o nulos (JSON) se tratan como ausentes
+    record = {k: v for k, v in record.items() if v not in (None, '')}
+    # Se guarda el código normalizado; los que no son un GTIN válido se descartan
+    barcode = canonical_barcode(str(record.get('code', '')))
+    if barcode is None:
+        return None
+    record['code'] = barcode
+    row = extract_product_info(record)
+    row['gtin'] = gtin_key(barcode)
+    return row
+
+
+def _state_path(file_path):
+    return file_path + '.import-state.json'
+
+
+def _load_offset(state_path):
+    try:
+        with open(state_path) as f:
+            return json.load(f).get('offset', 0)
+    except (FileNotFoundError, ValueError):
+        return 0
+
+
+def _save_offset(state_path, offset):
+    tmp_path = state_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({"offset": offset}, f)
+    os.replace(tmp_path, state_path)
+
+
+def import_products(file_path, fmt=None, chunk_size=5000, country=None, category=None,
+                    resume=False, state_path=None):
+    """
+    Importa productos desde un volcado de Open Food Facts (JSONL o CSV, opcionalmente
+    comprimido con gzip) a la tabla `products`, por lotes con executemany.
+
+    Con resume=True continúa desde la última posición confirmada. La posición se
+    guarda tras cada lote en `state_path` y se borra al terminar.
+    Esta función asume que se llama dentro de un `app.app_context()`.
+    """
+    state_path = state_path or _state_path(file_path)
+    start_offset = _load_offset(state_path) if resume else 0
+    if start_offset:
+        print(f"Reanudando la importación desde el registro {start_offset}.")
+
+    stats = {"read": 0, "imported": 0, "skipped": 0, "offset": start_offset}
+    batch = []
+    started = time.perf_counter()
+
+    def flush(offset):
+        if batch:
+            db.session.execute(UPSERT_PRODUCT_SQL, batch)
+            db.session.commit()
+            stats["imported"] += len(batch)
+            batch.clear()
+        stats["offset"] = offset
+        _save_offset(state_path, offset)
+        elapsed = time.perf_counter() - started
+        rate = stats["read"] / elapsed if elapsed else 0.0
+        print(f"{stats['read']} registros leídos, {stats['imported']} importados ({rate:.0f} registros/s).")
+
+    offset = start_offset
+    try:
+        for offset, record in iter_records(file_path, fmt, start=start_offset):
+            stats["read"] += 1
+            row = to_product_row(record) if _matches(record, country, category) else None
+            if row is None:
+                stats["skipped"] += 1
+            else:
+                row['eco_rank'] = grade_rank(row['ecoscore'])
+                row['nutri_rank'] = grade_rank(row['nutriscore'])
+                batch.append(row)
+            if len(batch) >= chunk_size:
+                flush(offset)
+        flush(offset)
+    except Exception:
+        db.session.rollback()
+        raise
+    if stats["imported"]:
+        # El upsert es SQL directo: la huella de los favoritos se recalcula con las notas y categorías nuevas
+        rebuild_footprint_counts(db.session.connection())
+        db.session.commit()
+
+    if os.path.exists(state_path):
+        os.remove(state_path)
+    elapsed = time.perf_counter() - started
+    stats["seconds"] = elapsed
+    stats["rows_per_second"] = stats["read"] / elapsed if elapsed else 0.0
+    print(f"Importación terminada: {stats['imported']} productos en {elapsed:.1f}s "
+          f"({stats['rows_per_second']:.0f} registros/s, {stats['skipped']} descartados).")
+    return stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Importa un volcado de Open Food Facts a la tabla de productos.")
+    parser.add_argument('file', help="Ruta al volcado (.jsonl, .csv, opcionalmente .gz)")
+    parser.add_argument('--format', choices=['jsonl', 'csv'], help="Formato del archivo (por defecto, según la extensión)")
+    parser.add_argument('--chunk-size', type=int, default=5000, help="Registros por lote de inserción")
+    parser.add_argument('--country', help="Importar solo productos de este país (p. ej. 'spain' o 'en:spain')")
+    parser.add_argument('--category', help="Importar solo productos de esta categoría (p. ej. 'en:beverages')")
+    parser.add_argument('--resume', action='store_true', help="Continuar desde la última posición guardada")
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+        upgrade_schema(db.engine)
+        # Los triggers del índice de búsqueda indexan cada producto importado
+        ensure_search_index(db.engine)
+        import_products(args.file, fmt=args.format, chunk_size=args.chunk_size,
+                        country=args.country, category=args.category, resume=args.resume)
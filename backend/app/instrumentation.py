@@ -0,0 +1,76 @@
+# backend/app/instrumentation.py
+
+import time
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from metrics import Counter, Gauge, Histogram
+
+REQUEST_LATENCY = Histogram('http_request_duration_seconds', 'Duración de las peticiones HTTP por ruta.',
+                            ('method', 'route', 'status'))
+REQUESTS_IN_FLIGHT = Gauge('http_requests_in_flight', 'Peticiones HTTP en curso.')
+SQL_QUERIES = Counter('sql_queries_total', 'Sentencias SQL ejecutadas.')
+SQL_DURATION = Histogram('sql_query_duration_seconds', 'Duración de cada sentencia SQL.',
+                         buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0))
+REQUEST_SQL_QUERIES = Histogram('http_request_sql_queries', 'Sentencias SQL por petición.', ('route',),
+                                buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100))
+REQUEST_SQL_DURATION = Histogram('http_request_sql_duration_seconds', 'Tiempo en SQL por petición.', ('route',))
+
+
+def _route():
+    # Se usa la plantilla de la ruta ('/api/users/<int:user_id>/favorites') para acotar las etiquetas
+    rule = request.url_rule
+    return rule.rule if rule is not None else '<unmatched>'
+
+
+def install_request_metrics(app, exclude=('/metrics',)):
+    """Registra la latencia, las sentencias SQL y las peticiones en curso de cada petición."""
+
+    @app.before_request
+    def _start_request_metrics():
+        g._metrics_started = time.perf_counter()
+        g._sql_queries = 0
+        g._sql_seconds = 0.0
+        REQUESTS_IN_FLIGHT.inc()
+
+    @app.after_request
+    def _record_status(response):
+        g._metrics_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def _finish_request_metrics(exc):
+        started = g.pop('_metrics_started', None)
+        if started is None:
+            return
+        REQUESTS_IN_FLIGHT.dec()
+        route = _route()
+        if route in exclude:
+            return
+        # Sin after_request (excepción no controlada) la respuesta es un 500
+        REQUEST_LATENCY.observe(time.perf_counter() - started, request.method, route,
+                                g.pop('_metrics_status', 500))
+        REQUEST_SQL_QUERIES.observe(g._sql_queries, route)
+        REQUEST_SQL_DURATION.observe(g._sql_seconds, route)
+
+
+def install_sql_metrics(target=Engine):
+    """Cuenta y cronometra las sentencias SQL de todos los engines (o del indicado)."""
+
+    @event.listens_for(target, 'before_cursor_execute')
+    def _start_query(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._metrics_started = time.perf_counter()
+
+    @event.listens_for(target, 'after_cursor_execute')
+    def _finish_query(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, '_metrics_started', None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        SQL_QUERIES.inc()
+        SQL_DURATION.observe(elapsed)
+        # Acumulado de la petición en curso (los hilos de fondo no tienen petición)
+        if has_request_context() and '_sql_queries' in g:
+            g._sql_queries += 1
+            g._sql_seconds += elapsed
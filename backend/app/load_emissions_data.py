@@ -1,70 +1,111 @@
 # backend/load_emissions_data.py
 
+import argparse
 import pandas as pd
 import os
-from app import app, db, RegionalCo2Emission
+import time
+from sqlalchemy import text
+from app import app, db, emissions_store
+from schema import upgrade_schema
 
+# Inserta o actualiza una emisión usando la restricción única _region_year_uc.
+# Solo se actualiza (y se incrementa su versión) si el valor ha cambiado.
+UPSERT_EMISSION_SQL = text('''
+    INSERT INTO regional_co2_emissions (region_name, year, total_co2_tonnes, version, updated_at)
+    VALUES (:region_name, :year, :total_co2_tonnes, 1, CURRENT_TIMESTAMP)
+    ON CONFLICT (region_name, year) DO UPDATE SET
+        total_co2_tonnes = excluded.total_co2_tonnes,
+        version = regional_co2_emissions.version + 1,
+        updated_at = CURRENT_TIMESTAMP
+    WHERE regional_co2_emissions.total_co2_tonnes <> excluded.total_co2_tonnes
+''')
 
 
-def load_emissions_from_csv(file_path):
-    
-    #Carga los datos de emisiones de CO2 desde un archivo CSV a la base de datos.
+def read_emissions_csv(file_path, chunksize=1000):
+    """
+    Lee un CSV de emisiones (una fila por región, una columna por año) por bloques
+    y genera DataFrames en formato largo con columnas region_name, year y
+    total_co2_tonnes. Los separadores de miles ('13.069.575') y decimales (',')
+    españoles se quitan de forma vectorizada sobre el texto. Se leen como texto y
+    no con la inferencia de tipos de pandas, que decide por columna y por bloque:
+    un marcador como '..' o '-' convertiría en NaN los valores de las demás regiones.
+    """
+    reader = pd.read_csv(file_path, sep=';', encoding='latin1', skiprows=3, index_col=0,
+                         dtype=str, chunksize=chunksize)
+    for chunk in reader:
+        year_columns = [c for c in chunk.columns if str(c).strip().isdigit() and len(str(c).strip()) == 4]
+        values = chunk[year_columns].apply(
+            lambda column: pd.to_numeric(column.str.strip()
+                                         .str.replace('.', '', regex=False)
+                                         .str.replace(',', '.', regex=False), errors='coerce'))
+        values.index = values.index.astype('string').str.strip()
+        values = values[values.index.notna() & (values.index != '')]
+
+        long_df = values.rename_axis('region_name').reset_index().melt(
+            id_vars='region_name', var_name='year', value_name='total_co2_tonnes')
+        long_df = long_df.dropna(subset=['total_co2_tonnes'])
+        long_df['year'] = long_df['year'].astype(str).str.strip().astype(int)
+        if not long_df.empty:
+            yield long_df
+
+
+def load_emissions_from_csv(file_paths, chunksize=1000):
+
+    #Carga los datos de emisiones de CO2 de todas las regiones de uno o varios
+    #archivos CSV. Inserta o actualiza cada (región, año) en una sola transacción,
+    #de modo que la tabla nunca se queda vacía durante la carga.
     #Esta función asume que se llama dentro de un `app.app_context()`.
+    if isinstance(file_paths, (str, os.PathLike)):
+        file_paths = [file_paths]
+
+    started = time.perf_counter()
+    total_rows = 0
+    regions = set()
 
     try:
-        df = pd.read_csv(file_path, sep=';', encoding='latin1', skiprows=3, index_col=0)
-
-        if 'C.A. de Euskadi' in df.index:
-            emissions_row = df.loc['C.A. de Euskadi']
-        elif '1' in df.index and df.loc['1'].iloc[0] == 'C.A. de Euskadi':
-             emissions_row = df.loc['1']
-             emissions_row = emissions_row.iloc[1:]
-        else:
-            print("No se encontró la fila 'C.A. de Euskadi' o su equivalente en el CSV. No se cargaron datos.")
-            return
-
-        years_data = emissions_row.filter(regex=r'^\d{4}$')
-
-        emissions_to_insert = []
-        for year_col, value in years_data.items():
-            try:
-                year = int(year_col)
-                co2_tonnes = float(str(value).replace('.', ''))
-                emissions_to_insert.append(
-                    RegionalCo2Emission(
-                        region_name='C.A. de Euskadi',
-                        year=year,
-                        total_co2_tonnes=co2_tonnes
-                    )
-                )
-            except ValueError:
-                print(f"Advertencia: No se pudo convertir el año '{year_col}' o valor '{value}' a número. Saltando.")
-                continue
-
-        
-        db.session.query(RegionalCo2Emission).filter_by(region_name='C.A. de Euskadi').delete()
-        db.session.commit() 
-        print("Datos existentes de C.A. de Euskadi eliminados antes de la carga (si los había).")
-
-        # Añadir todos los nuevos registros
-        db.session.add_all(emissions_to_insert)
+        for file_path in file_paths:
+            for long_df in read_emissions_csv(file_path, chunksize=chunksize):
+                rows = long_df.to_dict('records')
+                db.session.execute(UPSERT_EMISSION_SQL, rows)
+                total_rows += len(rows)
+                regions.update(long_df['region_name'].unique())
         db.session.commit()
-        print(f"Datos de emisiones de CO2 para C.A. de Euskadi ({len(emissions_to_insert)} registros) cargados exitosamente.")
-
-    except FileNotFoundError:
-        print(f"Error: El archivo CSV no se encontró en '{file_path}'.")
+    except FileNotFoundError as e:
+        db.session.rollback()
+        print(f"Error: El archivo CSV no se encontró: {e.filename}.")
+        return None
     except pd.errors.EmptyDataError:
+        db.session.rollback()
         print(f"Error: El archivo CSV '{file_path}' está vacío.")
+        return None
     except Exception as e:
         print(f"Ocurrió un error inesperado durante la carga de datos: {e}")
-        db.session.rollback() # Deshacer si hay un error al añadir
+        db.session.rollback() # Deshacer toda la carga si hay un error
+        return None
+
+    emissions_store.rebuild() # Sustituye el índice en memoria por uno con los datos nuevos
+
+    elapsed = time.perf_counter() - started
+    rate = total_rows / elapsed if elapsed else 0.0
+    if not total_rows:
+        print("No se encontraron datos de emisiones en los archivos indicados. No se cargaron datos.")
+    else:
+        print(f"Datos de emisiones de CO2 cargados: {total_rows} registros de {len(regions)} regiones "
+              f"en {elapsed:.2f}s ({rate:.0f} registros/s).")
+    return {"rows": total_rows, "regions": sorted(regions), "seconds": elapsed, "rows_per_second": rate}
 
 
 if __name__ == '__main__':
     current_dir = os.path.dirname(os.path.abspath(__file__))
-    csv_file_path = os.path.join(current_dir, '..', 'data', 'BIG-TAB.4.07.19_c.csv')
-   
+    default_csv = os.path.join(current_dir, '..', 'data', 'BIG-TAB.4.07.19_c.csv')
+
+    parser = argparse.ArgumentParser(description="Carga emisiones de CO2 por región desde uno o varios CSV.")
+    parser.add_argument('files', nargs='*', default=[default_csv], help="Archivos CSV a cargar")
+    parser.add_argument('--chunksize', type=int, default=1000, help="Filas de CSV por bloque")
+    args = parser.parse_args()
+
     with app.app_context():
-        db.create_all() 
+        db.create_all()
+        upgrade_schema(db.engine)
         print("Base de datos y tablas creadas (si no existían).")
-        load_emissions_from_csv(csv_file_path)
\ No newline at end of file
+        load_emissions_from_csv(args.files, chunksize=args.chunksize)
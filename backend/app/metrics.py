@@ -0,0 +1,290 @@
+# backend/app/metrics.py
+
+import bisect
+import json
+import os
+import threading
+
+# Límites de los histogramas de latencia (segundos), los mismos que usa Prometheus por defecto
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    pairs.extend(f'{n}="{_escape(v)}"' for n, v in extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type_name = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {} # valores de las etiquetas -> valor
+        self._lock = threading.Lock()
+        (REGISTRY if registry is None else registry).register(self)
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} espera las etiquetas {self.labelnames}")
+        return tuple(map(str, labels))
+
+    def _sample_value(self, value):
+        return value
+
+    def collect(self):
+        """Devuelve (nombre, tipo, ayuda, [(etiquetas, valor), ...]), como un collector."""
+        with self._lock:
+            items = sorted((labels, self._sample_value(value)) for labels, value in self._values.items())
+        return (self.name, self.type_name, self.documentation,
+                [(dict(zip(self.labelnames, labels)), value) for labels, value in items])
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(_Metric):
+    """Contador que solo crece. `inc(*etiquetas, amount=1)`."""
+    type_name = 'counter'
+
+    def inc(self, *labels, amount=1):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(tuple(map(str, labels)), 0)
+
+
+class Gauge(Counter):
+    """Valor que sube y baja (p. ej. peticiones en curso)."""
+    type_name = 'gauge'
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value, *labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    """Histograma con límites fijos. `observe(valor, *etiquetas)`."""
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def observe(self, value, *labels):
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Cuentas por intervalo (no acumuladas), suma y total
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    def count(self, *labels):
+        state = self._values.get(tuple(map(str, labels)))
+        return state[2] if state else 0
+
+    def _sample_value(self, value):
+        # Copia de las cuentas por intervalo (no acumuladas); el último es el de +Inf
+        counts, total, n = value
+        return {"buckets": list(self.buckets), "counts": [*counts], "sum": total, "count": n}
+
+
+class Registry:
+    """
+    Conjunto de métricas que se exportan juntas en formato de texto de Prometheus.
+
+    Además de las métricas registradas admite `collectors`: funciones que se
+    llaman solo al exportar y devuelven métricas calculadas en ese momento
+    (p. ej. los contadores de la caché), sin coste en las peticiones.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+
+    def add_collector(self, collector):
+        """`collector()` devuelve una lista de (nombre, tipo, ayuda, [(etiquetas, valor), ...])."""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def collect(self):
+        """Todas las métricas, registradas y de los collectors, en el formato de los collectors."""
+        families = [metric.collect() for metric in list(self._metrics)]
+        for collector in list(self._collectors):
+            families.extend(collector())
+        return families
+
+    def reset(self):
+        """Pone a cero las métricas registradas (los collectors calculan sus valores al exportar)."""
+        for metric in list(self._metrics):
+            metric.reset()
+
+    def render(self):
+        return render_families(self.collect())
+
+
+def render_families(families):
+    """Texto de Prometheus de una lista de métricas en el formato de los collectors."""
+    lines = []
+    for name, type_name, documentation, samples in families:
+        lines.append(f'# HELP {name} {documentation}')
+        lines.append(f'# TYPE {name} {type_name}')
+        for labels, value in samples:
+            names, values = tuple(labels), tuple(labels.values())
+            if type_name != 'histogram':
+                lines.append(f'{name}{_format_labels(names, values)} {_format_value(value)}')
+                continue
+            cumulative = 0
+            for bound, bucket_count in zip((*value["buckets"], float('inf')), value["counts"]):
+                cumulative += bucket_count
+                lines.append(f'{name}_bucket{_format_labels(names, values, [("le", _format_value(bound))])} {cumulative}')
+            lines.append(f'{name}_sum{_format_labels(names, values)} {_format_value(value["sum"])}')
+            lines.append(f'{name}_count{_format_labels(names, values)} {value["count"]}')
+    return '\n'.join(lines) + '\n'
+
+
+def _add_values(a, b):
+    if a is None:
+        return b
+    if isinstance(a, dict): # Histograma: mismos límites en todos los procesos
+        return {"buckets": a["buckets"], "counts": [x + y for x, y in zip(a["counts"], b["counts"])],
+                "sum": a["sum"] + b["sum"], "count": a["count"] + b["count"]}
+    return a + b
+
+
+def merge_families(snapshots):
+    """Suma las métricas de varias listas (una por proceso) con el mismo nombre y etiquetas."""
+    merged = {} # nombre -> (tipo, ayuda, {etiquetas: valor})
+    for families in snapshots:
+        for name, type_name, documentation, samples in families:
+            values = merged.setdefault(name, (type_name, documentation, {}))[2]
+            for labels, value in samples:
+                key = tuple((k, str(v)) for k, v in labels.items())
+                values[key] = _add_values(values.get(key), value)
+    return [(name, type_name, documentation, [(dict(key), value) for key, value in sorted(values.items())])
+            for name, (type_name, documentation, values) in merged.items()]
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class SharedMetrics:
+    """
+    Métricas sumadas entre varios procesos (los hijos de prefork_server) a
+    través de un directorio compartido: cada proceso guarda lo que ha contado en
+    `<directorio>/<pid>.json` cada `interval` segundos, al terminar y al exportar,
+    y `render()` suma los archivos de todos. Así no importa qué proceso atienda
+    la consulta de /metrics: los contadores y los histogramas incluyen también a
+    los procesos que ya terminaron (no bajan nunca), y los gauges llevan la
+    etiqueta `worker` con el número del hijo y solo se exportan los de los vivos.
+    Lo de los otros procesos llega con hasta `interval` segundos de retraso.
+    """
+
+    def __init__(self, directory, registry=None, interval=5):
+        self.directory = directory
+        self.registry = REGISTRY if registry is None else registry
+        self.interval = interval
+        self.worker = None
+        self._stopped = threading.Event()
+        self._write_lock = threading.Lock()
+
+    def before_fork(self):
+        """
+        En el proceso principal, antes de crear los hijos: guarda lo contado al
+        cargar la aplicación y pone el registro a cero, para que los hijos no lo
+        hereden y se sume una sola vez.
+        """
+        self.write(gauges=False)
+        self.registry.reset()
+
+    def start(self, worker):
+        """En el hijo número `worker`, después del fork: empieza a guardar sus métricas."""
+        self.worker = worker
+        self._stopped = threading.Event()
+        self._write_lock = threading.Lock() # El del padre podría haberse copiado cerrado
+        self.write()
+        threading.Thread(target=self._sync, name='metrics-sync', daemon=True).start()
+
+    def _sync(self):
+        while not self._stopped.wait(self.interval):
+            self.write()
+
+    def stop(self):
+        """Al terminar de forma ordenada: lo último que ha contado, sin sus gauges."""
+        self._stopped.set()
+        self.write(gauges=False)
+
+    def write(self, gauges=True):
+        families = []
+        for name, type_name, documentation, samples in self.registry.collect():
+            if type_name == 'gauge':
+                if not gauges:
+                    continue
+                samples = [({**labels, "worker": self.worker}, value) for labels, value in samples]
+            families.append((name, type_name, documentation, samples))
+        path = os.path.join(self.directory, f'{os.getpid()}.json')
+        # Se escribe aparte y se sustituye: quien lee nunca ve un archivo a medias
+        with self._write_lock:
+            with open(path + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump({"pid": os.getpid(), "families": families}, f)
+            os.replace(path + '.tmp', path)
+
+    def _read_all(self):
+        snapshots = []
+        for file_name in os.listdir(self.directory):
+            if not file_name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.directory, file_name), encoding='utf-8') as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+            families = snapshot["families"]
+            if snapshot["pid"] != os.getpid() and not _process_alive(snapshot["pid"]):
+                # Un hijo que cayó sin pararse: sus gauges ya no valen
+                families = [family for family in families if family[1] != 'gauge']
+            snapshots.append(families)
+        return snapshots
+
+    def render(self):
+        self.write() # Lo de este proceso, al día
+        return render_families(merge_families(self._read_all()))
+
+
+# Registro por defecto de la aplicación
+REGISTRY = Registry()
@@ -1,50 +1,253 @@
 # backend/app/openfoodfacts_api.py
 
+import os
+import random
+import threading
+import time
+
 import requests
+from requests.adapters import HTTPAdapter
+from metrics import Counter, Histogram
 
 # URL base de la API de Open Food Facts
 # Documentación completa en: https://wiki.openfoodfacts.org/API
-OPENFOODFACTS_API_URL = "https://world.openfoodfacts.org/api/v2/product/"
+# (OFF_API_URL permite apuntar a otro servidor, p. ej. el simulado de los benchmarks)
+OPENFOODFACTS_API_URL = os.environ.get('OFF_API_URL', "https://world.openfoodfacts.org/api/v2/product/")
 
-def get_product_by_barcode(barcode: str):
-    
-    #Obtiene información de un producto de Open Food Facts por su código de barras.
-    url = f"{OPENFOODFACTS_API_URL}{barcode}.json"
+# Configuración del cliente HTTP (se puede ajustar con variables de entorno)
+OFF_POOL_SIZE = int(os.environ.get('OFF_POOL_SIZE', 20))               # Conexiones keep-alive reutilizables
+OFF_CONNECT_TIMEOUT = float(os.environ.get('OFF_CONNECT_TIMEOUT', 3.05))  # Segundos para abrir la conexión
+OFF_READ_TIMEOUT = float(os.environ.get('OFF_READ_TIMEOUT', 10))          # Segundos esperando la respuesta
+OFF_MAX_RETRIES = int(os.environ.get('OFF_MAX_RETRIES', 2))            # Reintentos ante 5xx o errores de conexión
+OFF_TOTAL_TIMEOUT = float(os.environ.get('OFF_TOTAL_TIMEOUT', 10))        # Segundos como máximo por consulta, con reintentos
+OFF_BACKOFF = float(os.environ.get('OFF_BACKOFF', 0.3))                # Base del backoff exponencial con jitter
 
-    try:
-        response = requests.get(url, timeout=10) 
-        response.raise_for_status() 
-        data = response.json()
 
-        if data.get('status') == 1 and 'product' in data:
-            product_data = data['product']
-
-            extracted_info = {
-                'barcode': product_data.get('code'),
-                'name': product_data.get('product_name', 'Nombre no disponible'),
-                'nutriscore': product_data.get('nutriscore_grade', 'n/a'),
-                'ecoscore': product_data.get('ecoscore_grade', 'n/a'),
-                'category': product_data.get('categories', 'Categoría no disponible').split(',')[0].strip(),
-                
-            }
-            return extracted_info
-        else:
+# Métricas de las llamadas a Open Food Facts (se exportan en /metrics)
+UPSTREAM_LATENCY = Histogram('openfoodfacts_request_duration_seconds',
+                             'Duración de las consultas de productos a Open Food Facts, con reintentos.',
+                             ('outcome',))
+UPSTREAM_ATTEMPTS = Counter('openfoodfacts_http_attempts_total',
+                            'Peticiones HTTP a Open Food Facts por resultado.', ('result',))
+
+
+class OpenFoodFactsError(Exception):
+    """Open Food Facts no respondió o devolvió una respuesta inválida."""
+
+
+class CircuitOpenError(OpenFoodFactsError):
+    """El circuito está abierto: no se llama a Open Food Facts hasta que pase el tiempo de espera."""
+
+
+class CircuitBreaker:
+    """
+    Corta las llamadas a Open Food Facts tras varios fallos seguidos.
+
+    Cerrado: las llamadas pasan. Abierto: fallan al instante durante
+    `reset_timeout` segundos. Después se deja pasar una llamada de prueba
+    (semiabierto); si funciona se cierra de nuevo, si falla se vuelve a abrir.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._failures = 0
+        self._opened_at = None
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self._opened_at is None:
+            return 'closed'
+        if self._clock() - self._opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def allow(self):
+        """Indica si se puede hacer una llamada ahora."""
+        with self._lock:
+            state = self._state()
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probe_in_flight or self._failures >= self.failure_threshold:
+                self._opened_at = self._clock()
+            self._probe_in_flight = False
+
+
+def extract_product_info(product_data):
+    """Extrae los campos que guardamos de un producto de Open Food Facts."""
+    return {
+        'barcode': product_data.get('code'),
+        'name': product_data.get('product_name', 'Nombre no disponible'),
+        'nutriscore': product_data.get('nutriscore_grade', 'n/a'),
+        'ecoscore': product_data.get('ecoscore_grade', 'n/a'),
+        'category': product_data.get('categories', 'Categoría no disponible').split(',')[0].strip(),
+    }
+
+
+class OpenFoodFactsClient:
+    """
+    Cliente HTTP reutilizable para Open Food Facts.
+
+    Mantiene un `requests.Session` con un pool de conexiones keep-alive,
+    timeouts de conexión y lectura separados, reintentos con backoff
+    exponencial y jitter ante errores 5xx o de conexión, y un circuit breaker
+    que falla rápido mientras Open Food Facts está caído.
+
+    Cada consulta, con sus reintentos y esperas, dura como mucho
+    `total_timeout` segundos. Un timeout de lectura no se reintenta: Open Food
+    Facts recibió la petición y repetirla solo alarga la espera del hilo.
+    """
+
+    def __init__(self, base_url=OPENFOODFACTS_API_URL, pool_size=OFF_POOL_SIZE,
+                 connect_timeout=OFF_CONNECT_TIMEOUT, read_timeout=OFF_READ_TIMEOUT,
+                 max_retries=OFF_MAX_RETRIES, backoff=OFF_BACKOFF, total_timeout=OFF_TOTAL_TIMEOUT,
+                 breaker=None, session=None, sleep=time.sleep, clock=time.monotonic):
+        self.base_url = base_url
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.total_timeout = total_timeout
+        self.breaker = breaker or CircuitBreaker()
+        self._sleep = sleep
+        self._clock = clock
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+        self.session = session
+
+    def get_product(self, barcode):
+        """
+        Devuelve el diccionario del producto, None si Open Food Facts indica que no
+        existe, o lanza OpenFoodFactsError si no se pudo consultar.
+        """
+        started = time.perf_counter()
+        outcome = 'error'
+        try:
+            product = self._fetch_product(barcode)
+            outcome = 'found' if product else 'not_found'
+            return product
+        except CircuitOpenError:
+            outcome = 'circuit_open'
+            raise
+        finally:
+            UPSTREAM_LATENCY.observe(time.perf_counter() - started, outcome)
+
+    def _fetch_product(self, barcode):
+        response = self._get(f"{self.base_url}{barcode}.json")
+        if response.status_code == 404:
             print(f"Producto con código de barras {barcode} no encontrado en Open Food Facts.")
             return None
-    except requests.exceptions.RequestException as e:
-        print(f"Error al conectar con Open Food Facts: {e}")
-        return None
-    except ValueError as e:
-        print(f"Error al procesar la respuesta JSON de Open Food Facts: {e}")
+        try:
+            response.raise_for_status()
+            data = response.json()
+        except requests.exceptions.RequestException as e:
+            print(f"Error al conectar con Open Food Facts: {e}")
+            raise OpenFoodFactsError(str(e)) from e
+        except ValueError as e:
+            print(f"Error al procesar la respuesta JSON de Open Food Facts: {e}")
+            raise OpenFoodFactsError(str(e)) from e
+
+        if data.get('status') == 1 and 'product' in data:
+            return extract_product_info(data['product'])
+        print(f"Producto con código de barras {barcode} no encontrado en Open Food Facts.")
         return None
 
+    def _get(self, url):
+        # Hace la petición con reintentos dentro del plazo total; cada intento con
+        # 5xx o error de red cuenta como un fallo del circuito
+        if not self.breaker.allow():
+            raise CircuitOpenError("Open Food Facts no disponible (circuito abierto).")
+
+        deadline = self._clock() + self.total_timeout
+        attempt = 0
+        while True:
+            remaining = max(deadline - self._clock(), 0.01)
+            timeout = (min(self.timeout[0], remaining), min(self.timeout[1], remaining))
+            retry = True
+            try:
+                response = self.session.get(url, timeout=timeout)
+            except requests.exceptions.ConnectionError as e:
+                # Incluye ConnectTimeout: la petición no llegó a enviarse
+                error = e
+                UPSTREAM_ATTEMPTS.inc('timeout' if isinstance(e, requests.exceptions.Timeout) else 'connection_error')
+                print(f"Error al conectar con Open Food Facts (intento {attempt + 1}): {e}")
+            except requests.exceptions.Timeout as e:
+                error, retry = e, False
+                UPSTREAM_ATTEMPTS.inc('timeout')
+                print(f"Open Food Facts no respondió a tiempo (intento {attempt + 1}): {e}")
+            except requests.exceptions.RequestException as e:
+                UPSTREAM_ATTEMPTS.inc('request_error')
+                self.breaker.record_failure()
+                raise OpenFoodFactsError(str(e)) from e
+            else:
+                UPSTREAM_ATTEMPTS.inc(f'{response.status_code // 100}xx')
+                if response.status_code < 500:
+                    self.breaker.record_success()
+                    return response
+                error = None
+                print(f"Open Food Facts respondió {response.status_code} (intento {attempt + 1}).")
+
+            self.breaker.record_failure()
+            # Backoff exponencial con jitter completo, sin pasarse del plazo ni seguir con el circuito abierto
+            delay = random.uniform(0, self.backoff * (2 ** attempt))
+            attempt += 1
+            if (not retry or attempt > self.max_retries or self._clock() + delay >= deadline
+                    or not self.breaker.allow()):
+                break
+            self._sleep(delay)
+
+        if error is not None:
+            raise OpenFoodFactsError(str(error)) from error
+        raise OpenFoodFactsError(f"Open Food Facts respondió {response.status_code}.")
+
+    def close(self):
+        self.session.close()
+
+
+# Cliente compartido por toda la aplicación
+default_client = OpenFoodFactsClient()
+
+
+def get_product_by_barcode(barcode: str):
+    
+    #Obtiene información de un producto de Open Food Facts por su código de barras.
+    #Devuelve None si Open Food Facts indica que el producto no existe y lanza
+    #OpenFoodFactsError si no se pudo consultar (red, timeout, JSON inválido).
+    return default_client.get_product(barcode)
+
 
 if __name__ == '__main__':
     # Código de barras de prueba (ej. Coca-Cola Light)
     test_barcode = "5449000000996" 
     
 
-    product = get_product_by_barcode(test_barcode)
+    try:
+        product = get_product_by_barcode(test_barcode)
+    except OpenFoodFactsError:
+        product = None
     if product:
         print("\n--- Información del Producto desde Open Food Facts ---")
         for key, value in product.items():
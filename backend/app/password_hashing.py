@@ -0,0 +1,89 @@
+# backend/app/password_hashing.py
+
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+import bcrypt
+from metrics import Histogram
+
+# Tiempo de cada operación visto desde la petición (incluye la espera en la cola del pool)
+HASH_DURATION = Histogram('password_hash_duration_seconds', 'Duración de las operaciones de bcrypt.',
+                          ('operation',))
+
+
+class HasherBusyError(Exception):
+    """La cola de operaciones de bcrypt está llena."""
+
+
+def _hash_password(password, rounds):
+    # Se ejecuta en un proceso del pool: debe ser una función de módulo
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _check_password(password, password_hash):
+    return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+
+
+def hash_rounds(password_hash):
+    """Devuelve el factor de trabajo de un hash bcrypt ('$2b$12$...' -> 12), o None."""
+    try:
+        return int(password_hash.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+class PasswordHasher:
+    """
+    Calcula y comprueba hashes bcrypt en un pool de procesos dedicado.
+
+    Así un pico de inicios de sesión no ocupa la CPU de los hilos que atienden
+    el resto de peticiones. El número de operaciones pendientes está acotado:
+    si la cola está llena durante más de `queue_timeout` segundos se lanza
+    HasherBusyError. Con workers=0 el hash se calcula en el hilo que llama.
+    """
+
+    def __init__(self, rounds=12, workers=2, max_pending=64, queue_timeout=5.0):
+        self.rounds = rounds
+        self.workers = workers
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def _get_pool(self):
+        # El pool se crea en el primer uso para no lanzar procesos al importar la app
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    def _run(self, operation, fn, *args):
+        started = time.perf_counter()
+        try:
+            if not self.workers:
+                return fn(*args)
+            if not self._slots.acquire(timeout=self.queue_timeout):
+                raise HasherBusyError("Demasiadas operaciones de contraseña en cola.")
+            try:
+                return self._get_pool().submit(fn, *args).result()
+            finally:
+                self._slots.release()
+        finally:
+            HASH_DURATION.observe(time.perf_counter() - started, operation)
+
+    def hash(self, password):
+        return self._run('hash', _hash_password, password, self.rounds)
+
+    def verify(self, password, password_hash):
+        return self._run('verify', _check_password, password, password_hash)
+
+    def needs_rehash(self, password_hash):
+        """Indica si el hash se generó con un factor de trabajo distinto del configurado."""
+        return hash_rounds(password_hash) != self.rounds
+
+    def shutdown(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
@@ -0,0 +1,48 @@
+# backend/app/popularity.py
+
+import threading
+from collections import Counter
+
+
+class PopularityTracker:
+    """
+    Cuenta en memoria cuántas veces se busca cada código de barras.
+
+    Los contadores se acumulan y se vuelcan con `on_flush(contadores)` cada
+    `flush_every` búsquedas (o al llamar a `flush`), para no escribir en la
+    base de datos en cada petición.
+    """
+
+    def __init__(self, on_flush, flush_every=100):
+        self._on_flush = on_flush
+        self.flush_every = flush_every
+        self._pending = Counter()
+        self._pending_total = 0
+        self._lock = threading.Lock()
+
+    def record(self, barcode, n=1):
+        with self._lock:
+            self._pending[barcode] += n
+            self._pending_total += n
+            should_flush = self._pending_total >= self.flush_every
+        if should_flush:
+            self.flush()
+
+    def pending(self):
+        with self._lock:
+            return dict(self._pending)
+
+    def flush(self):
+        """Vuelca los contadores pendientes. Devuelve cuántos códigos se volcaron."""
+        with self._lock:
+            counts = self._pending
+            self._pending = Counter()
+            self._pending_total = 0
+        if not counts:
+            return 0
+        try:
+            self._on_flush(dict(counts))
+        except Exception as e:
+            print(f"Error al guardar los contadores de popularidad: {e}")
+            return 0
+        return len(counts)
@@ -0,0 +1,190 @@
+# backend/app/prefork_server.py
+#
+# Servidor WSGI con procesos creados con fork por adelantado, sin dependencias
+# nuevas: cada proceso hijo atiende el socket compartido con el servidor de
+# werkzeug y un pool fijo de hilos. El proceso principal carga la aplicación
+# antes del fork (los hijos heredan sus páginas de memoria), vuelve a lanzar
+# los hijos que caen y, con SIGTERM o Ctrl+C, los para de forma ordenada: dejan
+# de aceptar conexiones, terminan las peticiones en curso y, pasado el plazo
+# de cierre, se matan. El punto de entrada es backend/run.py.
+
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+REQUEST_TIMEOUT = 30    # Segundos que se espera a un cliente lento antes de liberar su hilo
+RESPAWN_DELAY = 1.0     # Segundos mínimos entre relanzamientos de un proceso que se cae al arrancar
+
+
+class RequestHandler(WSGIRequestHandler):
+    # werkzeug cierra la conexión tras cada respuesta: el keep-alive lo da el proxy de delante
+    timeout = REQUEST_TIMEOUT
+    access_log = False
+
+    def log_request(self, code='-', size='-'):
+        if self.access_log:
+            super().log_request(code, size)
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """
+    Servidor WSGI de werkzeug con un pool fijo de hilos. Con todos los hilos
+    ocupados deja de aceptar conexiones, y las recogen los demás procesos que
+    escuchan en el mismo socket.
+    """
+
+    multithread = True # Para wsgi.multithread
+
+    def __init__(self, host, port, app, threads, fd=None, handler=RequestHandler):
+        super().__init__(host, port, app, handler=handler, fd=fd)
+        self._slots = threading.BoundedSemaphore(threads)
+        self._pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='wsgi')
+
+    def process_request(self, request, client_address):
+        self._slots.acquire()
+        self._pool.submit(self._process_request_thread, request, client_address)
+
+    def _process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self._slots.release()
+
+    def stop(self):
+        """Deja de aceptar conexiones. Se puede llamar desde un manejador de señales."""
+        # shutdown() espera a que termine serve_forever(): no puede llamarse desde su mismo hilo
+        threading.Thread(target=self.shutdown, daemon=True).start()
+
+    def serve_forever(self, poll_interval=0.5):
+        try:
+            super().serve_forever(poll_interval) # Cierra el socket al terminar
+        finally:
+            self._pool.shutdown(wait=True) # Termina las peticiones en curso
+
+
+def listen(host, port, backlog=2048):
+    """Socket de escucha que comparten todos los procesos."""
+    sock = socket.create_server((host, port), backlog=backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(master, index):
+    """Cuerpo del hijo número `index`. Nunca vuelve: termina el proceso con os._exit."""
+    code = 0
+    try:
+        # Ctrl+C llega a todo el grupo de procesos: el hijo espera al SIGTERM del principal
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        host, port = master.sock.getsockname()[:2]
+        server = PooledWSGIServer(host, port, master.app, master.threads, fd=master.sock.fileno())
+        signal.signal(signal.SIGTERM, lambda signum, frame: server.stop())
+        if master.on_worker_start:
+            master.on_worker_start(index)
+        server.serve_forever() # Al volver ya ha cerrado el socket y esperado a las peticiones en curso
+        if master.on_worker_exit:
+            master.on_worker_exit()
+    except Exception as e:
+        print(f"Error en el proceso {os.getpid()}: {e}", file=sys.stderr)
+        code = 1
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        # Sin os._exit el hijo seguiría ejecutando el código del proceso principal tras el fork
+        os._exit(code)
+
+
+class PreforkServer:
+    """
+    Proceso principal: crea `workers` hijos que atienden `app` en el socket
+    `sock` con `threads` hilos cada uno, los vuelve a lanzar si caen y los para
+    al terminar. `on_worker_start(index)` y `on_worker_exit` se llaman en cada
+    hijo al arrancar (después del fork) y al terminar de forma ordenada. Cada
+    hijo tiene un número entre 0 y workers - 1; el que sustituye a uno caído
+    recibe el mismo, así que siempre hay un hijo 0 para las tareas que solo
+    debe hacer uno.
+    """
+
+    def __init__(self, app, sock, workers, threads, graceful_timeout=30,
+                 on_worker_start=None, on_worker_exit=None):
+        self.app = app
+        self.sock = sock
+        self.threads = threads
+        self.graceful_timeout = graceful_timeout
+        self.on_worker_start = on_worker_start
+        self.on_worker_exit = on_worker_exit
+        self.target = workers
+        self.workers = {} # pid -> número del hijo
+        self.stopping = threading.Event()
+        self._last_spawn = 0.0
+
+    def spawn(self):
+        index = min(set(range(len(self.workers) + 1)) - set(self.workers.values()))
+        pid = os.fork()
+        if pid == 0:
+            run_worker(self, index)
+        self.workers[pid] = index
+        self._last_spawn = time.monotonic()
+
+    def reap(self):
+        """Recoge los hijos que han terminado y devuelve cuántos."""
+        finished = 0
+        while self.workers:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                self.workers.clear()
+                break
+            if pid == 0:
+                break
+            self.workers.pop(pid, None)
+            finished += 1
+            if not self.stopping.is_set():
+                print(f"El proceso {pid} terminó ({os.waitstatus_to_exitcode(status)}); se lanza otro.",
+                      file=sys.stderr)
+        return finished
+
+    def run(self):
+        signal.signal(signal.SIGTERM, lambda signum, frame: self.stopping.set())
+        signal.signal(signal.SIGINT, lambda signum, frame: self.stopping.set())
+        for _ in range(self.target):
+            self.spawn()
+        host, port = self.sock.getsockname()[:2]
+        print(f"Sirviendo en http://{host}:{port} con {self.target} procesos de {self.threads} hilos "
+              f"(pid {os.getpid()}).", flush=True)
+
+        while not self.stopping.wait(0.5):
+            self.reap()
+            # Uno por vuelta como mucho: un hijo que cae al arrancar no debe convertirse en un bucle de fork
+            if len(self.workers) < self.target and time.monotonic() - self._last_spawn >= RESPAWN_DELAY:
+                self.spawn()
+        self.stop()
+
+    def stop(self):
+        print("Parando los procesos...", flush=True)
+        for pid in list(self.workers):
+            self._signal(pid, signal.SIGTERM)
+        deadline = time.monotonic() + self.graceful_timeout
+        while self.workers and time.monotonic() < deadline:
+            self.reap()
+            time.sleep(0.1)
+        for pid in list(self.workers):
+            print(f"El proceso {pid} no terminó a tiempo; se mata.", file=sys.stderr)
+            self._signal(pid, signal.SIGKILL)
+        while self.workers:
+            self.reap()
+            time.sleep(0.05)
+        self.sock.close()
+
+    def _signal(self, pid, signum):
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
@@ -0,0 +1,96 @@
+# backend/app/product_cache.py
+
+import threading
+import time
+from collections import OrderedDict
+
+# Valor centinela que devuelve `get` cuando el código de barras no está en caché
+MISS = object()
+
+
+class ProductCache:
+    """
+    Caché LRU en memoria con caducidad (TTL) para las búsquedas de productos.
+
+    Guarda el diccionario del producto por código de barras. Los códigos que
+    Open Food Facts ha devuelto como inexistentes se guardan también
+    (caché negativa, valor None) con un TTL más corto.
+    """
+
+    def __init__(self, maxsize=1024, ttl=3600, negative_ttl=300, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._clock = clock
+        self._entries = OrderedDict()  # barcode -> (expira_en, producto o None)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, barcode, record_stats=True):
+        """
+        Devuelve el producto cacheado, None si es un 'no encontrado' cacheado o MISS.
+        Con record_stats=False la consulta no cuenta en los contadores.
+        """
+        with self._lock:
+            entry = self._entries.get(barcode)
+            if entry is not None and entry[0] <= self._clock():
+                del self._entries[barcode]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                if record_stats:
+                    self.misses += 1
+                return MISS
+            self._entries.move_to_end(barcode)
+            product = entry[1]
+            if record_stats:
+                if product is None:
+                    self.negative_hits += 1
+                else:
+                    self.hits += 1
+            return product
+
+    def set(self, barcode, product):
+        """Guarda un producto encontrado (diccionario serializable)."""
+        self._store(barcode, product, self.ttl)
+
+    def set_missing(self, barcode):
+        """Guarda un 'no encontrado' en Open Food Facts con el TTL negativo."""
+        self._store(barcode, None, self.negative_ttl)
+
+    def invalidate(self, barcode):
+        with self._lock:
+            self._entries.pop(barcode, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Contadores para dimensionar la caché."""
+        with self._lock:
+            lookups = self.hits + self.negative_hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "negative_hits": self.negative_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_ratio": (self.hits + self.negative_hits) / lookups if lookups else 0.0,
+            }
+
+    def _store(self, barcode, product, ttl):
+        if self.maxsize <= 0 or ttl <= 0:
+            return
+        with self._lock:
+            self._entries[barcode] = (self._clock() + ttl, product)
+            self._entries.move_to_end(barcode)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
@@ -0,0 +1,49 @@
+# backend/app/product_ranking.py
+
+from sqlalchemy import and_, or_, select
+
+# Posición de cada nota de Eco-Score / Nutri-Score (menor es mejor). Open Food
+# Facts usa 'a-plus' en el Green-Score; 'unknown', 'n/a' o vacío no puntúan.
+GRADE_RANKS = {'a-plus': 0, 'a': 1, 'b': 2, 'c': 3, 'd': 4, 'e': 5, 'f': 6}
+UNRANKED = 9 # Productos sin nota: van detrás de todos y no se proponen como alternativa
+
+
+def grade_rank(grade):
+    """Posición de una nota ('A', 'b', 'a-plus'...) o UNRANKED si no es una nota válida."""
+    if not grade:
+        return UNRANKED
+    return GRADE_RANKS.get(grade.strip().lower(), UNRANKED)
+
+
+def rank_sql(column):
+    """La misma conversión en SQL, para calcular las posiciones de las filas existentes."""
+    cases = ' '.join(f"WHEN '{grade}' THEN {rank}" for grade, rank in GRADE_RANKS.items())
+    return f'CASE lower(trim({column})) {cases} ELSE {UNRANKED} END'
+
+
+def rank_default(grade_column):
+    """Valor por defecto de una columna de posición a partir de la nota de la misma fila."""
+    def default(context):
+        return grade_rank(context.get_current_parameters().get(grade_column))
+    return default
+
+
+def alternatives_query(model, product, limit):
+    """
+    Consulta de los `limit` productos de la misma categoría que `product` (un
+    diccionario) con mejor Eco-Score y, a igual Eco-Score, mejor Nutri-Score.
+
+    Recorre el índice (category, eco_rank, nutri_rank) en orden desde el mejor
+    producto: todas las filas que encuentra antes de llegar a la posición de
+    `product` son alternativas, así que lee como mucho `limit` filas.
+    """
+    eco_rank, nutri_rank = grade_rank(product['ecoscore']), grade_rank(product['nutriscore'])
+    return (
+        select(model)
+        .where(model.category == product['category'],
+               model.eco_rank < UNRANKED,
+               or_(model.eco_rank < eco_rank, and_(model.eco_rank == eco_rank, model.nutri_rank < nutri_rank)),
+               model.id != product['id'])
+        .order_by(model.eco_rank, model.nutri_rank, model.id)
+        .limit(limit)
+    )
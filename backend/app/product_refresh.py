@@ -0,0 +1,134 @@
+# backend/app/product_refresh.py
+
+import queue
+import threading
+import time
+from collections import OrderedDict
+
+
+class RateLimiter:
+    """Cubo de fichas: como mucho `rate` operaciones por segundo, con ráfagas de hasta `burst`."""
+
+    def __init__(self, rate, burst=1, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            self._sleep(wait)
+
+
+class ProductRefresher:
+    """
+    Refresca productos obsoletos en segundo plano (stale-while-revalidate).
+
+    `schedule(barcode)` encola el código y vuelve al instante; unos pocos hilos
+    lo procesan llamando a `refresh(barcode)`, sin superar `rate` descargas por
+    segundo entre todos. Un código que ya está en cola no se encola otra vez, y
+    uno que se acaba de intentar no se reintenta hasta pasados `retry_after`
+    segundos (aunque haya fallado). Si la cola está llena el código se descarta:
+    lo recogerá el barrido periódico.
+    """
+
+    def __init__(self, refresh, workers=2, rate=2.0, max_queue=1000, retry_after=600,
+                 clock=time.monotonic, limiter=None):
+        self._refresh = refresh
+        self.workers = workers
+        self.retry_after = retry_after
+        self._clock = clock
+        self._limiter = limiter or RateLimiter(rate)
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._queued = set()
+        self._attempted = OrderedDict() # barcode -> momento del último intento
+        self._threads = []
+        self._lock = threading.Lock()
+        self.scheduled = 0
+        self.refreshed = 0
+        self.changed = 0
+        self.failed = 0
+        self.dropped = 0
+
+    def schedule(self, barcode):
+        """Encola un código para refrescarlo. Devuelve False si no se encola."""
+        with self._lock:
+            if barcode in self._queued:
+                return False
+            now = self._clock()
+            # Se olvidan los intentos antiguos para que el registro no crezca sin límite
+            while self._attempted and now - next(iter(self._attempted.values())) >= self.retry_after:
+                self._attempted.popitem(last=False)
+            if barcode in self._attempted:
+                return False
+            try:
+                self._queue.put_nowait(barcode)
+            except queue.Full:
+                self.dropped += 1
+                return False
+            self._queued.add(barcode)
+            self.scheduled += 1
+            self._start_workers()
+        return True
+
+    def _start_workers(self):
+        # Los hilos se crean con el primer código; son daemon para no retrasar el cierre del proceso
+        if not self._threads:
+            for n in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f'product-refresh-{n}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _work(self):
+        while True:
+            barcode = self._queue.get()
+            try:
+                self._limiter.acquire()
+                changed = self._refresh(barcode)
+                with self._lock:
+                    self.refreshed += 1
+                    self.changed += 1 if changed else 0
+            except Exception as e:
+                with self._lock:
+                    self.failed += 1
+                print(f"No se pudo refrescar el producto {barcode}: {e}")
+            finally:
+                with self._lock:
+                    self._queued.discard(barcode)
+                    self._attempted.pop(barcode, None)
+                    self._attempted[barcode] = self._clock()
+                self._queue.task_done()
+
+    def after_fork(self):
+        """En un proceso hijo recién creado: los hilos del padre no existen, se crearán con el primer código."""
+        self._threads = []
+        self._lock = threading.Lock()
+        if self._queued:
+            with self._lock:
+                self._start_workers()
+
+    def join(self):
+        """Espera a que se procesen todos los códigos encolados."""
+        self._queue.join()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "queued": len(self._queued),
+                "scheduled": self.scheduled,
+                "refreshed": self.refreshed,
+                "changed": self.changed,
+                "failed": self.failed,
+                "dropped": self.dropped,
+            }
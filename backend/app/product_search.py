@@ -0,0 +1,153 @@
+# backend/app/product_search.py
+
+import re
+from sqlalchemy import event, inspect, select, text
+
+# Índice de texto completo sobre products.name y products.category.
+# En SQLite es una tabla FTS5 de contenido externo que mantienen unos triggers
+# (sirven también para los INSERT masivos del importador); en PostgreSQL, un
+# índice GIN sobre to_tsvector, que la propia base de datos mantiene.
+FTS_TABLE = 'products_fts'
+PG_INDEX = 'ix_products_search'
+MAX_QUERY_TERMS = 8 # Palabras de la búsqueda que se tienen en cuenta
+
+# Peso de cada columna en la puntuación bm25: el nombre cuenta más que la categoría
+NAME_WEIGHT = 10.0
+CATEGORY_WEIGHT = 2.0
+
+SQLITE_DDL = [
+    f'''CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        name, category, content='products', content_rowid='id',
+        tokenize="unicode61 remove_diacritics 2")''',
+    f'''CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON products BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, category) VALUES (new.id, new.name, new.category);
+    END''',
+    f'''CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON products BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, category) VALUES ('delete', old.id, old.name, old.category);
+    END''',
+    # Solo si cambian las columnas indexadas (no al refrescar fetched_at, por ejemplo)
+    f'''CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF name, category ON products BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, category) VALUES ('delete', old.id, old.name, old.category);
+        INSERT INTO {FTS_TABLE}(rowid, name, category) VALUES (new.id, new.name, new.category);
+    END''',
+]
+
+PG_DOCUMENT = "to_tsvector('simple', coalesce(name, '') || ' ' || coalesce(category, ''))"
+PG_DDL = [f'CREATE INDEX IF NOT EXISTS {PG_INDEX} ON products USING GIN ({PG_DOCUMENT})']
+
+SQLITE_QUERY = text(f'''
+    SELECT products.* FROM {FTS_TABLE}
+    JOIN products ON products.id = {FTS_TABLE}.rowid
+    WHERE {FTS_TABLE} MATCH :query
+    ORDER BY bm25({FTS_TABLE}, {NAME_WEIGHT}, {CATEGORY_WEIGHT}), products.id
+    LIMIT :limit OFFSET :offset
+''')
+
+PG_QUERY = text(f'''
+    SELECT * FROM products
+    WHERE {PG_DOCUMENT} @@ to_tsquery('simple', :query)
+    ORDER BY ts_rank(setweight(to_tsvector('simple', coalesce(name, '')), 'A')
+                     || setweight(to_tsvector('simple', coalesce(category, '')), 'B'),
+                     to_tsquery('simple', :query)) DESC, id
+    LIMIT :limit OFFSET :offset
+''')
+
+
+def query_terms(q):
+    """Palabras de la búsqueda en minúsculas, sin signos (como mucho MAX_QUERY_TERMS)."""
+    return re.findall(r'\w+', (q or '').lower())[:MAX_QUERY_TERMS]
+
+
+def match_expression(terms, dialect_name):
+    """
+    Expresión de búsqueda para el motor: todas las palabras deben aparecer y
+    cada una admite prefijos, así "lech ent" encuentra "Leche entera".
+    Las palabras solo contienen caracteres \\w, por lo que no hace falta escaparlas.
+    """
+    if dialect_name == 'postgresql':
+        return ' & '.join(f'{term}:*' for term in terms)
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def search_products(session, q, limit, offset=0, model=None):
+    """
+    Busca productos por nombre y categoría, del más al menos relevante.
+    Devuelve filas de `model` si se indica (p. ej. Product) o filas de SQL.
+    """
+    terms = query_terms(q)
+    if not terms:
+        return []
+    dialect_name = session.get_bind().dialect.name
+    statement = PG_QUERY if dialect_name == 'postgresql' else SQLITE_QUERY
+    params = {"query": match_expression(terms, dialect_name), "limit": limit, "offset": offset}
+    if model is not None:
+        return session.execute(select(model).from_statement(statement), params).scalars().all()
+    return session.execute(statement, params).all()
+
+
+def _ddl(dialect_name):
+    return PG_DDL if dialect_name == 'postgresql' else SQLITE_DDL
+
+
+def create_search_index(conn):
+    """Crea el índice y sus triggers si no existen (idempotente)."""
+    for statement in _ddl(conn.dialect.name):
+        conn.execute(text(statement))
+
+
+def rebuild_search_index(conn):
+    """Vuelve a construir todo el índice de una vez a partir de la tabla products."""
+    if conn.dialect.name == 'postgresql':
+        conn.execute(text(f'REINDEX INDEX {PG_INDEX}'))
+    else:
+        conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+
+
+def ensure_search_index(engine):
+    """
+    Crea el índice en una base de datos existente y, si no existía, lo llena
+    con los productos actuales. Devuelve True si se ha creado.
+    """
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        if not inspector.has_table('products'):
+            return False
+        if conn.dialect.name == 'postgresql':
+            exists = PG_INDEX in {i['name'] for i in inspector.get_indexes('products')}
+        else:
+            exists = inspector.has_table(FTS_TABLE)
+        if exists:
+            return False
+        create_search_index(conn)
+        rebuild_search_index(conn)
+    print("Índice de búsqueda de productos creado.")
+    return True
+
+
+def install_search_index(table):
+    """Hace que create_all/drop_all de la tabla de productos creen y borren también el índice."""
+
+    @event.listens_for(table, 'after_create')
+    def _create(target, connection, **kw):
+        create_search_index(connection)
+
+    @event.listens_for(table, 'before_drop')
+    def _drop(target, connection, **kw):
+        # Los triggers se borran con la tabla; la tabla FTS5 hay que borrarla aparte
+        if connection.dialect.name != 'postgresql':
+            connection.execute(text(f'DROP TABLE IF EXISTS {FTS_TABLE}'))
+
+
+if __name__ == '__main__':
+    import argparse
+    from app import app, db
+
+    parser = argparse.ArgumentParser(description="Crea o reconstruye el índice de búsqueda de productos.")
+    parser.add_argument('--rebuild', action='store_true', help="Reconstruir el índice completo de una vez")
+    args = parser.parse_args()
+
+    with app.app_context():
+        if not ensure_search_index(db.engine) and args.rebuild:
+            with db.engine.begin() as conn:
+                rebuild_search_index(conn)
+            print("Índice de búsqueda de productos reconstruido.")
@@ -0,0 +1,127 @@
+# backend/app/schema.py
+
+from sqlalchemy import inspect, text
+from product_ranking import UNRANKED, rank_sql
+from barcodes import barcode_from_key, gtin_key
+from footprint import rebuild_footprint_counts
+
+# Columnas añadidas a los modelos después de crear las tablas:
+# (tabla, columna, definición, valor inicial para las filas existentes)
+ADDED_COLUMNS = [
+    ('products', 'version', 'INTEGER NOT NULL DEFAULT 1', None),
+    ('products', 'updated_at', 'TIMESTAMP', 'CURRENT_TIMESTAMP'),
+    ('products', 'fetched_at', 'TIMESTAMP', None), # Sin fecha: se consideran obsoletos y se refrescan
+    ('products', 'eco_rank', f'SMALLINT NOT NULL DEFAULT {UNRANKED}', rank_sql('ecoscore')),
+    ('products', 'nutri_rank', f'SMALLINT NOT NULL DEFAULT {UNRANKED}', rank_sql('nutriscore')),
+    ('products', 'gtin', 'BIGINT', None), # La rellena merge_duplicate_barcodes
+    ('regional_co2_emissions', 'version', 'INTEGER NOT NULL DEFAULT 1', None),
+    ('regional_co2_emissions', 'updated_at', 'TIMESTAMP', 'CURRENT_TIMESTAMP'),
+]
+
+# Índices sobre columnas añadidas: (nombre, tabla, columnas, único)
+ADDED_INDEXES = [
+    ('ix_products_fetched_at', 'products', 'fetched_at', False),
+    ('ix_products_updated_at', 'products', 'updated_at', False), # Overlay de la instantánea del catálogo
+    ('ix_products_category_rank', 'products', 'category, eco_rank, nutri_rank', False),
+    ('ix_products_gtin', 'products', 'gtin', True), # Después de fusionar los duplicados
+]
+
+
+def upgrade_schema(engine):
+    """
+    Añade a las tablas existentes las columnas nuevas de los modelos, ya que
+    `db.create_all()` solo crea las tablas que faltan. Es idempotente y
+    devuelve la lista de columnas añadidas ('tabla.columna').
+    """
+    added = []
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        for table, column, definition, initial in ADDED_COLUMNS:
+            if not inspector.has_table(table):
+                continue
+            if column in {c['name'] for c in inspector.get_columns(table)}:
+                continue
+            conn.execute(text(f'ALTER TABLE {table} ADD COLUMN {column} {definition}'))
+            if initial is not None:
+                conn.execute(text(f'UPDATE {table} SET {column} = {initial}'))
+            added.append(f'{table}.{column}')
+        if inspector.has_table('products'):
+            merge_duplicate_barcodes(conn)
+        for name, table, columns, unique in ADDED_INDEXES:
+            if inspector.has_table(table):
+                conn.execute(text(f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS {name} ON {table} ({columns})"))
+        if all(inspector.has_table(t) for t in ('user_footprint_counts', 'user_favorites', 'products')):
+            # Rellena la tabla nueva y recoge los favoritos movidos al fusionar productos
+            rebuild_footprint_counts(conn)
+    if added:
+        print(f"Esquema actualizado, columnas añadidas: {', '.join(added)}.")
+    return added
+
+
+def merge_duplicate_barcodes(conn):
+    """
+    Rellena products.gtin de las filas que aún no la tienen, guarda su código en
+    forma normalizada y fusiona las filas que resultan ser el mismo producto
+    (p. ej. '737628064502' y '0737628064502'): se conserva una, que recibe los
+    favoritos y las búsquedas de las demás. Las filas con códigos no válidos se
+    dejan sin clave. Es idempotente; devuelve (normalizadas, fusionadas, no válidas).
+    """
+    groups = {} # clave -> [(id, código)]
+    invalid = 0
+    for product_id, barcode in conn.execute(text('SELECT id, barcode FROM products WHERE gtin IS NULL ORDER BY id')):
+        key = gtin_key(barcode)
+        if key is None:
+            invalid += 1
+        else:
+            groups.setdefault(key, []).append((product_id, barcode))
+
+    has_favorites = inspect(conn).has_table('user_favorites')
+    normalized = merged = 0
+    for key, rows in groups.items():
+        canonical = barcode_from_key(key)
+        owner = conn.execute(text('SELECT id FROM products WHERE gtin = :gtin'), {"gtin": key}).scalar()
+        if owner is None:
+            # Se conserva la fila que ya tiene el código normalizado o, si no, la más antigua
+            owner = next((i for i, b in rows if b == canonical), rows[0][0])
+        for product_id, _ in rows:
+            if product_id == owner:
+                continue
+            if has_favorites:
+                conn.execute(text('''
+                    INSERT INTO user_favorites (user_id, product_id)
+                    SELECT user_id, :owner FROM user_favorites WHERE product_id = :duplicate
+                    AND user_id NOT IN (SELECT user_id FROM user_favorites WHERE product_id = :owner)
+                '''), {"owner": owner, "duplicate": product_id})
+                conn.execute(text('DELETE FROM user_favorites WHERE product_id = :duplicate'), {"duplicate": product_id})
+            conn.execute(text('DELETE FROM products WHERE id = :duplicate'), {"duplicate": product_id})
+            merged += 1
+        conn.execute(text('''
+            UPDATE products SET gtin = :gtin, barcode = :barcode,
+                version = CASE WHEN barcode = :barcode THEN version ELSE version + 1 END
+            WHERE id = :id
+        '''), {"gtin": key, "barcode": canonical, "id": owner})
+        normalized += 1
+
+    if inspect(conn).has_table('product_lookup_counts'):
+        _merge_lookup_counts(conn)
+    if merged or invalid:
+        print(f"Códigos de barras normalizados: {normalized}, duplicados fusionados: {merged}, "
+              f"no válidos: {invalid}.")
+    return normalized, merged, invalid
+
+
+def _merge_lookup_counts(conn):
+    # Los contadores de popularidad se guardan por código: se suman en el normalizado
+    rows = conn.execute(text('SELECT barcode, lookups FROM product_lookup_counts')).all()
+    totals = {}
+    changed = False
+    for barcode, lookups in rows:
+        key = gtin_key(barcode)
+        canonical = barcode if key is None else barcode_from_key(key)
+        totals[canonical] = totals.get(canonical, 0) + lookups
+        changed = changed or canonical != barcode
+    if not changed:
+        return
+    conn.execute(text('DELETE FROM product_lookup_counts'))
+    conn.execute(text('INSERT INTO product_lookup_counts (barcode, lookups) VALUES (:barcode, :lookups)'),
+                 [{"barcode": b, "lookups": n} for b, n in totals.items()])
@@ -0,0 +1,136 @@
+# backend/app/serializers.py
+
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from decimal import Decimal
+from flask import current_app
+from flask.json.provider import DefaultJSONProvider
+from metrics import Histogram
+
+try:
+    import orjson # Opcional: si está instalado se usa para codificar JSON
+except ImportError:
+    orjson = None
+
+
+ENCODE_DURATION = Histogram('json_encode_duration_seconds', 'Duración de la codificación JSON de las respuestas.',
+                            buckets=(0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1))
+
+PRODUCT_FIELDS = ('id', 'barcode', 'name', 'nutriscore', 'ecoscore', 'category', 'version')
+
+
+def product_row(product):
+    """Tupla con los campos públicos de un producto (modelo Product o diccionario)."""
+    if isinstance(product, dict):
+        return tuple(product[field] for field in PRODUCT_FIELDS)
+    return tuple(getattr(product, field) for field in PRODUCT_FIELDS)
+
+
+def product_to_dict(product):
+    return dict(zip(PRODUCT_FIELDS, product_row(product)))
+
+
+def emission_to_dict(emission_id, region_name, year, total_co2_tonnes):
+    return {
+        "id": int(emission_id),
+        "region_name": region_name,
+        "year": int(year),
+        "total_co2_tonnes": float(total_co2_tonnes),
+    }
+
+
+def _default(obj):
+    # Tipos que ninguno de los dos codificadores admite directamente
+    if isinstance(obj, Decimal):
+        return str(obj)
+    if isinstance(obj, date):
+        return obj.isoformat()
+    if hasattr(obj, 'item'):
+        return obj.item() # Escalares de NumPy
+    raise TypeError(f"Objeto de tipo {type(obj).__name__} no serializable a JSON")
+
+
+def dumps(obj):
+    """Codifica un objeto como JSON compacto en bytes UTF-8 (sin escapar acentos)."""
+    started = time.perf_counter()
+    if orjson is not None:
+        data = orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    else:
+        data = json.dumps(obj, default=_default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    ENCODE_DURATION.observe(time.perf_counter() - started)
+    return data
+
+
+def json_response(body, status=200):
+    """Respuesta JSON a partir de bytes ya codificados."""
+    return current_app.response_class(body, status=status, mimetype='application/json')
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    Proveedor JSON de Flask que usa `dumps` (orjson si está disponible), de
+    modo que `jsonify` también se beneficia. En modo debug se mantiene la
+    salida indentada de Flask.
+    """
+    ensure_ascii = False
+    sort_keys = False
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return dumps(obj).decode('utf-8')
+
+    def response(self, *args, **kwargs):
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps(obj) + b'\n', mimetype=self.mimetype)
+
+
+class ProductJSONCache:
+    """
+    Fragmentos JSON ya codificados de cada producto, indexados por id.
+
+    Cada entrada guarda también la tupla de campos con la que se codificó: si
+    la fila ha cambiado (por ejemplo, desde otro proceso) el fragmento se
+    vuelve a codificar en lugar de servir uno obsoleto. Las listas se
+    construyen concatenando fragmentos, sin volver a codificar diccionarios.
+    """
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._entries = OrderedDict() # id -> (campos, bytes)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def encode(self, product):
+        row = product_row(product)
+        with self._lock:
+            entry = self._entries.get(row[0])
+            if entry is not None and entry[0] == row:
+                self._entries.move_to_end(row[0])
+                return entry[1]
+
+        data = dumps(dict(zip(PRODUCT_FIELDS, row)))
+        with self._lock:
+            self._entries[row[0]] = (row, data)
+            self._entries.move_to_end(row[0])
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return data
+
+    def encode_list(self, products):
+        return b'[' + b','.join(self.encode(product) for product in products) + b']'
+
+    def invalidate(self, product_id):
+        with self._lock:
+            self._entries.pop(product_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
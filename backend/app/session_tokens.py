@@ -0,0 +1,47 @@
+# backend/app/session_tokens.py
+
+import base64
+import hashlib
+import hmac
+import time
+
+
+class SessionTokenSigner:
+    """
+    Emite y comprueba tokens de sesión firmados con HMAC-SHA256.
+
+    El token tiene la forma '<user_id>.<expira_en>.<firma>' y se valida sin
+    acceder a la base de datos: basta con recalcular la firma y mirar la fecha
+    de caducidad (segundos desde epoch).
+    """
+
+    def __init__(self, secret_key, ttl=7 * 24 * 3600, clock=time.time):
+        if isinstance(secret_key, str):
+            secret_key = secret_key.encode('utf-8')
+        self._key = secret_key
+        self.ttl = ttl
+        self._clock = clock
+
+    def _sign(self, payload):
+        digest = hmac.new(self._key, payload.encode('ascii'), hashlib.sha256).digest()
+        return base64.urlsafe_b64encode(digest).rstrip(b'=').decode('ascii')
+
+    def issue(self, user_id):
+        """Devuelve (token, expira_en) para un usuario."""
+        expires_at = int(self._clock()) + self.ttl
+        payload = f"{int(user_id)}.{expires_at}"
+        return f"{payload}.{self._sign(payload)}", expires_at
+
+    def verify(self, token):
+        """Devuelve el id de usuario del token, o None si es inválido o ha caducado."""
+        try:
+            user_id, expires_at, signature = token.split('.')
+            payload = f"{user_id}.{expires_at}"
+            # En bytes: compare_digest no admite cadenas con caracteres no ASCII
+            if not hmac.compare_digest(signature.encode('utf-8'), self._sign(payload).encode('ascii')):
+                return None
+            if int(expires_at) < self._clock():
+                return None
+            return int(user_id)
+        except (AttributeError, ValueError, UnicodeEncodeError):
+            return None
@@ -0,0 +1,138 @@
+# backend/app/tests/app_testing.py
+#
+# Base de los tests que usan la base de datos. El esquema y los datos comunes
+# (emisiones de Euskadi y el usuario testuser) se crean una sola vez por proceso
+# en una base de datos propia del proceso, así que pytest -n N puede repartir los
+# tests entre procesos. Cada test corre dentro de una transacción que se deshace
+# al terminar (los commit de la aplicación solo liberan un SAVEPOINT).
+# Se importa antes que app (lo hace conftest.py): la URL y el modo de tests se
+# leen al importar app.
+
+import atexit
+import os
+import tempfile
+import unittest
+
+if 'TEST_DATABASE_URL' in os.environ:
+    os.environ['DATABASE_URL'] = os.environ['TEST_DATABASE_URL']
+else:
+    # Un archivo y no :memory:, para que los tests con varios hilos tengan cada uno su conexión
+    _fd, _db_path = tempfile.mkstemp(prefix='ecotrack-tests-', suffix='.db')
+    os.close(_fd)
+    atexit.register(lambda: [os.remove(p) for p in (_db_path, _db_path + '-wal', _db_path + '-shm')
+                             if os.path.exists(p)])
+    os.environ['DATABASE_URL'] = 'sqlite:///' + _db_path
+os.environ['FLASK_TESTING'] = '1' # bcrypt con el factor mínimo y sin procesos aparte
+
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from app import (app, db, User, RegionalCo2Emission, emissions_store, product_cache, product_json,
+                 product_popularity)
+
+TEST_USERNAME = 'testuser'
+TEST_PASSWORD = 'testpassword'
+
+_engine_ready = False
+_template_ready = False
+
+
+class _JoinedSession(Session):
+    # La sesión de Flask-SQLAlchemy elige siempre el motor; aquí se usa la conexión del test
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self.bind is not None:
+            return self.bind
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _enable_sqlite_savepoints(engine):
+    # pysqlite abre y cierra las transacciones por su cuenta y rompe los SAVEPOINT:
+    # se le quita ese control y el BEGIN lo emite SQLAlchemy
+    @event.listens_for(engine, 'connect')
+    def _disable_pysqlite_transactions(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, 'begin')
+    def _emit_begin(conn):
+        conn.exec_driver_sql('BEGIN')
+
+
+def build_template():
+    """Crea el esquema y los datos comunes a todos los tests (una vez por proceso)."""
+    global _engine_ready, _template_ready
+    if _template_ready:
+        return
+    with app.app_context():
+        if not _engine_ready and db.engine.dialect.name == 'sqlite':
+            _enable_sqlite_savepoints(db.engine)
+            db.engine.dispose() # Las conexiones ya abiertas no tienen los eventos
+        _engine_ready = True
+        db.drop_all()
+        db.create_all()
+        db.session.add_all([
+            RegionalCo2Emission(region_name='C.A. de Euskadi', year=2021, total_co2_tonnes=14828603.0),
+            RegionalCo2Emission(region_name='C.A. de Euskadi', year=2022, total_co2_tonnes=16006313.0),
+        ])
+        user = User(username=TEST_USERNAME, email='test@example.com')
+        user.set_password(TEST_PASSWORD)
+        db.session.add(user)
+        db.session.commit()
+        db.session.remove()
+    _template_ready = True
+
+
+def commits(test):
+    """
+    Marca un test que escribe desde otros hilos (cada uno con su conexión): no
+    corre dentro de la transacción del test y al terminar se rehacen los datos comunes.
+    """
+    test.commits = True
+    return test
+
+
+class AppTestCase(unittest.TestCase):
+    """Test con la base de datos de plantilla y una transacción que se deshace al terminar."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        build_template()
+
+    def setUp(self):
+        app.config['TESTING'] = True
+        self.app = app.test_client() # Cliente de prueba de Flask para simular peticiones
+        # Las cachés en memoria no se deshacen con la transacción
+        product_cache.clear()
+        product_json.clear()
+        emissions_store.invalidate()
+
+        self._transactional = not getattr(getattr(self, self._testMethodName), 'commits', False)
+        if self._transactional:
+            with app.app_context():
+                self._connection = db.engine.connect()
+            self._transaction = self._connection.begin()
+            # Todas las sesiones (una por contexto de la aplicación) se unen a la
+            # transacción del test; sus commit y rollback son de un SAVEPOINT
+            factory = db.session.session_factory
+            self._session_factory = (factory.class_, dict(factory.kw))
+            factory.class_ = _JoinedSession
+            factory.configure(bind=self._connection, join_transaction_mode='create_savepoint')
+
+        with app.app_context():
+            self.test_user_id = User.query.filter_by(username=TEST_USERNAME).one().id
+
+    def tearDown(self):
+        product_popularity.flush() # Los contadores pendientes se escriben antes de deshacer
+        with app.app_context():
+            db.session.remove()
+        if self._transactional:
+            self._transaction.rollback()
+            self._connection.close()
+            factory = db.session.session_factory
+            factory.class_, factory.kw = self._session_factory
+        else:
+            global _template_ready
+            _template_ready = False
+            build_template()
+        product_cache.clear()
+        product_json.clear()
+        emissions_store.invalidate()
@@ -0,0 +1,2 @@
+# Configura la base de datos y el modo de tests antes de que ningún módulo importe app
+import app_testing # noqa: F401
@@ -1,48 +1,34 @@
 import unittest
 from flask import json
-from app import app, db, User, Product, RegionalCo2Emission, bcrypt # Importa todos los componentes necesarios
+from app_testing import AppTestCase, commits
+from app import app, db, session_tokens, emissions_store, User, Product, RegionalCo2Emission, password_hasher, user_favorites, product_cache, product_popularity, ProductLookupCount, warm_product_cache, product_refresher, sweep_stale_products, utcnow, catalog, UserFootprintCount, load_seed_barcodes # Importa todos los componentes necesarios
 from unittest.mock import patch, MagicMock # Para simular llamadas a APIs externas
 import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from openfoodfacts_api import OpenFoodFactsError
+from product_cache import MISS
+from catalog_snapshot import export_snapshot
+from barcodes import canonical_barcode
+from footprint import rebuild_footprint_counts
+from load_emissions_data import UPSERT_EMISSION_SQL
+from sqlalchemy import select
+from password_hashing import HasherBusyError, hash_rounds
+import bcrypt as bcrypt_lib
+import app as app_module
 
 # --- CLASE DE TESTS PARA LA APLICACIÓN FLASK ---
-class FlaskAppTests(unittest.TestCase):
+# La base de datos con las emisiones de Euskadi (2021 y 2022) y el usuario testuser
+# se crea una vez; cada test deshace sus cambios al terminar (ver app_testing.py)
+class FlaskAppTests(AppTestCase):
 
-    # Método que se ejecuta ANTES de cada test
     def setUp(self):
-        # 1. Configurar la aplicación para testing
-        app.config['TESTING'] = True
-        # Usar una base de datos SQLite en memoria para que los tests sean rápidos y no afecten a la BD real
-        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
-        self.app = app.test_client() # Cliente de prueba de Flask para simular peticiones
-
-        # 2. Crear las tablas de la base de datos en el contexto de la aplicación
-        with app.app_context():
-            db.create_all()
-            # 3. Cargar datos de prueba para las emisiones (se cargarán solo si no existen)
-            self._load_test_emissions_data()
-            # 4. Registrar un usuario de prueba para tests de autenticación/favoritos
-            self.test_user = User(username='testuser', email='test@example.com')
-            self.test_user.set_password('testpassword')
-            db.session.add(self.test_user)
-            db.session.commit()
-            self.test_user_id = self.test_user.id # Guardar el ID del usuario de prueba
-
-    # Método que se ejecuta DESPUÉS de cada test
-    def tearDown(self):
-        # Limpiar la sesión de la base de datos y eliminar todas las tablas
-        with app.app_context():
-            db.session.remove() # Cierra la sesión
-            db.drop_all() # Elimina todas las tablas de la base de datos en memoria
-
-    # --- Ayudante: Cargar datos de emisiones para tests ---
-    def _load_test_emissions_data(self):
-        """Carga un conjunto mínimo de datos de emisiones de prueba directamente en la BD."""
-        # Asegúrate de que los datos coincidan con lo que buscarías en los tests
-        euskadi_2021 = RegionalCo2Emission(region_name='C.A. de Euskadi', year=2021, total_co2_tonnes=14828603.0)
-        euskadi_2022 = RegionalCo2Emission(region_name='C.A. de Euskadi', year=2022, total_co2_tonnes=16006313.0)
-        db.session.add(euskadi_2021)
-        db.session.add(euskadi_2022)
-        db.session.commit()
+        super().setUp()
+        # Las rutas de favoritos piden el token de sesión: el cliente envía el de testuser
+        self.app.environ_base['HTTP_AUTHORIZATION'] = f"Bearer {session_tokens.issue(self.test_user_id)[0]}"
 
     # --- TESTS FUNCIONALES ---
 
@@ -94,6 +80,29 @@ class FlaskAppTests(unittest.TestCase):
         self.assertEqual(response.status_code, 200) #
         self.assertIn(b"Inicio de sesi\xc3\xb3n exitoso.", response.data) #
 
+    def test_login_rehashes_when_work_factor_changes(self):
+        with app.app_context():
+            user = db.session.get(User, self.test_user_id)
+            user.password_hash = bcrypt_lib.hashpw(b'testpassword', bcrypt_lib.gensalt(password_hasher.rounds + 1)).decode('utf-8')
+            db.session.commit()
+
+        response = self.app.post('/api/users/login',
+                                 data=json.dumps({"username": "testuser", "password": "testpassword"}),
+                                 content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        with app.app_context():
+            new_hash = db.session.get(User, self.test_user_id).password_hash
+            self.assertEqual(hash_rounds(new_hash), password_hasher.rounds)
+            self.assertTrue(password_hasher.verify('testpassword', new_hash))
+
+    def test_login_busy_hasher_returns_503(self):
+        with patch.object(password_hasher, 'verify', side_effect=HasherBusyError()):
+            response = self.app.post('/api/users/login',
+                                     data=json.dumps({"username": "testuser", "password": "testpassword"}),
+                                     content_type='application/json')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers['Retry-After'], '1')
+
     def test_login_user_incorrect_password(self):
         response = self.app.post('/api/users/login',
                                  data=json.dumps({"username": "testuser", "password": "wrongpassword"}),
@@ -114,11 +123,11 @@ class FlaskAppTests(unittest.TestCase):
     def test_search_product_in_local_db(self, mock_get_product):
         # Añadir un producto de prueba directamente a la BD para simular que ya existe localmente
         with app.app_context():
-            existing_product = Product(barcode='1234567890123', name='Leche Test', nutriscore='B', ecoscore='A', category='Lacteos')
+            existing_product = Product(barcode='1234567890128', name='Leche Test', nutriscore='B', ecoscore='A', category='Lacteos')
             db.session.add(existing_product)
             db.session.commit()
 
-        response = self.app.get('/api/products/search?barcode=1234567890123')
+        response = self.app.get('/api/products/search?barcode=1234567890128')
         self.assertEqual(response.status_code, 200) #
         data = json.loads(response.data)
         self.assertEqual(data['name'], 'Leche Test') #
@@ -128,22 +137,22 @@ class FlaskAppTests(unittest.TestCase):
     def test_search_product_from_openfoodfacts_and_save(self, mock_get_product):
         # Simula una respuesta exitosa de Open Food Facts
         mock_get_product.return_value = {
-            'barcode': '9876543210987',
+            'barcode': '9876543210982',
             'name': 'Pan Integral Mock',
             'nutriscore': 'A',
             'ecoscore': 'B',
             'category': 'Panaderia'
         }
 
-        response = self.app.get('/api/products/search?barcode=9876543210987')
+        response = self.app.get('/api/products/search?barcode=9876543210982')
         self.assertEqual(response.status_code, 201) # (Se espera 201 Created porque se guarda)
         data = json.loads(response.data)
         self.assertEqual(data['name'], 'Pan Integral Mock') #
-        mock_get_product.assert_called_once_with('9876543210987') # Asegura que la API externa FUE llamada
+        mock_get_product.assert_called_once_with('9876543210982') # Asegura que la API externa FUE llamada
 
         # Verificar que el producto fue guardado en la BD
         with app.app_context():
-            product = Product.query.filter_by(barcode='9876543210987').first()
+            product = Product.query.filter_by(barcode='9876543210982').first()
             self.assertIsNotNone(product)
             self.assertEqual(product.name, 'Pan Integral Mock')
 
@@ -152,9 +161,208 @@ class FlaskAppTests(unittest.TestCase):
         # Simula que Open Food Facts no encuentra el producto
         mock_get_product.return_value = None
 
-        response = self.app.get('/api/products/search?barcode=1111111111111')
+        response = self.app.get('/api/products/search?barcode=1111111111116')
         self.assertEqual(response.status_code, 404) #
-        self.assertIn(b"Producto con c\xc3\xb3digo de barras '1111111111111' no encontrado.", response.data) #
+        self.assertIn(b"Producto con c\xc3\xb3digo de barras '1111111111116' no encontrado.", response.data) #
+
+        # El mensaje repite el código tal como llegó (UPC-A), no su forma EAN-13
+        response = self.app.get('/api/products/search?barcode=111111111117')
+        self.assertEqual(response.status_code, 404)
+        self.assertIn(b"Producto con c\xc3\xb3digo de barras '111111111117' no encontrado.", response.data)
+        mock_get_product.assert_called_with('0111111111117')
+
+    @patch('app.get_product_by_barcode')
+    def test_search_product_served_from_cache(self, mock_get_product):
+        mock_get_product.return_value = {
+            'barcode': '9876543210982',
+            'name': 'Pan Integral Mock',
+            'nutriscore': 'A',
+            'ecoscore': 'B',
+            'category': 'Panaderia'
+        }
+        first = self.app.get('/api/products/search?barcode=9876543210982')
+        self.assertEqual(first.status_code, 201)
+
+        # La segunda búsqueda se sirve desde la caché, sin consultar la BD ni Open Food Facts
+        with app.app_context(), patch.object(Product, 'query') as mock_query:
+            second = self.app.get('/api/products/search?barcode=9876543210982')
+            mock_query.filter_by.assert_not_called()
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(json.loads(second.data)['name'], 'Pan Integral Mock')
+        mock_get_product.assert_called_once_with('9876543210982')
+
+    @patch('app.get_product_by_barcode')
+    def test_search_product_not_found_is_negatively_cached(self, mock_get_product):
+        mock_get_product.return_value = None
+        before = product_cache.stats()
+
+        for _ in range(3):
+            response = self.app.get('/api/products/search?barcode=1111111111116')
+            self.assertEqual(response.status_code, 404)
+        mock_get_product.assert_called_once_with('1111111111116')
+
+        stats = json.loads(self.app.get('/api/products/cache').data)
+        self.assertEqual(stats['negative_hits'] - before['negative_hits'], 2)
+        self.assertEqual(stats['misses'] - before['misses'], 1)
+
+    @commits # Cada hilo escribe con su propia conexión
+    @patch('app.get_product_by_barcode')
+    def test_concurrent_searches_share_one_upstream_fetch(self, mock_get_product):
+        def slow_upstream(barcode):
+            time.sleep(0.2) # Simula la latencia de Open Food Facts
+            return {'barcode': barcode, 'name': 'Galletas Mock', 'nutriscore': 'D',
+                    'ecoscore': 'C', 'category': 'Snacks'}
+        mock_get_product.side_effect = slow_upstream
+
+        n_requests = 8
+        barrier = threading.Barrier(n_requests)
+        statuses = []
+
+        def scan():
+            client = app.test_client()
+            barrier.wait()
+            response = client.get('/api/products/search?barcode=7622210449283')
+            statuses.append(response.status_code)
+
+        threads = [threading.Thread(target=scan) for _ in range(n_requests)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        mock_get_product.assert_called_once_with('7622210449283')
+        self.assertEqual(len(statuses), n_requests)
+        self.assertNotIn(500, statuses)
+        self.assertEqual(statuses.count(201), 1) # Solo una petición creó el producto
+        with app.app_context():
+            self.assertEqual(Product.query.filter_by(barcode='7622210449283').count(), 1)
+
+    @patch('app.get_product_by_barcode')
+    def test_search_product_upstream_unavailable(self, mock_get_product):
+        mock_get_product.side_effect = OpenFoodFactsError("timeout")
+
+        response = self.app.get('/api/products/search?barcode=2222222222222')
+        self.assertEqual(response.status_code, 503)
+        # Un fallo de red no se cachea como 'no encontrado'
+        self.app.get('/api/products/search?barcode=2222222222222')
+        self.assertEqual(mock_get_product.call_count, 2)
+
+    @patch('app.get_product_by_barcode')
+    def test_search_products_batch(self, mock_get_product):
+        with app.app_context():
+            db.session.add(Product(barcode='1234567890128', name='Leche Test', nutriscore='B', ecoscore='A', category='Lacteos'))
+            db.session.commit()
+
+        def upstream(barcode):
+            if barcode == '9876543210982':
+                return {'barcode': barcode, 'name': 'Pan Integral Mock', 'nutriscore': 'A',
+                        'ecoscore': 'B', 'category': 'Panaderia'}
+            if barcode == '2222222222222':
+                raise OpenFoodFactsError("timeout")
+            return None
+        mock_get_product.side_effect = upstream
+
+        response = self.app.post('/api/products/batch',
+                                 data=json.dumps({"barcodes": ['1234567890128', '9876543210982', '1111111111116',
+                                                               '2222222222222', '1234567890128']}),
+                                 content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        results = json.loads(response.data)['results']
+        self.assertEqual([(r['barcode'], r['status']) for r in results], [
+            ('1234567890128', 'found'),
+            ('9876543210982', 'created'),
+            ('1111111111116', 'not_found'),
+            ('2222222222222', 'unavailable'),
+        ])
+        self.assertEqual(results[1]['product']['name'], 'Pan Integral Mock')
+        self.assertEqual(mock_get_product.call_count, 3) # El producto local no se busca fuera
+        with app.app_context():
+            self.assertIsNotNone(Product.query.filter_by(barcode='9876543210982').first())
+
+    @patch('app.get_product_by_barcode')
+    def test_search_products_batch_keeps_others_on_conflict(self, mock_get_product):
+        mock_get_product.side_effect = lambda barcode: {'barcode': barcode, 'name': f'Mock {barcode}',
+                                                        'nutriscore': 'B', 'ecoscore': 'C', 'category': 'Snacks'}
+        real_insert = app_module.insert_new_products
+
+        def insert_after_concurrent_request(rows):
+            # Otra petición guarda uno de los códigos justo antes que el lote
+            with app.app_context():
+                db.session.add(Product(barcode='9876543210982', name='Insertado a la vez'))
+                db.session.commit()
+            return real_insert(rows)
+
+        with patch('app.insert_new_products', side_effect=insert_after_concurrent_request):
+            response = self.app.post('/api/products/batch',
+                                     data=json.dumps({"barcodes": ['9876543210982', '1234567890128']}),
+                                     content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        results = json.loads(response.data)['results']
+        self.assertEqual([(r['status'], r['product']['name']) for r in results],
+                         [('found', 'Insertado a la vez'), ('created', 'Mock 1234567890128')])
+        with app.app_context():
+            product = Product.query.filter_by(barcode='1234567890128').one()
+            self.assertEqual((product.gtin, product.eco_rank), (1234567890128, 3)) # Valores por defecto de las columnas
+
+    def test_search_products_batch_invalid_body(self):
+        response = self.app.post('/api/products/batch', data=json.dumps({"barcodes": []}),
+                                 content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+        too_many = [str(i).zfill(13) for i in range(app.config['PRODUCT_BATCH_MAX_SIZE'] + 1)]
+        response = self.app.post('/api/products/batch', data=json.dumps({"barcodes": too_many}),
+                                 content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_lookup_counts_are_persisted(self):
+        with app.app_context():
+            db.session.add(Product(barcode='1234567890128', name='Leche Test', nutriscore='B', ecoscore='A', category='Lacteos'))
+            db.session.commit()
+        product_popularity.flush() # Descarta contadores de otros tests
+
+        for _ in range(3):
+            self.app.get('/api/products/search?barcode=1234567890128')
+        product_popularity.flush()
+
+        with app.app_context():
+            self.assertEqual(db.session.get(ProductLookupCount, '1234567890128').lookups, 3)
+
+    def test_seed_barcodes_are_valid(self):
+        seed_barcodes = load_seed_barcodes(app.config['PRODUCT_CACHE_SEED_FILE'])
+        self.assertTrue(seed_barcodes)
+        self.assertEqual([b for b in seed_barcodes if canonical_barcode(b) is None], [])
+
+    @patch('app.get_product_by_barcode')
+    def test_warm_product_cache(self, mock_get_product):
+        mock_get_product.return_value = {'barcode': '5449000000996', 'name': 'Coca-Cola', 'nutriscore': 'E',
+                                         'ecoscore': 'C', 'category': 'Bebidas'}
+        with app.app_context():
+            db.session.add(Product(barcode='1234567890128', name='Leche Test', nutriscore='B', ecoscore='A', category='Lacteos'))
+            db.session.add(Product(barcode='3344556677888', name='Manzana', nutriscore='A', ecoscore='A', category='Frutas'))
+            db.session.add(ProductLookupCount(barcode='1234567890128', lookups=10))
+            db.session.add(ProductLookupCount(barcode='3344556677888', lookups=2))
+            db.session.commit()
+
+            status = warm_product_cache(top_n=1, seed_barcodes=['5449000000996'])
+
+        self.assertEqual(status['state'], 'done')
+        self.assertEqual(status['loaded'], 2)
+        self.assertEqual(product_cache.get('1234567890128')['name'], 'Leche Test')
+        self.assertEqual(product_cache.get('5449000000996')['name'], 'Coca-Cola')
+        self.assertIs(product_cache.get('3344556677888', record_stats=False), MISS) # Fuera del top-N
+
+    @patch('app.get_product_by_barcode')
+    def test_warm_product_cache_local_only(self, mock_get_product):
+        # Precarga antes del fork (run.py): sin llamadas a Open Food Facts
+        with app.app_context():
+            db.session.add(Product(barcode='3344556677888', name='Manzana', nutriscore='A', ecoscore='A', category='Frutas'))
+            db.session.commit()
+            status = warm_product_cache(top_n=0, seed_barcodes=['3344556677888', '5449000000996'], fetch_missing=False)
+
+        mock_get_product.assert_not_called()
+        self.assertEqual(status['loaded'], 1)
+        self.assertEqual(product_cache.get('3344556677888')['name'], 'Manzana')
+        self.assertIs(product_cache.get('5449000000996', record_stats=False), MISS)
 
     def test_search_product_missing_barcode(self):
         response = self.app.get('/api/products/search') # Sin parámetro barcode
@@ -167,14 +375,14 @@ class FlaskAppTests(unittest.TestCase):
     def test_add_favorite_success(self, mock_get_product):
         # Simula un producto que se añade a favoritos (puede venir de OFF)
         mock_get_product.return_value = {
-            'barcode': '1122334455667',
+            'barcode': '1122334455666',
             'name': 'Agua Mineral',
             'nutriscore': 'A',
             'ecoscore': 'A',
             'category': 'Bebidas'
         }
         response = self.app.post(f'/api/users/{self.test_user_id}/favorites',
-                                 data=json.dumps({"barcode": "1122334455667"}),
+                                 data=json.dumps({"barcode": "1122334455666"}),
                                  content_type='application/json')
         self.assertEqual(response.status_code, 201) #
         self.assertIn(b"Producto a\xc3\xb1adido a favoritos.", response.data) #
@@ -182,17 +390,18 @@ class FlaskAppTests(unittest.TestCase):
         with app.app_context():
             user = User.query.get(self.test_user_id)
             self.assertEqual(len(user.favorites), 1)
-            self.assertEqual(user.favorites[0].barcode, '1122334455667')
+            self.assertEqual(user.favorites[0].barcode, '1122334455666')
 
     def test_add_favorite_product_already_favorited(self):
         with app.app_context():
-            product = Product(barcode='2233445566778', name='Yogur', nutriscore='B', ecoscore='B', category='Lacteos')
+            product = Product(barcode='2233445566772', name='Yogur', nutriscore='B', ecoscore='B', category='Lacteos')
             db.session.add(product)
-            self.test_user.favorites.append(product)
+            user = db.session.get(User, self.test_user_id)
+            user.favorites.append(product)
             db.session.commit()
 
         response = self.app.post(f'/api/users/{self.test_user_id}/favorites',
-                                 data=json.dumps({"barcode": "2233445566778"}),
+                                 data=json.dumps({"barcode": "2233445566772"}),
                                  content_type='application/json')
         self.assertEqual(response.status_code, 200) #
         self.assertIn(b"El producto ya est\xc3\xa1 en favoritos.", response.data) #
@@ -201,25 +410,30 @@ class FlaskAppTests(unittest.TestCase):
     def test_add_favorite_product_not_found_off(self, mock_get_product):
         mock_get_product.return_value = None # OFF no encuentra el producto
         response = self.app.post(f'/api/users/{self.test_user_id}/favorites',
-                                 data=json.dumps({"barcode": "9999999999999"}),
+                                 data=json.dumps({"barcode": "9999999999994"}),
                                  content_type='application/json')
         self.assertEqual(response.status_code, 404) #
-        self.assertIn(b"Producto con c\xc3\xb3digo de barras '9999999999999' no encontrado en Open Food Facts.", response.data) #
+        self.assertIn(b"Producto con c\xc3\xb3digo de barras '9999999999994' no encontrado en Open Food Facts.", response.data) #
+        response = self.app.post(f'/api/users/{self.test_user_id}/favorites', json={"barcode": "111111111117"})
+        self.assertEqual(response.status_code, 404)
+        self.assertIn(b"Producto con c\xc3\xb3digo de barras '111111111117' no encontrado en Open Food Facts.", response.data)
+        mock_get_product.assert_called_with('0111111111117')
 
-    def test_add_favorite_user_not_found(self):
+    def test_add_favorite_other_user(self):
         response = self.app.post('/api/users/999/favorites',
-                                 data=json.dumps({"barcode": "1234567890123"}),
-                               _type='application/json')
-        self.assertEqual(response.status_code, 404) #
-        self.assertIn(b"Usuario no encontrado.", response.data) #
+                                 data=json.dumps({"barcode": "1234567890128"}),
+                                 content_type='application/json')
+        self.assertEqual(response.status_code, 403) #
+        self.assertIn(b"El token de sesi\xc3\xb3n no corresponde a este usuario.", response.data) #
 
     def test_get_favorites_success(self):
         # Añadir un producto a favoritos para el test_user
         with app.app_context():
-            product_fav = Product(barcode='3344556677889', name='Manzana', nutriscore='A', ecoscore='A', category='Frutas')
+            product_fav = Product(barcode='3344556677888', name='Manzana', nutriscore='A', ecoscore='A', category='Frutas')
             db.session.add(product_fav)
             db.session.commit()
-            self.test_user.favorites.append(product_fav)
+            user = db.session.get(User, self.test_user_id)
+            user.favorites.append(product_fav)
             db.session.commit()
 
         response = self.app.get(f'/api/users/{self.test_user_id}/favorites')
@@ -228,27 +442,90 @@ class FlaskAppTests(unittest.TestCase):
         self.assertEqual(len(data), 1)
         self.assertEqual(data[0]['name'], 'Manzana') #
 
+    def test_get_favorites_keyset_pagination(self):
+        with app.app_context():
+            products = [Product(barcode=f'100000000000{i}', name=f'Producto {i}', category='Snacks') for i in range(5)]
+            db.session.add_all(products)
+            db.session.commit()
+            db.session.execute(user_favorites.insert(), [{"user_id": self.test_user_id, "product_id": p.id} for p in products])
+            db.session.commit()
+
+        response = self.app.get(f'/api/users/{self.test_user_id}/favorites?limit=2')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['X-Total-Count'], '5')
+        names = [p['name'] for p in json.loads(response.data)]
+        self.assertEqual(names, ['Producto 0', 'Producto 1'])
+
+        seen = list(names)
+        while 'X-Next-After' in response.headers:
+            response = self.app.get(f"/api/users/{self.test_user_id}/favorites?limit=2&after={response.headers['X-Next-After']}")
+            seen.extend(p['name'] for p in json.loads(response.data))
+        self.assertEqual(seen, [f'Producto {i}' for i in range(5)])
+
+        response = self.app.get(f'/api/users/{self.test_user_id}/favorites?limit=0')
+        self.assertEqual(response.status_code, 400)
+
     def test_get_favorites_no_favorites(self):
         response = self.app.get(f'/api/users/{self.test_user_id}/favorites')
         self.assertEqual(response.status_code, 200) #
         data = json.loads(response.data)
         self.assertEqual(len(data), 0)
 
-    def test_get_favorites_user_not_found(self):
+    def test_get_favorites_other_user(self):
         response = self.app.get('/api/users/999/favorites')
-        self.assertEqual(response.status_code, 404) #
-        self.assertIn(b"Usuario no encontrado.", response.data) #
+        self.assertEqual(response.status_code, 403) #
+
+    def _login_token(self):
+        response = self.app.post('/api/users/login',
+                                 data=json.dumps({"username": "testuser", "password": "testpassword"}),
+                                 content_type='application/json')
+        return json.loads(response.data)['token']
+
+    def test_favorites_with_session_token_skip_user_lookup(self):
+        token = self._login_token()
+        # Se borra el usuario: con un token válido la ruta no vuelve a consultarlo
+        with app.app_context():
+            db.session.execute(User.__table__.delete().where(User.id == self.test_user_id))
+            db.session.commit()
+
+        response = self.app.get(f'/api/users/{self.test_user_id}/favorites',
+                                headers={"Authorization": f"Bearer {token}"})
+        self.assertEqual(response.status_code, 200)
+
+    def test_user_routes_require_session_token(self):
+        client = app.test_client() # Sin la cabecera Authorization
+        user_url = f'/api/users/{self.test_user_id}'
+        for response in (client.get(f'{user_url}/favorites'),
+                         client.post(f'{user_url}/favorites', json={"barcode": "1234567890128"}),
+                         client.delete(f'{user_url}/favorites/1234567890128'),
+                         client.get(f'{user_url}/footprint'),
+                         client.get(f'{user_url}/favorites', headers={"Authorization": "Basic dGVzdHVzZXI6eA=="})):
+            self.assertEqual(response.status_code, 401)
+            self.assertIn(b"Se requiere un token de sesi\xc3\xb3n", response.data)
+
+    def test_favorites_with_invalid_or_foreign_token(self):
+        token = self._login_token()
+        response = self.app.get(f'/api/users/{self.test_user_id}/favorites',
+                                headers={"Authorization": f"Bearer {token}x"})
+        self.assertEqual(response.status_code, 401)
+        response = self.app.get(f'/api/users/{self.test_user_id}/favorites',
+                                headers={"Authorization": "Bearer 1.999.\xe9abc"})
+        self.assertEqual(response.status_code, 401)
+        response = self.app.get(f'/api/users/{self.test_user_id + 1}/favorites',
+                                headers={"Authorization": f"Bearer {token}"})
+        self.assertEqual(response.status_code, 403)
 
     def test_remove_favorite_success(self):
         # Añadir un producto a favoritos para luego eliminarlo
         with app.app_context():
-            product_to_remove = Product(barcode='4455667788990', name='Cereal', nutriscore='C', ecoscore='C', category='Desayuno')
+            product_to_remove = Product(barcode='4455667788994', name='Cereal', nutriscore='C', ecoscore='C', category='Desayuno')
             db.session.add(product_to_remove)
             db.session.commit()
-            self.test_user.favorites.append(product_to_remove)
+            user = db.session.get(User, self.test_user_id)
+            user.favorites.append(product_to_remove)
             db.session.commit()
 
-        response = self.app.delete(f'/api/users/{self.test_user_id}/favorites/4455667788990')
+        response = self.app.delete(f'/api/users/{self.test_user_id}/favorites/4455667788994')
         self.assertEqual(response.status_code, 200) #
         self.assertIn(b"Producto eliminado de favoritos.", response.data) #
 
@@ -259,18 +536,73 @@ class FlaskAppTests(unittest.TestCase):
     def test_remove_favorite_product_not_in_favorites(self):
         # Intenta eliminar un producto que el usuario no tiene como favorito
         with app.app_context():
-            product_not_fav = Product(barcode='5566778899001', name='Galletas', nutriscore='D', ecoscore='B', category='Snacks')
+            product_not_fav = Product(barcode='5566778899000', name='Galletas', nutriscore='D', ecoscore='B', category='Snacks')
             db.session.add(product_not_fav)
             db.session.commit()
 
-        response = self.app.delete(f'/api/users/{self.test_user_id}/favorites/5566778899001')
+        response = self.app.delete(f'/api/users/{self.test_user_id}/favorites/5566778899000')
         self.assertEqual(response.status_code, 404) #
         self.assertIn(b"El producto no est\xc3\xa1 en favoritos de este usuario.", response.data) #
 
-    def test_remove_favorite_user_not_found(self):
-        response = self.app.delete('/api/users/999/favorites/1234567890123')
-        self.assertEqual(response.status_code, 404) #
-        self.assertIn(b"Usuario no encontrado.", response.data) #
+    def test_remove_favorite_other_user(self):
+        response = self.app.delete('/api/users/999/favorites/1234567890128')
+        self.assertEqual(response.status_code, 403) #
+
+    # --- TESTS DE LA HUELLA DE CARBONO DE LOS FAVORITOS ---
+
+    def _add_local_products(self):
+        with app.app_context():
+            db.session.add_all([
+                Product(barcode='8410000000016', name='Leche', ecoscore='a', category='Lácteos'),
+                Product(barcode='3017620425035', name='Nutella', ecoscore='e', category='Snacks'),
+                Product(barcode='8410000000023', name='Sin nota', category='Otra cosa'),
+            ])
+            db.session.commit()
+
+    def test_footprint_follows_favorites(self):
+        self._add_local_products()
+        response = self.app.get(f'/api/users/{self.test_user_id}/footprint')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.data)['favorites'], 0)
+
+        for barcode in ('8410000000016', '3017620425035', '8410000000023'):
+            self.assertEqual(self.app.post(f'/api/users/{self.test_user_id}/favorites',
+                                           data=json.dumps({"barcode": barcode}),
+                                           content_type='application/json').status_code, 201)
+        data = json.loads(self.app.get(f'/api/users/{self.test_user_id}/footprint').data)
+        # Lácteos 3.2 x 0.6 (A) + Snacks 3.5 x 1.4 (E) + factor por defecto 2.5 (sin nota)
+        self.assertEqual((data['favorites'], data['kg_co2e']), (3, 9.32))
+        self.assertEqual([(c['category'], c['kg_co2e']) for c in data['categories']],
+                         [('Snacks', 4.9), ('Otra cosa', 2.5), ('Lácteos', 1.92)])
+
+        self.assertEqual(self.app.delete(f'/api/users/{self.test_user_id}/favorites/3017620425035').status_code, 200)
+        response = self.app.get(f'/api/users/{self.test_user_id}/footprint')
+        data = json.loads(response.data)
+        self.assertEqual((data['favorites'], data['kg_co2e']), (2, 4.42))
+        self.assertEqual(self.app.get(f'/api/users/{self.test_user_id}/footprint',
+                                      headers={'If-None-Match': response.headers['ETag']}).status_code, 304)
+
+    def test_footprint_follows_product_changes(self):
+        self._add_local_products()
+        self.app.post(f'/api/users/{self.test_user_id}/favorites', data=json.dumps({"barcode": "8410000000016"}),
+                      content_type='application/json')
+        with app.app_context():
+            product = Product.query.filter_by(barcode='8410000000016').first()
+            product.ecoscore, product.category = 'c', 'Quesos'
+            db.session.commit()
+            counts = db.session.execute(select(UserFootprintCount.category, UserFootprintCount.eco_rank,
+                                               UserFootprintCount.favorites)
+                                        .where(UserFootprintCount.user_id == self.test_user_id)).all()
+            self.assertEqual(sorted(counts), [('Lácteos', 1, 0), ('Quesos', 3, 1)])
+            # Lo mismo que si se recalculan desde los favoritos
+            rebuild_footprint_counts(db.session.connection())
+            self.assertEqual(db.session.execute(select(UserFootprintCount.favorites)
+                                                .where(UserFootprintCount.category == 'Quesos')).scalar(), 1)
+        data = json.loads(self.app.get(f'/api/users/{self.test_user_id}/footprint').data)
+        self.assertEqual(data['kg_co2e'], 23.9)
+
+    def test_footprint_other_user(self):
+        self.assertEqual(self.app.get('/api/users/999/footprint').status_code, 403)
 
     # --- TESTS DE CONSULTA DE EMISIONES ---
 
@@ -282,6 +614,84 @@ class FlaskAppTests(unittest.TestCase):
         self.assertEqual(data['year'], 2021) #
         self.assertAlmostEqual(data['total_co2_tonnes'], 14828603.0) #
 
+    def test_get_emissions_served_from_memory_index(self):
+        self.app.get('/api/emissions?year=2021&region=C.A.%20de%20Euskadi') # Construye el índice
+        with app.app_context(), patch.object(RegionalCo2Emission, 'query') as mock_query:
+            response = self.app.get('/api/emissions?year=2022&region=C.A.%20de%20Euskadi')
+            mock_query.filter_by.assert_not_called()
+        self.assertEqual(response.status_code, 200)
+        self.assertAlmostEqual(json.loads(response.data)['total_co2_tonnes'], 16006313.0)
+
+    def test_get_emissions_index_refreshed_after_commit(self):
+        self.app.get('/api/emissions?year=2021&region=C.A.%20de%20Euskadi')
+        with app.app_context():
+            db.session.add(RegionalCo2Emission(region_name='Cataluña', year=2020, total_co2_tonnes=25000000.0))
+            db.session.commit()
+
+        response = self.app.get('/api/emissions?year=2020&region=Catalu%C3%B1a')
+        self.assertEqual(response.status_code, 200)
+        self.assertAlmostEqual(json.loads(response.data)['total_co2_tonnes'], 25000000.0)
+
+    def test_get_emissions_index_sees_changes_from_other_processes(self):
+        with patch.object(emissions_store, 'check_interval', 0):
+            self.app.get('/api/emissions?year=2021&region=C.A.%20de%20Euskadi') # Construye el índice
+            with app.app_context():
+                # SQL directo, como load_emissions_data.py desde otro proceso: no pasa por los eventos del ORM
+                db.session.execute(UPSERT_EMISSION_SQL, {"region_name": 'C.A. de Euskadi', "year": 2021,
+                                                         "total_co2_tonnes": 1.0})
+                db.session.commit()
+            response = self.app.get('/api/emissions?year=2021&region=C.A.%20de%20Euskadi')
+        self.assertEqual(json.loads(response.data)['total_co2_tonnes'], 1.0)
+        self.assertEqual(response.headers['Cache-Control'], app.config['CACHE_CONTROL_EMISSIONS'])
+
+    def test_get_emissions_series(self):
+        with app.app_context():
+            db.session.add(RegionalCo2Emission(region_name='C.A. de Euskadi', year=2020, total_co2_tonnes=13659995.0))
+            db.session.add(RegionalCo2Emission(region_name='C.A. de Euskadi', year=1990, total_co2_tonnes=13069575.0))
+            db.session.commit()
+
+        response = self.app.get('/api/emissions/series?region=C.A.%20de%20Euskadi&from=2020&to=2022'
+                                '&aggregates=yoy,rolling,cumulative,base&window=2')
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertEqual([p['year'] for p in data['points']], [2020, 2021, 2022])
+        self.assertIsNone(data['points'][0]['yoy_delta'])
+        self.assertAlmostEqual(data['points'][1]['yoy_delta'], 14828603.0 - 13659995.0)
+        self.assertIsNone(data['points'][0]['rolling_mean'])
+        self.assertAlmostEqual(data['points'][2]['rolling_mean'], (14828603.0 + 16006313.0) / 2)
+        self.assertAlmostEqual(data['points'][2]['cumulative_tonnes'], 13659995.0 + 14828603.0 + 16006313.0)
+        self.assertAlmostEqual(data['points'][0]['change_vs_base_pct'], (13659995.0 - 13069575.0) / 13069575.0 * 100)
+        self.assertEqual(data['summary']['peak_year'], 2022)
+        self.assertEqual(data['summary']['min']['year'], 2020)
+
+    def test_get_emissions_series_errors(self):
+        response = self.app.get('/api/emissions/series')
+        self.assertEqual(response.status_code, 400)
+        response = self.app.get('/api/emissions/series?region=C.A.%20de%20Euskadi&aggregates=median')
+        self.assertEqual(response.status_code, 400)
+        response = self.app.get('/api/emissions/series?region=C.A.%20de%20Euskadi&from=abc')
+        self.assertEqual(response.status_code, 400)
+        response = self.app.get('/api/emissions/series?region=C.A.%20de%20Euskadi&from=1950&to=1960')
+        self.assertEqual(response.status_code, 404)
+        # Un año base sin datos es un 400 aunque el ETag coincida
+        etag = self.app.get('/api/emissions/series?region=C.A.%20de%20Euskadi').headers['ETag']
+        response = self.app.get('/api/emissions/series?region=C.A.%20de%20Euskadi&aggregates=base&base_year=1800',
+                                headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 400)
+
+    def test_get_emissions_series_with_zero_tonnes(self):
+        with app.app_context():
+            db.session.add(RegionalCo2Emission(region_name='C.A. de Euskadi', year=2020, total_co2_tonnes=0.0))
+            db.session.commit()
+
+        response = self.app.get('/api/emissions/series?region=C.A.%20de%20Euskadi'
+                                '&aggregates=yoy,base&base_year=2020')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(b'Infinity', response.data) # JSON válido
+        points = json.loads(response.data)['points']
+        self.assertIsNone(points[1]['yoy_delta_pct']) # Frente a un año con 0 toneladas
+        self.assertEqual([p['change_vs_base_pct'] for p in points], [None, None, None])
+
     def test_get_emissions_not_found(self):
         response = self.app.get('/api/emissions?year=1900&region=Region%20Inexistente')
         self.assertEqual(response.status_code, 404) #
@@ -301,5 +711,316 @@ class FlaskAppTests(unittest.TestCase):
         self.assertEqual(response.status_code, 400) #
         self.assertIn(b"El par\xc3\xa1metro 'year' debe ser un n\xc3\xba", response.data) # (El mensaje completo sería '...número entero válido.')
 
+    # --- TESTS DE LA NORMALIZACIÓN DE CÓDIGOS DE BARRAS ---
+
+    @patch('app.get_product_by_barcode')
+    def test_upc_and_ean_share_one_product(self, mock_get_product):
+        mock_get_product.return_value = {'barcode': '737628064502', 'name': 'Coca-Cola Light', 'nutriscore': 'E',
+                                         'ecoscore': 'C', 'category': 'Bebidas'}
+        response = self.app.get('/api/products/search?barcode=737628064502')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(json.loads(response.data)['barcode'], '0737628064502')
+        product_cache.clear()
+        for barcode in ('0737628064502', '00737628064502'):
+            response = self.app.get(f'/api/products/search?barcode={barcode}')
+            self.assertEqual(response.status_code, 200)
+        mock_get_product.assert_called_once_with('0737628064502')
+        with app.app_context():
+            product = Product.query.filter_by(gtin=737628064502).one()
+            self.assertEqual(product.barcode, '0737628064502')
+
+        # En favoritos también se aceptan todas las formas del código
+        response = self.app.post(f'/api/users/{self.test_user_id}/favorites', json={'barcode': '737628064502'})
+        self.assertEqual(response.status_code, 201)
+        response = self.app.delete(f'/api/users/{self.test_user_id}/favorites/00737628064502')
+        self.assertEqual(response.status_code, 200)
+
+    @patch('app.get_product_by_barcode')
+    def test_invalid_check_digit_is_rejected(self, mock_get_product):
+        response = self.app.get('/api/products/search?barcode=5449000000997')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('5449000000997', json.loads(response.data)['error'])
+        response = self.app.post(f'/api/users/{self.test_user_id}/favorites', json={'barcode': '5449000000997'})
+        self.assertEqual(response.status_code, 400)
+        response = self.app.delete(f'/api/users/{self.test_user_id}/favorites/abc')
+        self.assertEqual(response.status_code, 400)
+        response = self.app.post('/api/products/batch', json={'barcodes': ['5449000000997']})
+        self.assertEqual(json.loads(response.data)['results'][0]['status'], 'invalid')
+        mock_get_product.assert_not_called()
+
+    # --- TESTS DE LA BÚSQUEDA POR TEXTO ---
+
+    def _add_products(self, *rows):
+        with app.app_context():
+            db.session.add_all(Product(barcode=b, name=n, category=c) for b, n, c in rows)
+            db.session.commit()
+
+    def test_query_products_ranking_prefix_and_pages(self):
+        self._add_products(('8410000000108', 'Leche entera', 'Lácteos'),
+                           ('8410000000115', 'Galletas', 'Desayunos con leche'),
+                           ('8410000000122', 'Leche semidesnatada', 'Lácteos'),
+                           ('8410000000139', 'Nutella', 'Cremas de cacao'))
+
+        response = self.app.get('/api/products/query?q=lech')
+        self.assertEqual(response.status_code, 200)
+        names = [p['name'] for p in json.loads(response.data)]
+        self.assertEqual(len(names), 3)
+        self.assertEqual(names[-1], 'Galletas') # Coincide solo en la categoría
+        self.assertEqual([p['name'] for p in json.loads(self.app.get('/api/products/query?q=NUTEL').data)], ['Nutella'])
+
+        response = self.app.get('/api/products/query?q=leche&limit=2')
+        self.assertEqual(len(json.loads(response.data)), 2)
+        self.assertEqual(response.headers['X-Next-Offset'], '2')
+        response = self.app.get('/api/products/query?q=leche&limit=2&offset=2')
+        self.assertEqual(len(json.loads(response.data)), 1)
+        self.assertNotIn('X-Next-Offset', response.headers)
+
+    def test_query_products_follows_inserts_and_updates(self):
+        with patch('app.get_product_by_barcode') as mock_get_product:
+            mock_get_product.return_value = {'barcode': '8410000000146', 'name': 'Bebida de avena', 'nutriscore': 'B',
+                                             'ecoscore': 'A', 'category': 'Bebidas vegetales'}
+            self.app.get('/api/products/search?barcode=8410000000146')
+        self.assertEqual(len(json.loads(self.app.get('/api/products/query?q=avena').data)), 1)
+
+        with app.app_context():
+            product = Product.query.filter_by(barcode='8410000000146').first()
+            product.name = 'Bebida de soja'
+            db.session.commit()
+        self.assertEqual(json.loads(self.app.get('/api/products/query?q=avena').data), [])
+        self.assertEqual(len(json.loads(self.app.get('/api/products/query?q=soja vegetal').data)), 1)
+
+    def test_query_products_invalid_params(self):
+        self.assertEqual(self.app.get('/api/products/query').status_code, 400)
+        self.assertEqual(self.app.get('/api/products/query?q=%20').status_code, 400)
+        self.assertEqual(self.app.get('/api/products/query?q=leche&limit=0').status_code, 400)
+        self.assertEqual(self.app.get('/api/products/query?q=leche&offset=-1').status_code, 400)
+        self.assertEqual(self.app.get('/api/products/query?q=leche&limit=abc').status_code, 400)
+        # Solo signos: ninguna palabra que buscar
+        response = self.app.get('/api/products/query?q=%22*')
+        self.assertEqual((response.status_code, json.loads(response.data)), (200, []))
+
+    # --- TESTS DE LAS ALTERNATIVAS MÁS SOSTENIBLES ---
+
+    def test_product_alternatives(self):
+        with app.app_context():
+            db.session.add_all([
+                Product(barcode='8410000000207', name='Leche escaneada', ecoscore='C', nutriscore='B', category='Lacteos'),
+                Product(barcode='8410000000214', name='Leche ecológica', ecoscore='A', nutriscore='C', category='Lacteos'),
+                Product(barcode='8410000000221', name='Leche de pasto', ecoscore='A', nutriscore='A', category='Lacteos'),
+                Product(barcode='8410000000238', name='Leche igual', ecoscore='C', nutriscore='A', category='Lacteos'),
+                Product(barcode='8410000000245', name='Leche peor', ecoscore='D', nutriscore='A', category='Lacteos'),
+                Product(barcode='8410000000252', name='Leche sin nota', ecoscore='n/a', nutriscore='A', category='Lacteos'),
+                Product(barcode='8410000000269', name='Zumo', ecoscore='A', nutriscore='A', category='Bebidas'),
+            ])
+            db.session.commit()
+
+        response = self.app.get('/api/products/8410000000207/alternatives')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([p['name'] for p in json.loads(response.data)],
+                         ['Leche de pasto', 'Leche ecológica', 'Leche igual'])
+        response = self.app.get('/api/products/8410000000207/alternatives?limit=1')
+        self.assertEqual([p['name'] for p in json.loads(response.data)], ['Leche de pasto'])
+        # El mejor de su categoría no tiene alternativas
+        self.assertEqual(json.loads(self.app.get('/api/products/8410000000221/alternatives').data), [])
+
+        # Al mejorar la nota de un producto pasa a ser alternativa
+        with app.app_context():
+            product = Product.query.filter_by(barcode='8410000000245').first()
+            product.ecoscore = 'B'
+            db.session.commit()
+            self.assertEqual(product.eco_rank, 2)
+        response = self.app.get('/api/products/8410000000207/alternatives')
+        self.assertEqual([p['name'] for p in json.loads(response.data)][2], 'Leche peor')
+
+    @patch('app.get_product_by_barcode')
+    def test_product_alternatives_errors(self, mock_get_product):
+        mock_get_product.return_value = None
+        self.assertEqual(self.app.get('/api/products/0000000000000/alternatives').status_code, 404)
+        self.assertEqual(self.app.get('/api/products/0000000000000/alternatives?limit=0').status_code, 400)
+        self.assertEqual(self.app.get('/api/products/0000000000000/alternatives?limit=x').status_code, 400)
+        # El mensaje repite el código tal como llegó (UPC-A), no su forma EAN-13
+        response = self.app.get('/api/products/111111111117/alternatives')
+        self.assertEqual(response.status_code, 404)
+        self.assertIn(b"Producto con c\xc3\xb3digo de barras '111111111117' no encontrado.", response.data)
+
+    # --- TESTS DEL REFRESCO DE PRODUCTOS OBSOLETOS ---
+
+    @commits # El refresco escribe desde su propio hilo
+    @patch('app.get_product_by_barcode')
+    def test_stale_product_served_then_refreshed(self, mock_get_product):
+        mock_get_product.return_value = {'barcode': '8410000000016', 'name': 'Leche Nueva', 'nutriscore': 'A',
+                                         'ecoscore': 'A', 'category': 'Lacteos'}
+        with app.app_context():
+            db.session.add(Product(barcode='8410000000016', name='Leche Vieja', nutriscore='B', ecoscore='A',
+                                   category='Lacteos', fetched_at=utcnow() - timedelta(days=30)))
+            db.session.commit()
+
+        # El dato obsoleto se sirve al momento y el refresco queda en segundo plano
+        response = self.app.get('/api/products/search?barcode=8410000000016')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.data)['name'], 'Leche Vieja')
+        product_refresher.join()
+        mock_get_product.assert_called_once_with('8410000000016')
+
+        response = self.app.get('/api/products/search?barcode=8410000000016')
+        data = json.loads(response.data)
+        self.assertEqual((data['name'], data['nutriscore'], data['version']), ('Leche Nueva', 'A', 2))
+        with app.app_context():
+            product = Product.query.filter_by(barcode='8410000000016').first()
+            self.assertGreater(product.fetched_at, utcnow() - timedelta(minutes=1))
+
+    def test_sweep_schedules_oldest_stale_products(self):
+        with app.app_context():
+            db.session.add_all([
+                Product(barcode='8410000000023', name='Reciente'),
+                Product(barcode='8410000000030', name='Antiguo', fetched_at=utcnow() - timedelta(days=10)),
+                Product(barcode='8410000000047', name='Muy antiguo', fetched_at=utcnow() - timedelta(days=90)),
+            ])
+            db.session.commit()
+            with patch.object(product_refresher, 'schedule', return_value=True) as mock_schedule:
+                self.assertEqual(sweep_stale_products(limit=1), 1)
+                mock_schedule.assert_called_once_with('8410000000047')
+
+    # --- TESTS DE LA INSTANTÁNEA DEL CATÁLOGO ---
+
+    def test_search_product_from_catalog_snapshot(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        with app.app_context():
+            an_hour_ago = utcnow() - timedelta(hours=1)
+            db.session.add_all([Product(barcode='5449000000996', name='Coca-Cola', nutriscore='e', ecoscore='d',
+                                        updated_at=an_hour_ago),
+                                Product(barcode='8410000000016', name='Leche', nutriscore='b', category='Lacteos',
+                                        updated_at=an_hour_ago)])
+            db.session.commit()
+            self.assertEqual(export_snapshot(db.session.connection(), os.path.join(directory, 'catalog.snap')), 2)
+            db.session.add(Product(barcode='8410000000023', name='Yogur')) # Posterior a la instantánea
+            db.session.commit()
+        catalog.path = os.path.join(directory, 'catalog.snap')
+        catalog.refresh()
+        self.addCleanup(catalog.refresh)
+        self.addCleanup(setattr, catalog, 'path', None)
+
+        # Los productos de la instantánea y del overlay se sirven sin consultar la tabla
+        before = catalog.stats()
+        for barcode, name in (('5449000000996', 'Coca-Cola'), ('8410000000023', 'Yogur')):
+            response = self.app.get(f'/api/products/search?barcode={barcode}')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(json.loads(response.data)['name'], name)
+        after = catalog.stats()
+        self.assertEqual((after['hits'] - before['hits'], after['overlay_hits'] - before['overlay_hits']), (1, 1))
+        self.assertEqual(after['overlay'], 1)
+        self.assertIs(product_cache.get('5449000000996', record_stats=False), MISS) # No se copia en la caché del proceso
+
+        # Un producto modificado en este proceso se lee ya de la base de datos
+        with app.app_context():
+            Product.query.filter_by(barcode='8410000000016').first().name = 'Leche Entera'
+            db.session.commit()
+        data = json.loads(self.app.get('/api/products/search?barcode=8410000000016').data)
+        self.assertEqual((data['name'], data['version']), ('Leche Entera', 2))
+
+    # --- TESTS DE MÉTRICAS ---
+
+    @patch('app.get_product_by_barcode')
+    def test_metrics_endpoint(self, mock_get_product):
+        mock_get_product.return_value = None
+        self.app.get('/api/products/search?barcode=0000000000000')
+        self.app.get('/api/emissions?year=2021&region=C.A.%20de%20Euskadi')
+
+        response = self.app.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain'))
+        text = response.get_data(as_text=True)
+        self.assertIn('http_request_duration_seconds_count{method="GET",route="/api/products/search",status="404"}', text)
+        self.assertIn('http_request_sql_queries_count{route="/api/emissions"}', text)
+        self.assertIn('sql_queries_total', text)
+        self.assertIn('product_cache_lookups_total{result="miss"}', text)
+        self.assertIn('http_requests_in_flight 1', text) # La propia petición a /metrics
+        self.assertNotIn('route="/metrics"', text)
+
+    # --- TESTS DE PETICIONES CONDICIONALES (ETag / 304) ---
+
+    def test_search_product_conditional_get(self):
+        with app.app_context():
+            db.session.add(Product(barcode='1234567890128', name='Leche Test', category='Lacteos'))
+            db.session.commit()
+
+        response = self.app.get('/api/products/search?barcode=1234567890128')
+        etag = response.headers['ETag']
+        self.assertEqual(response.headers['Cache-Control'], app.config['CACHE_CONTROL_PRODUCTS'])
+        response = self.app.get('/api/products/search?barcode=1234567890128', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b'')
+
+        # Al modificar la fila cambia su versión y, con ella, el ETag
+        with app.app_context():
+            product = Product.query.filter_by(barcode='1234567890128').first()
+            product.name = 'Leche Entera'
+            db.session.commit()
+            self.assertEqual(product.version, 2)
+        response = self.app.get('/api/products/search?barcode=1234567890128', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.data)['name'], 'Leche Entera')
+        self.assertNotEqual(response.headers['ETag'], etag)
+
+    def test_get_emissions_conditional_get(self):
+        url = '/api/emissions?year=2021&region=C.A.%20de%20Euskadi'
+        etag = self.app.get(url).headers['ETag']
+        response = self.app.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers['Cache-Control'], app.config['CACHE_CONTROL_EMISSIONS'])
+        series_url = '/api/emissions/series?region=C.A.%20de%20Euskadi'
+        self.assertEqual(self.app.get(series_url, headers={'If-None-Match': etag}).status_code, 304)
+
+        with app.app_context():
+            db.session.add(RegionalCo2Emission(region_name='C.A. de Euskadi', year=2020, total_co2_tonnes=13659995.0))
+            db.session.commit()
+        self.assertEqual(self.app.get(url, headers={'If-None-Match': etag}).status_code, 200)
+
+    def test_get_favorites_conditional_get(self):
+        with app.app_context():
+            product = Product(barcode='1112223334448', name='Manzana', category='Frutas')
+            db.session.add(product)
+            db.session.commit()
+            db.session.execute(user_favorites.insert().values(user_id=self.test_user_id, product_id=product.id))
+            db.session.commit()
+
+        url = f'/api/users/{self.test_user_id}/favorites'
+        response = self.app.get(url)
+        etag = response.headers['ETag']
+        self.assertEqual(response.headers['Cache-Control'], 'private, no-cache')
+        self.assertIn('Authorization', response.headers['Vary'])
+        self.assertEqual(self.app.get(url, headers={'If-None-Match': etag}).status_code, 304)
+
+        with app.app_context():
+            db.session.execute(user_favorites.delete())
+            db.session.commit()
+        response = self.app.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.data), [])
+
+
+# --- TESTS DE create_app ---
+class CreateAppTests(unittest.TestCase):
+
+    def test_config_rebuilds_components(self):
+        # patch.object devuelve después los componentes originales
+        with patch.dict(app.config), patch.object(app_module, 'product_cache'), \
+                patch.object(app_module, 'session_tokens'):
+            self.assertIs(app_module.create_app({'PRODUCT_CACHE_MAXSIZE': 1, 'SESSION_TOKEN_TTL': 60}), app)
+            self.assertEqual(app_module.product_cache.maxsize, 1)
+            self.assertEqual(app_module.session_tokens.ttl, 60)
+            self.assertIs(app_module.password_hasher, password_hasher) # Sus claves no cambian
+        self.assertIs(app_module.product_cache, product_cache)
+
+    def test_import_time_keys_are_rejected(self):
+        with patch.dict(app.config):
+            for key, value in [('SQLALCHEMY_DATABASE_URI', 'sqlite:///otra.db'), ('METRICS_ENABLED', False)]:
+                with self.assertRaises(ValueError):
+                    app_module.create_app({key: value, 'PRODUCT_CACHE_TTL': 1})
+            self.assertNotEqual(app.config['PRODUCT_CACHE_TTL'], 1) # No se aplica nada
+            # Con el mismo valor no hay nada que cambiar
+            app_module.create_app({'SQLALCHEMY_DATABASE_URI': app.config['SQLALCHEMY_DATABASE_URI']})
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
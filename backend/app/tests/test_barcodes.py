@@ -0,0 +1,33 @@
+import unittest
+from barcodes import barcode_from_key, canonical_barcode, check_digit, gtin_key
+
+
+# --- TESTS DE LA NORMALIZACIÓN DE CÓDIGOS DE BARRAS ---
+class BarcodeTests(unittest.TestCase):
+
+    def test_same_product_same_key(self):
+        # UPC-A, EAN-13 y GTIN-14 del mismo producto
+        for raw in ('737628064502', '0737628064502', '00737628064502', '0-737628-06450-2', ' 737628064502 '):
+            self.assertEqual(gtin_key(raw), 737628064502, raw)
+            self.assertEqual(canonical_barcode(raw), '0737628064502', raw)
+
+    def test_ean8(self):
+        self.assertEqual(canonical_barcode('50457250'), '50457250')
+        self.assertEqual(canonical_barcode('0000050457250'), '50457250')
+
+    def test_invalid_barcodes(self):
+        for raw in ('5449000000997', # Dígito de control incorrecto
+                    '123', '123456789012345', '54490000009a6', '٥٤٤٩٠٠٠٠٠٠٩٩٦',
+                    '10737628064509', # GTIN-14 de una agrupación
+                    '', None, 5449000000996):
+            self.assertIsNone(gtin_key(raw), raw)
+
+    def test_check_digit_and_round_trip(self):
+        self.assertEqual(check_digit('544900000099'), 6)
+        self.assertEqual(check_digit('73762806450'), 2)
+        self.assertEqual(barcode_from_key(5449000000996), '5449000000996')
+        self.assertEqual(barcode_from_key(737628064502), '0737628064502')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+from collections import Counter
+import requests
+from benchmarks.bench_api import compare_results, summarize
+from benchmarks.stub_off import StubOpenFoodFacts
+from openfoodfacts_api import OpenFoodFactsClient, OpenFoodFactsError
+
+
+# --- TESTS DEL OPEN FOOD FACTS SIMULADO ---
+class StubOpenFoodFactsTests(unittest.TestCase):
+
+    def test_client_against_stub(self):
+        with StubOpenFoodFacts() as stub:
+            client = OpenFoodFactsClient(base_url=stub.base_url, max_retries=0)
+            try:
+                product = client.get_product('3017620425035')
+            finally:
+                client.close()
+        self.assertEqual(product['barcode'], '3017620425035')
+        self.assertEqual(product['name'], 'Producto 3017620425035')
+        self.assertEqual(stub.requests, 1)
+
+    def test_error_and_not_found_rates(self):
+        with StubOpenFoodFacts(not_found_rate=1.0) as stub:
+            self.assertEqual(requests.get(f"{stub.base_url}123.json", timeout=5).status_code, 404)
+        with StubOpenFoodFacts(error_rate=1.0) as stub:
+            client = OpenFoodFactsClient(base_url=stub.base_url, max_retries=1, sleep=lambda s: None)
+            try:
+                with self.assertRaises(OpenFoodFactsError):
+                    client.get_product('123')
+            finally:
+                client.close()
+            self.assertEqual(stub.requests, 2) # Un reintento
+
+
+# --- TESTS DEL RESUMEN Y LA COMPARACIÓN DE RESULTADOS ---
+class BenchResultsTests(unittest.TestCase):
+
+    def test_summarize(self):
+        result = summarize([0.001 * n for n in range(1, 101)], 2.0, Counter({200: 98, 503: 2}))
+        self.assertEqual(result['requests'], 100)
+        self.assertEqual(result['throughput_rps'], 50.0)
+        self.assertAlmostEqual(result['p50_ms'], 50.5)
+        self.assertAlmostEqual(result['p99_ms'], 99.01)
+        self.assertEqual(result['statuses'], {"200": 98, "503": 2})
+        self.assertEqual(result['server_errors'], 2)
+
+    def test_compare_results_flags_regressions(self):
+        baseline = {"workloads": {"emissions": {"p50_ms": 1.0, "p95_ms": 2.0, "throughput_rps": 1000.0}}}
+        current = {"workloads": {
+            "emissions": {"p50_ms": 1.1, "p95_ms": 3.0, "throughput_rps": 700.0},
+            "nueva": {"p50_ms": 5.0, "p95_ms": 9.0, "throughput_rps": 10.0},
+        }}
+        regressions = compare_results(current, baseline, max_regression=0.2)
+        self.assertEqual(len(regressions), 2)
+        self.assertTrue(regressions[0].startswith('emissions: p95_ms'))
+        self.assertTrue(regressions[1].startswith('emissions: throughput_rps'))
+        self.assertEqual(compare_results(baseline, baseline), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
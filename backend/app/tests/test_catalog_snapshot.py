@@ -0,0 +1,123 @@
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+from sqlalchemy import create_engine, text
+from catalog_snapshot import CatalogSnapshot, CatalogStore, export_snapshot, write_snapshot
+
+MISS = object()
+CREATED_AT = datetime(2026, 1, 1, 12, 0, 0)
+ROWS = [
+    (50457250, 1, 1, '50457250', 'a', None, 'Galletas', None),
+    (737628064502, 2, 3, '0737628064502', 'e', 'c', 'Coca-Cola Light', 'Bebidas'),
+    (5449000000996, 3, 1, '5449000000996', 'e', 'd', 'Coca-Cola «Zero»', 'Refrescos y bebidas'),
+]
+
+
+# --- TESTS DEL ARCHIVO DE LA INSTANTÁNEA ---
+class CatalogSnapshotTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'catalog.snap')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_write_and_lookup(self):
+        self.assertEqual(write_snapshot(self.path, ROWS, max_id=3, created_at=CREATED_AT), 3)
+        snapshot = CatalogSnapshot(self.path)
+        self.assertEqual((len(snapshot), snapshot.max_id, snapshot.created_at), (3, 3, CREATED_AT))
+        self.assertEqual(snapshot.lookup(737628064502), {
+            "id": 2, "barcode": '0737628064502', "name": 'Coca-Cola Light', "nutriscore": 'e',
+            "ecoscore": 'c', "category": 'Bebidas', "version": 3})
+        self.assertEqual(snapshot.lookup(5449000000996)['name'], 'Coca-Cola «Zero»')
+        product = snapshot.lookup(50457250)
+        self.assertEqual((product['ecoscore'], product['category']), (None, None))
+        for missing in (1, 737628064501, 9999999999994):
+            self.assertIsNone(snapshot.lookup(missing))
+        # Solo quedan los archivos de la instantánea (sin temporales)
+        self.assertEqual(os.listdir(self.directory), ['catalog.snap'])
+
+    def test_rows_must_be_sorted(self):
+        with self.assertRaises(ValueError):
+            write_snapshot(self.path, list(reversed(ROWS)), max_id=3, created_at=CREATED_AT)
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_export_from_database(self):
+        engine = create_engine('sqlite://')
+        with engine.begin() as conn:
+            conn.execute(text('CREATE TABLE products (id INTEGER PRIMARY KEY, gtin BIGINT, version INTEGER, '
+                              'barcode TEXT, nutriscore TEXT, ecoscore TEXT, name TEXT, category TEXT)'))
+            conn.execute(text("INSERT INTO products VALUES (1, 5449000000996, 1, '5449000000996', 'e', 'd', 'Coca-Cola', NULL), "
+                              "(2, NULL, 1, '123', NULL, NULL, 'Sin clave', NULL)"))
+        with engine.connect() as conn:
+            self.assertEqual(export_snapshot(conn, self.path), 1)
+        engine.dispose()
+        snapshot = CatalogSnapshot(self.path)
+        self.assertEqual(snapshot.max_id, 2)
+        self.assertEqual(snapshot.lookup(5449000000996)['name'], 'Coca-Cola')
+
+
+# --- TESTS DE LA INSTANTÁNEA VIGENTE Y EL OVERLAY ---
+class CatalogStoreTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'catalog.snap')
+        self.now = 0.0
+        self.overlay = []
+        self.loader_calls = []
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def loader(self, max_id, since):
+        self.loader_calls.append((max_id, since))
+        return self.overlay
+
+    def store(self, path=None):
+        return CatalogStore(path or self.path, self.loader, check_interval=30, miss=MISS, clock=lambda: self.now)
+
+    def test_overlay_and_changed_products(self):
+        write_snapshot(self.path, ROWS, max_id=3, created_at=CREATED_AT)
+        self.overlay = [(737628064502, {"id": 2, "name": 'Coca-Cola Light 2.0'}),
+                        (8410000000016, {"id": 4, "name": 'Nuevo'})]
+        store = self.store()
+        self.assertEqual(store.lookup(737628064502)['name'], 'Coca-Cola Light 2.0')
+        self.assertEqual(store.lookup(8410000000016)['name'], 'Nuevo')
+        self.assertEqual(store.lookup(5449000000996)['id'], 3)
+        self.assertIs(store.lookup(9999999999994), MISS)
+        self.assertEqual(self.loader_calls[0][0], 3)
+        self.assertLess(self.loader_calls[0][1], CREATED_AT) # Con margen
+
+        # Un producto modificado en este proceso se lee de la BD hasta que lo recoja el overlay
+        store.mark_changed(5449000000996)
+        self.assertIs(store.lookup(5449000000996), MISS)
+        self.overlay.append((5449000000996, {"id": 3, "name": 'Coca-Cola Zero'}))
+        self.now += 31
+        self.assertEqual(store.lookup(5449000000996)['name'], 'Coca-Cola Zero')
+        self.assertEqual(len(self.loader_calls), 2)
+        self.assertEqual(store.stats()['overlay'], 3)
+
+    def test_snapshot_swapped_when_file_replaced(self):
+        write_snapshot(self.path, ROWS[:1], max_id=1, created_at=CREATED_AT)
+        store = self.store()
+        self.assertIs(store.lookup(737628064502), MISS)
+        write_snapshot(self.path, ROWS, max_id=3, created_at=CREATED_AT)
+        self.assertIs(store.lookup(737628064502), MISS) # Aún no toca comprobarlo
+        self.now += 31
+        self.assertEqual(store.lookup(737628064502)['id'], 2)
+        self.assertEqual(store.stats()['products'], 3)
+
+    def test_without_snapshot(self):
+        store = self.store(path=os.path.join(self.directory, 'no-existe.snap'))
+        store.mark_changed(5449000000996)
+        self.assertIs(store.lookup(5449000000996), MISS)
+        self.assertEqual(self.loader_calls, []) # Sin instantánea no hay overlay que cargar
+        self.assertIs(CatalogStore(None, self.loader, miss=MISS).lookup(5449000000996), MISS)
+
+
+if __name__ == '__main__':
+    unittest.main()
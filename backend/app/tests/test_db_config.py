@@ -0,0 +1,45 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from sqlalchemy import create_engine, text
+from db_config import database_uri, engine_options
+
+
+# --- TESTS DEL PERFIL DE BASE DE DATOS ---
+class DbConfigTests(unittest.TestCase):
+
+    def test_database_uri_from_environment(self):
+        with patch.dict(os.environ, {'DATABASE_URL': 'postgres://user:pw@db/ecotrack'}):
+            self.assertEqual(database_uri('/tmp/site.db'), 'postgresql://user:pw@db/ecotrack')
+        with patch.dict(os.environ, {}, clear=True):
+            self.assertEqual(database_uri('/tmp/site.db'), 'sqlite:////tmp/site.db')
+
+    def test_engine_options(self):
+        options = engine_options('sqlite:////tmp/site.db')
+        self.assertTrue(options['pool_pre_ping'])
+        self.assertIn('pool_size', options)
+        self.assertIn('cached_statements', options['connect_args'])
+        # En memoria no se puede fijar el tamaño del pool
+        self.assertNotIn('pool_size', engine_options('sqlite:///:memory:'))
+        self.assertNotIn('connect_args', engine_options('postgresql://db/ecotrack'))
+
+    def test_sqlite_pragmas_applied_on_connect(self):
+        fd, path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        uri = 'sqlite:///' + path
+        engine = create_engine(uri, **engine_options(uri))
+        try:
+            with engine.connect() as conn:
+                self.assertEqual(conn.execute(text('PRAGMA journal_mode')).scalar(), 'wal')
+                self.assertEqual(conn.execute(text('PRAGMA synchronous')).scalar(), 1) # NORMAL
+                self.assertEqual(conn.execute(text('PRAGMA busy_timeout')).scalar(), 5000)
+        finally:
+            engine.dispose()
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+from emissions_index import EmissionsIndex, EmissionsStore, compute_series
+
+ROWS = [
+    (2, 'C.A. de Euskadi', 2022, 16006313.0),
+    (1, 'C.A. de Euskadi', 2021, 14828603.0),
+    (3, 'Cataluña', 2020, 25000000.0),
+]
+
+
+# --- TESTS DEL ÍNDICE DE EMISIONES EN MEMORIA ---
+class EmissionsIndexTests(unittest.TestCase):
+
+    def test_lookup(self):
+        index = EmissionsIndex(ROWS)
+        self.assertEqual(index.lookup('C.A. de Euskadi', 2021),
+                         {"id": 1, "region_name": 'C.A. de Euskadi', "year": 2021, "total_co2_tonnes": 14828603.0})
+        self.assertEqual(len(index), 3)
+
+    def test_lookup_missing(self):
+        index = EmissionsIndex(ROWS)
+        self.assertIsNone(index.lookup('C.A. de Euskadi', 1990))
+        self.assertIsNone(index.lookup('C.A. de Euskadi', 2030))
+        self.assertIsNone(index.lookup('Region Inexistente', 2021))
+
+    def test_etag_depends_on_content(self):
+        self.assertEqual(EmissionsIndex(ROWS).etag, EmissionsIndex(list(reversed(ROWS))).etag)
+        changed = ROWS[:2] + [(3, 'Cataluña', 2020, 25000001.0)]
+        self.assertNotEqual(EmissionsIndex(ROWS).etag, EmissionsIndex(changed).etag)
+
+    def test_series_sorted_by_year(self):
+        _, years, tonnes = EmissionsIndex(ROWS).series('C.A. de Euskadi')
+        self.assertEqual(list(years), [2021, 2022])
+        self.assertEqual(list(tonnes), [14828603.0, 16006313.0])
+
+    def test_store_rebuilds_after_invalidate(self):
+        rows = list(ROWS)
+        store = EmissionsStore(lambda: rows)
+        first = store.get()
+        self.assertIs(store.get(), first)
+        rows.append((4, 'Cataluña', 2021, 24000000.0))
+        store.invalidate()
+        self.assertIsNotNone(store.get().lookup('Cataluña', 2021))
+
+    def test_store_revalidates_against_table_version(self):
+        rows, version, now = list(ROWS), [1], [0.0]
+        store = EmissionsStore(lambda: rows, lambda: version[0], check_interval=30, clock=lambda: now[0])
+        first = store.get()
+        rows.append((4, 'Cataluña', 2021, 24000000.0)) # Otro proceso cambia la tabla
+        version[0] = 2
+        now[0] = 29
+        self.assertIs(store.get(), first) # Aún no toca comprobar
+        now[0] = 30
+        self.assertIsNotNone(store.get().lookup('Cataluña', 2021))
+        second = store.get()
+        now[0] = 60
+        self.assertIs(store.get(), second) # Misma versión: no se reconstruye
+
+    def test_series_without_finite_values_uses_none(self):
+        columns, summary = compute_series([2020, 2021], [0.0, 5.0], ('yoy', 'base'), base_tonnes=0.0)
+        self.assertEqual(columns["yoy_delta_pct"], [None, None]) # 5 / 0 no es un número JSON
+        self.assertEqual(columns["change_vs_base_pct"], [None, None])
+        self.assertIsNone(summary["change_pct"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import os
+import shutil
+import tempfile
+import unittest
+from footprint import FootprintFactors, FootprintFactorsStore, load_category_factors, normalize_category
+from product_ranking import UNRANKED, grade_rank
+
+BUNDLED_FACTORS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'data',
+                               'category_emission_factors.csv')
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+# --- TESTS DE LOS FACTORES DE EMISIÓN POR CATEGORÍA ---
+class FootprintFactorsTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+
+    def _write(self, name, lines):
+        path = os.path.join(self.tmp_dir, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('category;kg_co2e_per_kg\n' + '\n'.join(lines) + '\n')
+        return path
+
+    def test_normalize_category(self):
+        self.assertEqual(normalize_category('  Lácteos '), 'lacteos')
+        self.assertEqual(normalize_category('en:Plant-based foods'), 'plant based foods')
+        self.assertEqual(normalize_category(None), '')
+
+    def test_later_files_override_earlier_ones(self):
+        base = self._write('base.csv', ['*;2', 'Quesos;20', 'Frutas;0.5', 'Roto;no es un número'])
+        local = self._write('local.csv', ['quesos;25'])
+        factors = load_category_factors([base, local])
+        self.assertEqual(factors.categories, ['frutas', 'quesos'])
+        self.assertEqual(factors.factor('Quesos'), 25.0)
+        self.assertEqual(factors.factor('Otra'), 2.0)
+
+    def test_default_factor_is_required(self):
+        with self.assertRaises(ValueError):
+            FootprintFactors({'quesos': 20.0})
+
+    def test_footprint_weights_grades_and_groups_by_category(self):
+        factors = FootprintFactors({'*': 2.0, 'quesos': 20.0})
+        footprint = factors.footprint([('Quesos', grade_rank('a'), 2), ('Quesos', grade_rank('e'), 1),
+                                       ('', UNRANKED, 1), ('Frutas', grade_rank('b'), 0)])
+        self.assertEqual(footprint['favorites'], 4)
+        self.assertEqual(footprint['kg_co2e'], 20 * 0.6 * 2 + 20 * 1.4 + 2.0)
+        self.assertEqual([(c['category'], c['favorites'], c['kg_co2e']) for c in footprint['categories']],
+                         [('Quesos', 3, 52.0), (None, 1, 2.0)])
+        self.assertEqual(factors.footprint([])['kg_co2e'], 0.0)
+
+    def test_bundled_file(self):
+        factors = load_category_factors([BUNDLED_FACTORS])
+        self.assertEqual(factors.factor('Lacteos'), factors.factor('Dairies'))
+        self.assertEqual(factors.factor('Categoría no disponible'), factors.factor('desconocida'))
+
+    def test_store_reloads_changed_files_and_keeps_last_good_table(self):
+        path = self._write('factores.csv', ['*;1'])
+        clock = FakeClock()
+        store = FootprintFactorsStore([path], check_interval=10, clock=clock)
+        first = store.get()
+        self.assertEqual(first.factor('x'), 1.0)
+
+        self._write('factores.csv', ['*;3', 'frutas;0.5'])
+        self.assertIs(store.get(), first) # Aún no toca comprobar
+        clock.now = 10
+        self.assertEqual(store.get().factor('x'), 3.0)
+
+        self._write('factores.csv', ['frutas;0.5']) # Sin factor por defecto: no se acepta
+        clock.now = 20
+        self.assertEqual(store.get().factor('x'), 3.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+from app_testing import AppTestCase
+from app import app, db, Product
+from product_ranking import UNRANKED
+from product_search import search_products
+from import_openfoodfacts import import_products
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+JSONL_FIXTURE = os.path.join(FIXTURES_DIR, 'off_products_sample.jsonl')
+CSV_FIXTURE = os.path.join(FIXTURES_DIR, 'off_products_sample.csv')
+
+
+# --- TESTS DEL IMPORTADOR DE VOLCADOS DE OPEN FOOD FACTS ---
+class ImportOpenFoodFactsTests(AppTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+
+    def _gzip_copy(self, path):
+        gz_path = os.path.join(self.tmp_dir, os.path.basename(path) + '.gz')
+        with open(path, 'rb') as src, gzip.open(gz_path, 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+        return gz_path
+
+    def test_import_gzipped_jsonl(self):
+        with app.app_context():
+            stats = import_products(self._gzip_copy(JSONL_FIXTURE), chunk_size=2)
+            self.assertEqual(stats['imported'], 4)
+            self.assertEqual(stats['skipped'], 1) # El registro sin código
+            product = Product.query.filter_by(barcode='3017620425035').first()
+            self.assertEqual(product.name, 'Nutella')
+            self.assertEqual(product.category, 'Desayunos')
+            self.assertEqual(Product.query.filter_by(barcode='6111242106949').first().ecoscore, 'n/a')
+            self.assertEqual(Product.query.filter_by(barcode='6111242106949').first().eco_rank, UNRANKED)
+            # Los productos importados quedan en el índice de búsqueda
+            self.assertEqual([p.barcode for p in search_products(db.session, 'nutella', 10, model=Product)],
+                             ['3017620425035'])
+
+    def test_import_csv_with_country_filter_and_upsert(self):
+        with app.app_context():
+            db.session.add(Product(barcode='5449000000996', name='Nombre antiguo', category='Otros'))
+            db.session.commit()
+
+            stats = import_products(CSV_FIXTURE, country='spain',
+                                    state_path=os.path.join(self.tmp_dir, 'state.json'))
+            self.assertEqual(stats['imported'], 3)
+            self.assertIsNone(Product.query.filter_by(barcode='6111242106949').first())
+            self.assertEqual(Product.query.filter_by(barcode='5449000000996').first().name, 'Coca-Cola')
+            self.assertEqual(Product.query.count(), 3)
+
+    def test_reimport_only_bumps_version_of_changed_rows(self):
+        with app.app_context():
+            import_products(JSONL_FIXTURE)
+            import_products(JSONL_FIXTURE)
+            self.assertEqual({p.version for p in Product.query.all()}, {1})
+
+            db.session.execute(Product.__table__.update()
+                               .where(Product.barcode == '3017620425035').values(name='Otro nombre'))
+            db.session.commit()
+            import_products(JSONL_FIXTURE)
+            db.session.expire_all()
+            self.assertEqual(Product.query.filter_by(barcode='3017620425035').first().version, 2)
+
+    def test_import_category_filter(self):
+        with app.app_context():
+            stats = import_products(JSONL_FIXTURE, category='en:beverages',
+                                    state_path=os.path.join(self.tmp_dir, 'state.json'))
+            self.assertEqual(stats['imported'], 1)
+
+    def test_resume_from_saved_offset(self):
+        state_path = os.path.join(self.tmp_dir, 'state.json')
+        with open(state_path, 'w') as f:
+            f.write('{"offset": 2}')
+        with app.app_context():
+            stats = import_products(JSONL_FIXTURE, resume=True, state_path=state_path)
+            self.assertEqual(stats['read'], 3)
+            self.assertIsNone(Product.query.filter_by(barcode='3017620425035').first())
+            self.assertIsNotNone(Product.query.filter_by(barcode='8715035110106').first())
+        self.assertFalse(os.path.exists(state_path)) # Al terminar se borra el estado
+
+
+if __name__ == '__main__':
+    unittest.main()
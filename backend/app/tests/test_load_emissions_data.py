@@ -0,0 +1,75 @@
+import os
+import shutil
+import tempfile
+import unittest
+from app_testing import AppTestCase
+from app import app, db, RegionalCo2Emission
+from load_emissions_data import load_emissions_from_csv
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+REGIONS_CSV = os.path.join(FIXTURES_DIR, 'emisiones_regiones_sample.csv')
+
+
+# --- TESTS DE LA CARGA DE EMISIONES ---
+class LoadEmissionsTests(AppTestCase):
+
+    def test_loads_every_region(self):
+        with app.app_context():
+            stats = load_emissions_from_csv(REGIONS_CSV, chunksize=2)
+            self.assertEqual(stats['rows'], 11) # Cataluña no tiene dato de 2022
+            self.assertEqual(stats['regions'], ['Andalucía', 'C.A. de Euskadi', 'Cataluña'])
+            emission = RegionalCo2Emission.query.filter_by(region_name='Cataluña', year=2020).first()
+            self.assertAlmostEqual(emission.total_co2_tonnes, 35000000.5)
+
+    def test_reload_updates_existing_rows(self):
+        with app.app_context():
+            RegionalCo2Emission.query.filter_by(region_name='C.A. de Euskadi', year=2021).one().total_co2_tonnes = 1.0
+            db.session.add(RegionalCo2Emission(region_name='C.A. de Euskadi', year=1990, total_co2_tonnes=13069575.0))
+            db.session.commit()
+
+            load_emissions_from_csv([REGIONS_CSV, REGIONS_CSV])
+            self.assertAlmostEqual(
+                RegionalCo2Emission.query.filter_by(region_name='C.A. de Euskadi', year=2021).first().total_co2_tonnes,
+                14828603.0)
+            # Los años que no vienen en el CSV se conservan
+            self.assertIsNotNone(RegionalCo2Emission.query.filter_by(region_name='C.A. de Euskadi', year=1990).first())
+            self.assertEqual(RegionalCo2Emission.query.count(), 12)
+
+    def test_index_is_rebuilt_after_load(self):
+        with app.app_context():
+            load_emissions_from_csv(REGIONS_CSV)
+        response = app.test_client().get('/api/emissions?year=2019&region=Andaluc%C3%ADa')
+        self.assertEqual(response.status_code, 200)
+
+    def test_missing_file(self):
+        with app.app_context():
+            self.assertIsNone(load_emissions_from_csv(os.path.join(FIXTURES_DIR, 'no_existe.csv')))
+
+    def test_loads_bundled_euskadi_csv(self):
+        csv_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'data', 'BIG-TAB.4.07.19_c.csv')
+        with app.app_context():
+            stats = load_emissions_from_csv(csv_path)
+            self.assertEqual(stats['rows'], 33)
+            self.assertAlmostEqual(
+                RegionalCo2Emission.query.filter_by(region_name='C.A. de Euskadi', year=1990).first().total_co2_tonnes,
+                13069575.0)
+
+
+    def test_placeholder_cells_do_not_drop_other_regions(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        csv_path = os.path.join(tmp_dir, 'marcadores.csv')
+        with open(csv_path, 'w', encoding='latin1') as f:
+            f.write(';;;\nTabla con marcadores.;;;\n;;;\n;2019;2020;2021\n'
+                    'Región A;14.500.000;13.659.995,5;-\n'
+                    'Región B;..;1.000;2.000\n')
+        with app.app_context():
+            stats = load_emissions_from_csv(csv_path)
+            self.assertEqual(stats['rows'], 4) # Solo faltan las celdas con marcador
+            values = {(e.region_name, e.year): e.total_co2_tonnes
+                      for e in RegionalCo2Emission.query.filter(RegionalCo2Emission.region_name.like('Región%'))}
+        self.assertEqual(values, {('Región A', 2019): 14500000.0, ('Región A', 2020): 13659995.5,
+                                  ('Región B', 2020): 1000.0, ('Región B', 2021): 2000.0})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from metrics import Counter, Gauge, Histogram, Registry, SharedMetrics
+
+
+# --- TESTS DE LAS MÉTRICAS EN FORMATO PROMETHEUS ---
+class MetricsTests(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = Registry()
+
+    def test_counter_and_gauge(self):
+        requests = Counter('app_requests_total', 'Peticiones.', ('route',), registry=self.registry)
+        requests.inc('/a')
+        requests.inc('/a', amount=2)
+        in_flight = Gauge('app_in_flight', 'En curso.', registry=self.registry)
+        in_flight.inc()
+        in_flight.inc()
+        in_flight.dec()
+        self.assertEqual(requests.value('/a'), 3)
+
+        text = self.registry.render()
+        self.assertIn('# TYPE app_requests_total counter\n', text)
+        self.assertIn('app_requests_total{route="/a"} 3\n', text)
+        self.assertIn('app_in_flight 1\n', text)
+
+    def test_histogram_buckets_are_cumulative(self):
+        latency = Histogram('app_latency_seconds', 'Latencia.', ('route',), buckets=(0.1, 1.0), registry=self.registry)
+        for value in (0.05, 0.5, 0.5, 3.0):
+            latency.observe(value, '/a')
+        self.assertEqual(latency.count('/a'), 4)
+
+        text = self.registry.render()
+        self.assertIn('app_latency_seconds_bucket{route="/a",le="0.1"} 1\n', text)
+        self.assertIn('app_latency_seconds_bucket{route="/a",le="1.0"} 3\n', text)
+        self.assertIn('app_latency_seconds_bucket{route="/a",le="+Inf"} 4\n', text)
+        self.assertIn('app_latency_seconds_sum{route="/a"} 4.05\n', text)
+        self.assertIn('app_latency_seconds_count{route="/a"} 4\n', text)
+
+    def test_label_escaping_and_collectors(self):
+        Counter('app_errors_total', 'Errores.', ('message',), registry=self.registry).inc('di "hola"\n')
+        self.registry.add_collector(lambda: [('app_cache_ratio', 'gauge', 'Aciertos.', [({"cache": "productos"}, 0.5)])])
+        text = self.registry.render()
+        self.assertIn('app_errors_total{message="di \\"hola\\"\\n"} 1\n', text)
+        self.assertIn('# TYPE app_cache_ratio gauge\napp_cache_ratio{cache="productos"} 0.5\n', text)
+
+    def test_wrong_number_of_labels(self):
+        counter = Counter('app_total', 'Total.', ('route',), registry=self.registry)
+        with self.assertRaises(ValueError):
+            counter.inc()
+
+
+# --- TESTS DE LAS MÉTRICAS SUMADAS ENTRE PROCESOS ---
+class SharedMetricsTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.registry = Registry()
+        self.requests = Counter('app_requests_total', 'Peticiones.', ('route',), registry=self.registry)
+        self.latency = Histogram('app_latency_seconds', 'Latencia.', buckets=(0.1,), registry=self.registry)
+        self.in_flight = Gauge('app_in_flight', 'En curso.', registry=self.registry)
+        self.shared = SharedMetrics(self.directory, self.registry, interval=60)
+
+    def write_other_process(self, pid, worker, requests):
+        # Lo que habría guardado otro hijo
+        families = [('app_requests_total', 'counter', 'Peticiones.', [({"route": "/a"}, requests)]),
+                    ('app_latency_seconds', 'histogram', 'Latencia.',
+                     [({}, {"buckets": [0.1], "counts": [1, 1], "sum": 0.55, "count": 2})]),
+                    ('app_in_flight', 'gauge', 'En curso.', [({"worker": worker}, 3)])]
+        with open(os.path.join(self.directory, f'{pid}.json'), 'w', encoding='utf-8') as f:
+            json.dump({"pid": pid, "families": families}, f)
+
+    def test_render_sums_all_processes(self):
+        self.write_other_process(os.getppid(), 1, 5)
+        self.shared.start(0)
+        self.addCleanup(self.shared.stop)
+        self.requests.inc('/a', amount=2)
+        self.latency.observe(0.05)
+        self.in_flight.inc()
+
+        text = self.shared.render()
+        self.assertIn('app_requests_total{route="/a"} 7\n', text)
+        self.assertIn('app_latency_seconds_bucket{le="0.1"} 2\n', text)
+        self.assertIn('app_latency_seconds_count 3\n', text)
+        # Los gauges no se suman: uno por hijo
+        self.assertIn('app_in_flight{worker="0"} 1\n', text)
+        self.assertIn('app_in_flight{worker="1"} 3\n', text)
+
+    @unittest.skipUnless(hasattr(os, 'fork'), "Requiere fork()")
+    def test_finished_processes_keep_counters_but_not_gauges(self):
+        pid = os.fork()
+        if pid == 0:
+            os._exit(0)
+        os.waitpid(pid, 0)
+        self.write_other_process(pid, 1, 5) # Cayó sin pararse
+        self.shared.start(0)
+        self.shared.stop()
+
+        text = self.shared.render()
+        self.assertIn('app_requests_total{route="/a"} 5\n', text)
+        self.assertNotIn('worker="1"', text)
+
+    @unittest.skipUnless(hasattr(os, 'fork'), "Requiere fork()")
+    def test_before_fork_counts_parent_once(self):
+        self.requests.inc('/a', amount=4)
+        self.shared.before_fork()
+        self.assertEqual(self.requests.value('/a'), 0) # Los hijos empiezan de cero
+        read_end, write_end = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            self.shared.start(0)
+            self.requests.inc('/a')
+            os.write(write_end, self.shared.render().encode())
+            os._exit(0)
+        os.close(write_end)
+        with os.fdopen(read_end) as child_output:
+            text = child_output.read()
+        os.waitpid(pid, 0)
+        self.assertIn('app_requests_total{route="/a"} 5\n', text)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+import unittest
+import requests
+from openfoodfacts_api import (OpenFoodFactsClient, CircuitBreaker, OpenFoodFactsError,
+                               CircuitOpenError)
+
+
+class FakeResponse:
+    def __init__(self, status_code, payload=None):
+        self.status_code = status_code
+        self._payload = payload
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"{self.status_code}")
+
+    def json(self):
+        return self._payload
+
+
+class FakeSession:
+    """Sesión simulada: devuelve (o lanza) las respuestas en orden."""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.calls = []
+
+    def get(self, url, timeout=None):
+        self.calls.append((url, timeout))
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+PRODUCT_PAYLOAD = {
+    'status': 1,
+    'product': {'code': '5449000000996', 'product_name': 'Coca-Cola', 'nutriscore_grade': 'e',
+                'ecoscore_grade': 'c', 'categories': 'Bebidas, Refrescos'}
+}
+
+
+# --- TESTS DEL CLIENTE DE OPEN FOOD FACTS ---
+class OpenFoodFactsClientTests(unittest.TestCase):
+
+    def make_client(self, responses, **kwargs):
+        self.session = FakeSession(responses)
+        self.sleeps = []
+        return OpenFoodFactsClient(session=self.session, sleep=self.sleeps.append,
+                                   connect_timeout=1, read_timeout=5, **kwargs)
+
+    def test_product_found(self):
+        client = self.make_client([FakeResponse(200, PRODUCT_PAYLOAD)])
+        product = client.get_product('5449000000996')
+        self.assertEqual(product['name'], 'Coca-Cola')
+        self.assertEqual(product['category'], 'Bebidas')
+        self.assertEqual(self.session.calls[0][1], (1, 5)) # Timeouts de conexión y lectura separados
+
+    def test_product_not_found(self):
+        client = self.make_client([FakeResponse(404, {'status': 0})])
+        self.assertIsNone(client.get_product('0000000000000'))
+
+    def test_retries_on_5xx_and_connection_errors(self):
+        client = self.make_client([FakeResponse(503), requests.exceptions.ConnectTimeout("sin conexión"),
+                                   FakeResponse(200, PRODUCT_PAYLOAD)], max_retries=2)
+        self.assertEqual(client.get_product('5449000000996')['name'], 'Coca-Cola')
+        self.assertEqual(len(self.session.calls), 3)
+        self.assertEqual(len(self.sleeps), 2)
+
+    def test_gives_up_after_retries(self):
+        client = self.make_client([FakeResponse(500)] * 3, max_retries=2)
+        with self.assertRaises(OpenFoodFactsError):
+            client.get_product('5449000000996')
+        self.assertEqual(len(self.session.calls), 3)
+
+    def test_read_timeout_is_not_retried(self):
+        client = self.make_client([requests.exceptions.ReadTimeout("lento"), FakeResponse(200, PRODUCT_PAYLOAD)],
+                                  max_retries=2)
+        with self.assertRaises(OpenFoodFactsError):
+            client.get_product('5449000000996')
+        self.assertEqual(len(self.session.calls), 1)
+
+    def test_total_timeout_bounds_retries(self):
+        now = [0.0]
+
+        class SlowSession(FakeSession):
+            def get(self, url, timeout=None):
+                now[0] += timeout[0] # Cada intento agota el timeout de conexión
+                return super().get(url, timeout)
+
+        self.session = SlowSession([requests.exceptions.ConnectTimeout("sin conexión")] * 5)
+        breaker = CircuitBreaker(failure_threshold=3)
+        client = OpenFoodFactsClient(session=self.session, sleep=lambda s: None, clock=lambda: now[0],
+                                     connect_timeout=1, read_timeout=5, total_timeout=2.5, max_retries=4,
+                                     backoff=0, breaker=breaker)
+        with self.assertRaises(OpenFoodFactsError):
+            client.get_product('5449000000996')
+        self.assertEqual([timeout for _, timeout in self.session.calls], [(1, 2.5), (1, 1.5), (0.5, 0.5)])
+        self.assertEqual(now[0], 2.5)
+        self.assertEqual(breaker.state, 'open') # Cuenta cada intento fallido, no cada consulta
+
+    def test_circuit_opens_and_fails_fast(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+        client = self.make_client([requests.exceptions.ConnectionError("caído")] * 2,
+                                  max_retries=0, breaker=breaker)
+        for _ in range(2):
+            with self.assertRaises(OpenFoodFactsError):
+                client.get_product('5449000000996')
+        self.assertEqual(breaker.state, 'open')
+        with self.assertRaises(CircuitOpenError):
+            client.get_product('5449000000996')
+        self.assertEqual(len(self.session.calls), 2) # No se llamó a Open Food Facts
+
+
+class CircuitBreakerTests(unittest.TestCase):
+
+    def test_half_open_probe(self):
+        now = [0.0]
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=lambda: now[0])
+        breaker.record_failure()
+        self.assertFalse(breaker.allow())
+        now[0] = 11
+        self.assertTrue(breaker.allow())   # Llamada de prueba
+        self.assertFalse(breaker.allow())  # Solo una a la vez
+        breaker.record_success()
+        self.assertEqual(breaker.state, 'closed')
+
+
+if __name__ == '__main__':
+    unittest.main()
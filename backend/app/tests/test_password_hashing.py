@@ -0,0 +1,35 @@
+import unittest
+from password_hashing import PasswordHasher, HasherBusyError, hash_rounds
+
+
+# --- TESTS DEL POOL DE BCRYPT ---
+class PasswordHasherTests(unittest.TestCase):
+
+    def test_hash_and_verify_in_process_pool(self):
+        hasher = PasswordHasher(rounds=4, workers=1)
+        try:
+            password_hash = hasher.hash('secreto')
+            self.assertEqual(hash_rounds(password_hash), 4)
+            self.assertTrue(hasher.verify('secreto', password_hash))
+            self.assertFalse(hasher.verify('otro', password_hash))
+        finally:
+            hasher.shutdown()
+
+    def test_needs_rehash(self):
+        old_hash = PasswordHasher(rounds=4, workers=0).hash('secreto')
+        self.assertFalse(PasswordHasher(rounds=4, workers=0).needs_rehash(old_hash))
+        self.assertTrue(PasswordHasher(rounds=5, workers=0).needs_rehash(old_hash))
+
+    def test_bounded_queue(self):
+        hasher = PasswordHasher(rounds=4, workers=1, max_pending=1, queue_timeout=0.01)
+        hasher._slots.acquire() # Simula una operación en curso que ocupa la única plaza
+        try:
+            with self.assertRaises(HasherBusyError):
+                hasher.hash('secreto')
+        finally:
+            hasher._slots.release()
+            hasher.shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main()
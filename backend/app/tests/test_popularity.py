@@ -0,0 +1,27 @@
+import unittest
+from popularity import PopularityTracker
+
+
+# --- TESTS DEL CONTADOR DE POPULARIDAD ---
+class PopularityTrackerTests(unittest.TestCase):
+
+    def test_flushes_every_n_lookups(self):
+        flushed = []
+        tracker = PopularityTracker(on_flush=flushed.append, flush_every=3)
+        tracker.record('a')
+        tracker.record('b')
+        self.assertEqual(flushed, [])
+        tracker.record('a')
+        self.assertEqual(flushed, [{'a': 2, 'b': 1}])
+        self.assertEqual(tracker.pending(), {})
+
+    def test_flush_errors_do_not_propagate(self):
+        def failing(counts):
+            raise RuntimeError("BD no disponible")
+        tracker = PopularityTracker(on_flush=failing, flush_every=100)
+        tracker.record('a')
+        self.assertEqual(tracker.flush(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
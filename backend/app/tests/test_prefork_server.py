@@ -0,0 +1,161 @@
+import http.client
+import os
+import shutil
+import signal
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+import app as app_module
+from metrics import Counter, Registry, SharedMetrics
+from prefork_server import PooledWSGIServer, PreforkServer, listen
+
+
+def slow_app(environ, start_response):
+    time.sleep(float(environ.get('QUERY_STRING') or 0))
+    body = str(os.getpid()).encode()
+    start_response('200 OK', [('Content-Type', 'text/plain'), ('Content-Length', str(len(body)))])
+    return [body]
+
+
+def get(port, query=''):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    try:
+        conn.request('GET', f'/?{query}')
+        response = conn.getresponse()
+        return response.status, response.read().decode()
+    finally:
+        conn.close()
+
+
+# --- TESTS DEL SERVIDOR CON POOL DE HILOS ---
+class PooledWSGIServerTests(unittest.TestCase):
+
+    def test_stop_finishes_requests_in_flight(self):
+        server = PooledWSGIServer('127.0.0.1', 0, slow_app, threads=2)
+        serving = threading.Thread(target=server.serve_forever)
+        serving.start()
+        with ThreadPoolExecutor(max_workers=3) as clients:
+            responses = [clients.submit(get, server.port, '0.3') for _ in range(3)]
+            time.sleep(0.1)
+            server.stop()
+            serving.join(timeout=5)
+            self.assertFalse(serving.is_alive())
+            self.assertEqual([r.result()[0] for r in responses], [200, 200, 200])
+        with self.assertRaises(OSError):
+            get(server.port)
+
+
+# --- TESTS DEL PROCESO PRINCIPAL ---
+@unittest.skipUnless(hasattr(os, 'fork'), "Requiere fork()")
+class PreforkServerTests(unittest.TestCase):
+
+    def test_workers_share_socket_and_stop(self):
+        sock = listen('127.0.0.1', 0)
+        port = sock.getsockname()[1]
+        master = PreforkServer(slow_app, sock, workers=2, threads=2, graceful_timeout=5)
+        master.spawn()
+        master.spawn()
+        self.addCleanup(master.stop)
+        workers = set(master.workers)
+
+        pids = {get(port)[1] for _ in range(20)}
+        self.assertTrue(pids <= {str(pid) for pid in workers})
+        self.assertNotIn(str(os.getpid()), pids)
+
+        # Un hijo que cae se recoge; el principal lanza otro
+        os.kill(next(iter(workers)), signal.SIGKILL)
+        deadline = time.monotonic() + 5
+        while master.reap() == 0 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(len(master.workers), 1)
+        master.spawn()
+        self.assertEqual(get(port)[0], 200)
+
+        master.stop()
+        self.assertEqual(master.workers, {})
+        self.assertTrue(sock._closed)
+
+
+    def test_only_worker_zero_sweeps(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+
+        def record_sweeper():
+            # Se ejecuta en el hijo: deja constancia de que ha arrancado el barrido
+            with open(os.path.join(directory, str(os.getpid())), 'w'):
+                pass
+
+        def sweepers():
+            deadline = time.monotonic() + 5
+            while time.monotonic() < deadline:
+                pids = {int(name) for name in os.listdir(directory)}
+                if pids:
+                    time.sleep(0.2) # Por si arranca otro
+                    return {int(name) for name in os.listdir(directory)}
+                time.sleep(0.05)
+            return set()
+
+        sock = listen('127.0.0.1', 0)
+        master = PreforkServer(slow_app, sock, workers=3, threads=1, graceful_timeout=5,
+                               on_worker_start=app_module.init_worker)
+        with patch('app.start_refresh_sweeper', side_effect=record_sweeper):
+            for _ in range(3):
+                master.spawn()
+            self.addCleanup(master.stop)
+            self.assertEqual(sorted(master.workers.values()), [0, 1, 2])
+            first = sweepers()
+            self.assertEqual(first, {pid for pid, index in master.workers.items() if index == 0})
+
+            # El hijo que sustituye al 0 recibe su número y vuelve a ser el único que barre
+            os.remove(os.path.join(directory, str(first.pop())))
+            os.kill(next(pid for pid, index in master.workers.items() if index == 0), signal.SIGKILL)
+            deadline = time.monotonic() + 5
+            while master.reap() == 0 and time.monotonic() < deadline:
+                time.sleep(0.05)
+            master.spawn()
+            self.assertEqual(sorted(master.workers.values()), [0, 1, 2])
+            self.assertEqual(sweepers(), {pid for pid, index in master.workers.items() if index == 0})
+    def test_metrics_are_summed_across_workers(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        registry = Registry()
+        hits = Counter('app_hits_total', 'Peticiones.', registry=registry)
+        shared = SharedMetrics(directory, registry, interval=0.05)
+
+        def counting_app(environ, start_response):
+            if environ['PATH_INFO'] == '/metrics':
+                body = shared.render().encode()
+            else:
+                hits.inc()
+                body = str(os.getpid()).encode()
+            start_response('200 OK', [('Content-Type', 'text/plain'), ('Content-Length', str(len(body)))])
+            return [body]
+
+        def scrape():
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+            try:
+                conn.request('GET', '/metrics')
+                return conn.getresponse().read().decode()
+            finally:
+                conn.close()
+
+        sock = listen('127.0.0.1', 0)
+        port = sock.getsockname()[1]
+        shared.before_fork()
+        master = PreforkServer(counting_app, sock, workers=2, threads=2, graceful_timeout=5,
+                               on_worker_start=shared.start, on_worker_exit=shared.stop)
+        master.spawn()
+        master.spawn()
+        self.addCleanup(master.stop)
+
+        for _ in range(30):
+            get(port)
+        time.sleep(0.3) # Más que el intervalo: todos han volcado lo suyo
+        # Atienda quien atienda, /metrics devuelve el total de los dos procesos
+        self.assertEqual({scrape().splitlines()[-1] for _ in range(10)}, {'app_hits_total 30'})
+
+if __name__ == '__main__':
+    unittest.main()
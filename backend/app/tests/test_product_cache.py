@@ -0,0 +1,55 @@
+import unittest
+from product_cache import ProductCache, MISS
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+# --- TESTS DE LA CACHÉ DE PRODUCTOS ---
+class ProductCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = ProductCache(maxsize=2, ttl=60, negative_ttl=10, clock=self.clock)
+
+    def test_miss_then_hit(self):
+        self.assertIs(self.cache.get('123'), MISS)
+        self.cache.set('123', {"name": "Leche"})
+        self.assertEqual(self.cache.get('123'), {"name": "Leche"})
+        stats = self.cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+
+    def test_lru_eviction(self):
+        self.cache.set('a', {"name": "A"})
+        self.cache.set('b', {"name": "B"})
+        self.cache.get('a') # 'a' pasa a ser el más reciente
+        self.cache.set('c', {"name": "C"})
+        self.assertIs(self.cache.get('b'), MISS)
+        self.assertEqual(self.cache.get('a'), {"name": "A"})
+        self.assertEqual(self.cache.stats()['evictions'], 1)
+
+    def test_ttl_expiration(self):
+        self.cache.set('a', {"name": "A"})
+        self.clock.now = 61
+        self.assertIs(self.cache.get('a'), MISS)
+        self.assertEqual(self.cache.stats()['expirations'], 1)
+
+    def test_negative_entries_use_shorter_ttl(self):
+        self.cache.set_missing('x')
+        self.assertIsNone(self.cache.get('x'))
+        self.clock.now = 11
+        self.assertIs(self.cache.get('x'), MISS)
+
+    def test_invalidate(self):
+        self.cache.set('a', {"name": "A"})
+        self.cache.invalidate('a')
+        self.assertIs(self.cache.get('a'), MISS)
+
+
+if __name__ == '__main__':
+    unittest.main()
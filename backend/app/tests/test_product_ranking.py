@@ -0,0 +1,27 @@
+import unittest
+from sqlalchemy import create_engine, text
+from product_ranking import GRADE_RANKS, UNRANKED, grade_rank, rank_sql
+
+
+# --- TESTS DE LA POSICIÓN DE LAS NOTAS ---
+class GradeRankTests(unittest.TestCase):
+
+    def test_grade_rank(self):
+        self.assertEqual(grade_rank('A'), 1)
+        self.assertEqual(grade_rank(' e '), 5)
+        self.assertEqual(grade_rank('a-plus'), 0)
+        for grade in (None, '', 'n/a', 'unknown', 'not-applicable'):
+            self.assertEqual(grade_rank(grade), UNRANKED)
+
+    def test_rank_sql_matches_python(self):
+        engine = create_engine('sqlite://')
+        grades = [*GRADE_RANKS, 'B', ' c', 'n/a', None]
+        with engine.connect() as conn:
+            for grade in grades:
+                rank = conn.execute(text(f"SELECT {rank_sql(':grade')}"), {"grade": grade}).scalar()
+                self.assertEqual(rank, grade_rank(grade), grade)
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import unittest
+import threading
+from product_refresh import ProductRefresher, RateLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class NoLimit:
+    def acquire(self):
+        pass
+
+
+# --- TESTS DEL LIMITADOR DE RITMO ---
+class RateLimiterTests(unittest.TestCase):
+
+    def test_waits_between_acquisitions(self):
+        clock = FakeClock()
+        limiter = RateLimiter(rate=2.0, burst=2, clock=clock, sleep=clock.sleep)
+        for _ in range(4):
+            limiter.acquire()
+        # Las dos primeras salen de la ráfaga; las otras dos esperan medio segundo cada una
+        self.assertAlmostEqual(clock.now, 1.0)
+
+
+# --- TESTS DEL REFRESCO EN SEGUNDO PLANO ---
+class ProductRefresherTests(unittest.TestCase):
+
+    def test_refreshes_scheduled_barcodes(self):
+        refreshed = []
+        refresher = ProductRefresher(lambda barcode: refreshed.append(barcode) or barcode == '2', limiter=NoLimit())
+        self.assertTrue(refresher.schedule('1'))
+        self.assertTrue(refresher.schedule('2'))
+        refresher.join()
+        self.assertEqual(sorted(refreshed), ['1', '2'])
+        stats = refresher.stats()
+        self.assertEqual((stats['refreshed'], stats['changed'], stats['queued']), (2, 1, 0))
+
+    def test_deduplicates_queued_barcodes(self):
+        release = threading.Event()
+        calls = []
+
+        def refresh(barcode):
+            calls.append(barcode)
+            release.wait(5)
+
+        refresher = ProductRefresher(refresh, workers=1, limiter=NoLimit())
+        refresher.schedule('1')
+        refresher.schedule('2')
+        self.assertFalse(refresher.schedule('2')) # Ya está en la cola
+        release.set()
+        refresher.join()
+        self.assertEqual(calls, ['1', '2'])
+
+    def test_retry_after_and_failures(self):
+        clock = FakeClock()
+
+        def refresh(barcode):
+            raise RuntimeError('sin conexión')
+
+        refresher = ProductRefresher(refresh, retry_after=60, clock=clock, limiter=NoLimit())
+        refresher.schedule('1')
+        refresher.join()
+        self.assertEqual(refresher.stats()['failed'], 1)
+        self.assertFalse(refresher.schedule('1')) # Intentado hace poco
+        clock.now += 61
+        self.assertTrue(refresher.schedule('1'))
+        refresher.join()
+
+    def test_full_queue_drops_barcodes(self):
+        release = threading.Event()
+        refresher = ProductRefresher(lambda barcode: release.wait(5), workers=1, max_queue=1, limiter=NoLimit())
+        refresher.schedule('1')
+        # El único hilo puede estar ya con '1'; como mucho cabe uno más en la cola
+        results = [refresher.schedule(str(n)) for n in range(2, 5)]
+        self.assertIn(False, results)
+        self.assertGreaterEqual(refresher.stats()['dropped'], 1)
+        release.set()
+        refresher.join()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+from product_search import (create_search_index, ensure_search_index, match_expression, query_terms,
+                            rebuild_search_index, search_products)
+
+
+# --- TESTS DE LA EXPRESIÓN DE BÚSQUEDA ---
+class MatchExpressionTests(unittest.TestCase):
+
+    def test_query_terms(self):
+        self.assertEqual(query_terms('  Leche ENTERA, "sin" lactosa* '), ['leche', 'entera', 'sin', 'lactosa'])
+        self.assertEqual(query_terms('"*-'), [])
+        self.assertEqual(len(query_terms(' '.join(['a'] * 20))), 8)
+
+    def test_match_expression(self):
+        self.assertEqual(match_expression(['leche', 'ent'], 'sqlite'), '"leche"* "ent"*')
+        self.assertEqual(match_expression(['leche', 'ent'], 'postgresql'), 'leche:* & ent:*')
+
+
+# --- TESTS DEL ÍNDICE FTS5 ---
+class SearchIndexTests(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = create_engine('sqlite://')
+        with self.engine.begin() as conn:
+            conn.execute(text('CREATE TABLE products (id INTEGER PRIMARY KEY, name VARCHAR(255), category VARCHAR(255))'))
+            conn.execute(text("INSERT INTO products (name, category) VALUES "
+                              "('Leche entera', 'Lácteos'), ('Nutella', 'Cremas de cacao'), "
+                              "('Galletas', 'Desayunos y leche')"))
+
+    def tearDown(self):
+        self.engine.dispose()
+
+    def names(self, q, limit=10, offset=0):
+        with Session(self.engine) as session:
+            return [row.name for row in search_products(session, q, limit, offset)]
+
+    def test_ensure_indexes_existing_rows_once(self):
+        self.assertTrue(ensure_search_index(self.engine))
+        self.assertFalse(ensure_search_index(self.engine))
+        # El nombre pesa más que la categoría
+        self.assertEqual(self.names('leche'), ['Leche entera', 'Galletas'])
+        self.assertEqual(self.names('nutel'), ['Nutella'])
+        self.assertEqual(self.names('lacteos'), ['Leche entera']) # Sin tildes
+        self.assertEqual(self.names('leche', limit=1, offset=1), ['Galletas'])
+        self.assertEqual(self.names(''), [])
+
+    def test_triggers_keep_index_in_sync(self):
+        with self.engine.begin() as conn:
+            create_search_index(conn)
+            rebuild_search_index(conn)
+            conn.execute(text("INSERT INTO products (name, category) VALUES ('Leche de avena', 'Bebidas vegetales')"))
+            conn.execute(text("UPDATE products SET name = 'Crema de cacao' WHERE name = 'Nutella'"))
+            conn.execute(text("DELETE FROM products WHERE name = 'Galletas'"))
+        self.assertEqual(sorted(self.names('leche')), ['Leche de avena', 'Leche entera'])
+        self.assertEqual(self.names('nutella'), [])
+        self.assertEqual(self.names('crema cacao'), ['Crema de cacao'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import unittest
+from sqlalchemy import create_engine, inspect, text
+from schema import upgrade_schema
+
+
+# --- TESTS DE LA ACTUALIZACIÓN DEL ESQUEMA ---
+class UpgradeSchemaTests(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = create_engine('sqlite://')
+        with self.engine.begin() as conn:
+            # Tabla de productos tal y como se creaba antes de añadir las versiones
+            conn.execute(text('CREATE TABLE products (id INTEGER PRIMARY KEY, barcode VARCHAR(13), name VARCHAR(255), '
+                              'nutriscore VARCHAR(1), ecoscore VARCHAR(2), category VARCHAR(100))'))
+            conn.execute(text("INSERT INTO products (barcode, name, nutriscore, ecoscore) VALUES ('123', 'Leche', 'b', 'n/a')"))
+            conn.execute(text('CREATE TABLE user_favorites (user_id INTEGER, product_id INTEGER, '
+                              'PRIMARY KEY (user_id, product_id))'))
+            conn.execute(text('CREATE TABLE product_lookup_counts (barcode VARCHAR(13) PRIMARY KEY, lookups INTEGER)'))
+
+    def tearDown(self):
+        self.engine.dispose()
+
+    def test_adds_missing_columns_once(self):
+        self.assertEqual(upgrade_schema(self.engine), ['products.version', 'products.updated_at', 'products.fetched_at',
+                                                       'products.eco_rank', 'products.nutri_rank', 'products.gtin'])
+        columns = {c['name'] for c in inspect(self.engine).get_columns('products')}
+        self.assertTrue({'version', 'updated_at', 'fetched_at'} <= columns)
+        indexes = {i['name'] for i in inspect(self.engine).get_indexes('products')}
+        self.assertTrue({'ix_products_fetched_at', 'ix_products_category_rank', 'ix_products_gtin',
+                         'ix_products_updated_at'} <= indexes)
+        with self.engine.connect() as conn:
+            version, updated_at, eco_rank, nutri_rank = conn.execute(
+                text('SELECT version, updated_at, eco_rank, nutri_rank FROM products')).one()
+        self.assertEqual(version, 1)
+        self.assertEqual((eco_rank, nutri_rank), (9, 2)) # Sin Eco-Score; Nutri-Score B
+        self.assertIsNotNone(updated_at)
+        self.assertEqual(upgrade_schema(self.engine), [])
+
+    def test_merges_duplicate_barcodes(self):
+        with self.engine.begin() as conn:
+            # El mismo producto como UPC-A, EAN-13 y GTIN-14, con favoritos en las tres filas
+            conn.execute(text("INSERT INTO products (id, barcode, name) VALUES "
+                              "(2, '737628064502', 'Coca-Cola Light'), (3, '0737628064502', 'Coca-Cola Light'), "
+                              "(4, '00737628064502', 'Coca-Cola Light'), (5, '5449000000996', 'Coca-Cola')"))
+            conn.execute(text('INSERT INTO user_favorites (user_id, product_id) VALUES (1, 2), (1, 3), (2, 4), (3, 5)'))
+            conn.execute(text("INSERT INTO product_lookup_counts (barcode, lookups) VALUES "
+                              "('737628064502', 2), ('0737628064502', 3), ('5449000000996', 1)"))
+        upgrade_schema(self.engine)
+
+        with self.engine.connect() as conn:
+            products = conn.execute(text('SELECT id, barcode, gtin FROM products ORDER BY id')).all()
+            favorites = conn.execute(text('SELECT user_id, product_id FROM user_favorites ORDER BY user_id')).all()
+            counts = dict(conn.execute(text('SELECT barcode, lookups FROM product_lookup_counts')).all())
+        # Se conserva la fila que ya tenía el código normalizado; el código no válido se queda sin clave
+        self.assertEqual([tuple(p) for p in products],
+                         [(1, '123', None), (3, '0737628064502', 737628064502), (5, '5449000000996', 5449000000996)])
+        self.assertEqual([tuple(f) for f in favorites], [(1, 3), (2, 3), (3, 5)])
+        self.assertEqual(counts, {'0737628064502': 5, '5449000000996': 1})
+
+
+    def test_fills_footprint_counts_after_merging(self):
+        with self.engine.begin() as conn:
+            # Tabla nueva (la crea db.create_all) en una base de datos con favoritos
+            conn.execute(text('CREATE TABLE user_footprint_counts (user_id INTEGER, category VARCHAR(100), '
+                              'eco_rank SMALLINT, favorites INTEGER, PRIMARY KEY (user_id, category, eco_rank))'))
+            conn.execute(text("INSERT INTO products (id, barcode, name, ecoscore, category) VALUES "
+                              "(2, '737628064502', 'Coca-Cola Light', 'd', 'Bebidas'), "
+                              "(3, '0737628064502', 'Coca-Cola Light', 'd', 'Bebidas')"))
+            conn.execute(text('INSERT INTO user_favorites (user_id, product_id) VALUES (1, 1), (1, 2), (1, 3)'))
+        upgrade_schema(self.engine)
+
+        with self.engine.connect() as conn:
+            counts = conn.execute(text('SELECT user_id, category, eco_rank, favorites FROM user_footprint_counts '
+                                       'ORDER BY category')).all()
+        self.assertEqual([tuple(c) for c in counts], [(1, '', 9, 1), (1, 'Bebidas', 4, 1)])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import json
+import unittest
+from decimal import Decimal
+from unittest.mock import patch
+import numpy as np
+from flask import Flask, jsonify
+import serializers
+from serializers import (FastJSONProvider, ProductJSONCache, dumps, emission_to_dict,
+                         product_to_dict)
+
+
+class FakeProduct:
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+
+def make_product(product_id=1, name="Leche de avena", ecoscore="a"):
+    return FakeProduct(id=product_id, barcode=f"84{product_id:011d}", name=name,
+                       nutriscore="b", ecoscore=ecoscore, category="Bebidas", version=1)
+
+
+# --- TESTS DE LA SERIALIZACIÓN JSON ---
+class DumpsTests(unittest.TestCase):
+
+    def test_utf8_without_escapes(self):
+        self.assertEqual(dumps({"name": "Galletas María"}), '{"name":"Galletas María"}'.encode('utf-8'))
+
+    def test_stdlib_fallback_matches(self):
+        data = {"name": "Café", "n": 3, "x": [1.5, None], "d": Decimal("1.25"), "v": np.int64(7)}
+        fast = dumps(data)
+        with patch.object(serializers, 'orjson', None):
+            self.assertEqual(json.loads(dumps(data)), json.loads(fast))
+            self.assertEqual(json.loads(dumps(data))["v"], 7)
+
+    def test_dicts(self):
+        product = make_product()
+        self.assertEqual(product_to_dict(product), {
+            "id": 1, "barcode": "8400000000001", "name": "Leche de avena",
+            "nutriscore": "b", "ecoscore": "a", "category": "Bebidas", "version": 1})
+        self.assertEqual(product_to_dict(product_to_dict(product)), product_to_dict(product))
+        self.assertEqual(emission_to_dict(np.int64(4), "Andalucía", np.int32(2019), np.float64(2.5)),
+                         {"id": 4, "region_name": "Andalucía", "year": 2019, "total_co2_tonnes": 2.5})
+
+    def test_provider_jsonify(self):
+        app = Flask(__name__)
+        app.json = FastJSONProvider(app)
+        with app.app_context():
+            response = jsonify({"message": "Añadido"})
+        self.assertEqual(response.mimetype, 'application/json')
+        self.assertIn("Añadido".encode('utf-8'), response.data)
+
+
+class ProductJSONCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = ProductJSONCache(maxsize=2)
+
+    def test_reuses_encoded_bytes(self):
+        product = make_product()
+        first = self.cache.encode(product)
+        self.assertIs(self.cache.encode(product), first)
+        self.assertEqual(json.loads(first), product_to_dict(product))
+
+    def test_changed_row_is_reencoded(self):
+        product = make_product()
+        self.cache.encode(product)
+        product.ecoscore = "c"
+        self.assertEqual(json.loads(self.cache.encode(product))["ecoscore"], "c")
+
+    def test_invalidate_and_eviction(self):
+        self.cache.encode(make_product(1))
+        self.cache.encode(make_product(2))
+        self.cache.encode(make_product(3))
+        self.assertEqual(len(self.cache), 2)
+        self.cache.invalidate(3)
+        self.assertEqual(len(self.cache), 1)
+
+    def test_encode_list(self):
+        products = [make_product(1), make_product(2, name="Té verde")]
+        self.assertEqual(json.loads(self.cache.encode_list(products)),
+                         [product_to_dict(p) for p in products])
+        self.assertEqual(self.cache.encode_list([]), b'[]')
+
+
+if __name__ == '__main__':
+    unittest.main()
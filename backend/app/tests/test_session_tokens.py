@@ -0,0 +1,38 @@
+import unittest
+from session_tokens import SessionTokenSigner
+
+
+# --- TESTS DE LOS TOKENS DE SESIÓN ---
+class SessionTokenSignerTests(unittest.TestCase):
+
+    def setUp(self):
+        self.now = [1000.0]
+        self.signer = SessionTokenSigner('clave-de-prueba', ttl=60, clock=lambda: self.now[0])
+
+    def test_issue_and_verify(self):
+        token, expires_at = self.signer.issue(42)
+        self.assertEqual(expires_at, 1060)
+        self.assertEqual(self.signer.verify(token), 42)
+
+    def test_expired_token(self):
+        token, _ = self.signer.issue(42)
+        self.now[0] = 1061
+        self.assertIsNone(self.signer.verify(token))
+
+    def test_tampered_token(self):
+        token, _ = self.signer.issue(42)
+        user_id, expires_at, signature = token.split('.')
+        self.assertIsNone(self.signer.verify(f"43.{expires_at}.{signature}"))
+        self.assertIsNone(SessionTokenSigner('otra-clave').verify(token))
+        self.assertIsNone(self.signer.verify('basura'))
+        self.assertIsNone(self.signer.verify(None))
+
+    def test_non_ascii_token(self):
+        token, _ = self.signer.issue(42)
+        user_id, expires_at, signature = token.split('.')
+        self.assertIsNone(self.signer.verify(f"{user_id}.{expires_at}.\xe9{signature[1:]}"))
+        self.assertIsNone(self.signer.verify(f"4\xe9.{expires_at}.{signature}"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+import threading
+import time
+import unittest
+from singleflight import SingleFlight
+
+
+# --- TESTS DE SINGLE-FLIGHT ---
+class SingleFlightTests(unittest.TestCase):
+
+    def test_concurrent_calls_run_once(self):
+        flights = SingleFlight()
+        calls = []
+        results = []
+        barrier = threading.Barrier(5)
+
+        def fetch():
+            calls.append(1)
+            time.sleep(0.1)
+            return "resultado"
+
+        def worker():
+            barrier.wait()
+            results.append(flights.do("clave", fetch))
+
+        threads = [threading.Thread(target=worker) for _ in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual([value for value, _ in results], ["resultado"] * 5)
+        self.assertEqual(sum(1 for _, shared in results if not shared), 1)
+        self.assertEqual(flights.in_flight(), 0)
+
+    def test_errors_are_propagated_and_not_remembered(self):
+        flights = SingleFlight()
+
+        def failing():
+            raise ValueError("fallo")
+
+        with self.assertRaises(ValueError):
+            flights.do("clave", failing)
+        self.assertEqual(flights.do("clave", lambda: 42), (42, False))
+
+
+if __name__ == '__main__':
+    unittest.main()
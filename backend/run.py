@@ -0,0 +1,82 @@
+# backend/run.py
+#
+# Punto de entrada de producción del backend: varios procesos creados con fork
+# después de cargar la aplicación, con un pool de hilos cada uno (ver
+# app/prefork_server.py). El esquema se gestiona aparte; servir nunca crea ni
+# modifica tablas.
+# Uso (desde backend):
+#   python run.py init-db
+#   python run.py serve --workers 4 --threads 8 --port 5000
+
+import argparse
+import gc
+import os
+import shutil
+import sys
+import tempfile
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app')
+# Los módulos de la aplicación se importan entre sí por su nombre (como al ejecutar app.py)
+sys.path.insert(0, APP_DIR)
+
+
+def serve(args):
+    import app as app_module
+    from prefork_server import PreforkServer, RequestHandler, listen
+
+    app = app_module.create_app()
+    try:
+        # Se carga todo antes del fork: los hijos comparten estas páginas de memoria
+        app_module.preload_app()
+    except Exception as e:
+        sys.exit(f"No se pudo cargar la aplicación ({e}). ¿Falta crear el esquema con 'python run.py init-db'?")
+    RequestHandler.access_log = args.access_log
+    sock = listen(args.host, args.port)
+    # Cada hijo vuelca aquí sus métricas y /metrics devuelve la suma (se borra al parar)
+    metrics_dir = tempfile.mkdtemp(prefix='ecotrack-metrics-')
+    app_module.share_metrics(metrics_dir)
+    # Saca los objetos ya cargados del recolector: si no, al recorrerlos en cada
+    # hijo se escribirían sus cabeceras y se copiarían las páginas compartidas
+    gc.freeze()
+    try:
+        PreforkServer(app, sock, workers=args.workers, threads=args.threads, graceful_timeout=args.graceful_timeout,
+                      on_worker_start=app_module.init_worker, on_worker_exit=app_module.shutdown_worker).run()
+    finally:
+        shutil.rmtree(metrics_dir, ignore_errors=True)
+
+
+def init_db(args):
+    import app as app_module
+
+    added = app_module.init_database()
+    if added:
+        print(f"Columnas añadidas: {', '.join(added)}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backend de Ecotrack.")
+    commands = parser.add_subparsers(dest='command')
+
+    serve_parser = commands.add_parser('serve', help="Sirve la API con varios procesos (por defecto)")
+    serve_parser.add_argument('--host', default=os.environ.get('HOST', '127.0.0.1'))
+    serve_parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', 5000)))
+    serve_parser.add_argument('--workers', type=int, default=int(os.environ.get('WEB_WORKERS', os.cpu_count() or 1)),
+                              help="Procesos que atienden peticiones")
+    serve_parser.add_argument('--threads', type=int, default=int(os.environ.get('WEB_THREADS', 8)),
+                              help="Hilos por proceso (no más que DB_POOL_SIZE + DB_MAX_OVERFLOW)")
+    serve_parser.add_argument('--graceful-timeout', type=float, default=30,
+                              help="Segundos para terminar las peticiones en curso al parar")
+    serve_parser.add_argument('--access-log', action='store_true', help="Escribe una línea por petición")
+    commands.add_parser('init-db', help="Crea o actualiza el esquema de la base de datos y sale")
+
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0].startswith('-') and argv[0] not in ('-h', '--help'):
+        argv = ['serve', *argv]
+    args = parser.parse_args(argv)
+    if args.command == 'init-db':
+        return init_db(args)
+    return serve(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -23,6 +23,7 @@ function Header() {
   const handleLogout = () => {
     localStorage.removeItem('user_id'); 
     localStorage.removeItem('username'); 
+    localStorage.removeItem('token');
     setIsLoggedIn(false);
     setUsername('');
     alert('Has cerrado sesión.');
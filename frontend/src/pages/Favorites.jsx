@@ -7,6 +7,8 @@ function Favorites() {
   const [error, setError] = useState('');
 
   const userId = localStorage.getItem('user_id');
+  const token = localStorage.getItem('token');
+  const authHeaders = token ? { Authorization: `Bearer ${token}` } : {};
 
   const fetchFavorites = async () => {
     if (!userId) {
@@ -16,15 +18,26 @@ function Favorites() {
     }
 
     try {
-      const response = await fetch(`http://localhost:5000/api/users/${userId}/favorites`);
-      const data = await response.json();
+      // El backend devuelve los favoritos por páginas: se sigue la cabecera X-Next-After
+      let allFavorites = [];
+      let after = null;
+      do {
+        const query = after ? `?after=${after}` : '';
+        const response = await fetch(`http://localhost:5000/api/users/${userId}/favorites${query}`, {
+          headers: authHeaders,
+        });
+        const data = await response.json();
 
-      if (!response.ok) {
-        throw new Error(data.error || 'Error al cargar los favoritos');
-      }
+        if (!response.ok) {
+          throw new Error(data.error || 'Error al cargar los favoritos');
+        }
+
+        allFavorites = allFavorites.concat(data);
+        after = response.headers.get('X-Next-After');
+      } while (after);
 
-      setFavorites(data);
-      console.log('Favoritos cargados:', data);
+      setFavorites(allFavorites);
+      console.log('Favoritos cargados:', allFavorites);
 
     } catch (err) {
       console.error('Error al cargar los favoritos:', err);
@@ -45,6 +58,7 @@ function Favorites() {
       try {
         const response = await fetch(`http://localhost:5000/api/users/${userId}/favorites/${barcodeToDelete}`, {
           method: 'DELETE',
+          headers: authHeaders,
         });
 
         const data = await response.json();
@@ -31,6 +31,7 @@ function Login() {
       alert('¡Bienvenido, ' + username + '!');
 
       localStorage.setItem('user_id', data.user_id);
+      localStorage.setItem('token', data.token);
       localStorage.setItem('username', username);
 
       navigate('/'); 
@@ -8,6 +8,7 @@ function ProductScanner() {
   const [loading, setLoading] = useState(false); 
 
   const userId = localStorage.getItem('user_id');
+  const token = localStorage.getItem('token');
 
   const handleSearch = async (event) => {
     event.preventDefault();
@@ -55,6 +56,7 @@ function ProductScanner() {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
+          ...(token && { Authorization: `Bearer ${token}` }),
         },
         body: JSON.stringify({ barcode: product.barcode }),
       });